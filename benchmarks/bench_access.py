@@ -0,0 +1,63 @@
+"""
+Benchmark cek akses: cara lama (baca + parse allowed_users.json lalu scan any() tiap cek)
+dibandingkan AccessRegistry (lookup dict di memori).
+
+    python benchmarks/bench_access.py [JUMLAH_USER]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handler.access_control import AccessRegistry  # noqa: E402
+
+
+def legacy_is_authorized(path: str, telegram_id: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            users = json.load(f)
+        except json.JSONDecodeError:
+            users = []
+    return any(u["telegram_id"] == telegram_id for u in users)
+
+
+def rate(check, ids: list[str], seconds: float = 2.0) -> float:
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for telegram_id in ids:
+            check(telegram_id)
+        done += len(ids)
+    return done / (time.perf_counter() - started)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    users = [
+        {"name": f"user{i}", "nik": str(i), "telegram_id": str(100000 + i), "role": "user"}
+        for i in range(count)
+    ]
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(users, f, indent=2)
+    rng = random.Random(1)
+    ids = [str(100000 + rng.randrange(count * 2)) for _ in range(200)]   # ~50% tidak terdaftar
+    try:
+        registry = AccessRegistry(path)
+        before = rate(lambda telegram_id: legacy_is_authorized(path, telegram_id), ids)
+        after = rate(registry.is_authorized, ids)
+        print(f"{count} user")
+        print(f"baca file tiap cek : {before:,.0f} cek/dtk")
+        print(f"AccessRegistry     : {after:,.0f} cek/dtk ({after / before:,.0f}x)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
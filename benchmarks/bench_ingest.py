@@ -0,0 +1,125 @@
+"""
+Benchmark upload Metro: jalur lama (pd.read_excel → astype(str) → to_dict) dibandingkan
+pipeline streaming load_excel (openpyxl read_only + batch ke loader).
+
+Contoh `files/Uplink GPON-Metro Malang (rev).xlsx` direplikasi sampai >= ROWS baris.
+Loader diganti penghitung (tanpa MySQL) supaya yang diukur hanya parsing + validasi;
+memori puncak diukur dengan tracemalloc (semua thread).
+
+    python benchmarks/bench_ingest.py [ROWS]
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import ingest  # noqa: E402
+from database import ConnectionPool  # noqa: E402
+from executor import shutdown_executors  # noqa: E402
+from handler.inputmetro_command import _prepare_batch  # noqa: E402
+from sto_registry import sto_registry  # noqa: E402
+from validation import RejectReport, new_stats  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "files", "Uplink GPON-Metro Malang (rev).xlsx")
+
+
+class CountingLoader:
+    def __init__(self):
+        self.rows_written = 0
+        self.first_write = None
+        self.timings = {}
+
+    def begin(self, conn):
+        pass
+
+    def write(self, conn, rows):
+        if self.first_write is None:
+            self.first_write = time.monotonic()
+        self.rows_written += len(rows)
+
+    def finish(self, conn):
+        return self.rows_written
+
+    def abort(self, conn):
+        pass
+
+
+def build_file(rows: int) -> str:
+    wb = openpyxl.load_workbook(SAMPLE, read_only=True)
+    sample = list(wb.worksheets[0].iter_rows(values_only=True))
+    wb.close()
+    header, data = sample[0], sample[1:]
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    out = openpyxl.Workbook(write_only=True)
+    ws = out.create_sheet("data")
+    ws.append(header)
+    for i in range(rows):
+        ws.append(data[i % len(data)])
+    out.save(path)
+    return path
+
+
+def old_path(path: str) -> int:
+    df = pd.read_excel(path)
+    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    df = df.astype(str)
+    return len(df.to_dict(orient="records"))
+
+
+async def new_path(path: str) -> tuple[int, float]:
+    rejects = RejectReport()
+    loader = CountingLoader()
+    started = time.monotonic()
+    try:
+        await ingest.load_excel(
+            path,
+            partial(_prepare_batch, witel="MALANG", valid_sto=sto_registry.valid_stos("mlg"), stats=new_stats(), rejects=rejects),
+            loader,
+        )
+    finally:
+        rejects.close()
+        rejects.discard()
+    return loader.rows_written, loader.first_write - started
+
+
+def measure(fn, *args):
+    started = time.monotonic()
+    result = fn(*args)
+    elapsed = time.monotonic() - started
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    pool = ConnectionPool(connect=lambda: sqlite3.connect(":memory:", check_same_thread=False),
+                          ping=lambda conn: conn.execute("SELECT 1"))
+    ingest.get_pool = lambda: pool
+    path = build_file(rows)
+    try:
+        print(f"{rows} baris, file {os.path.getsize(path) / 2**20:.1f} MB")
+        count, elapsed, peak = measure(old_path, path)
+        print(f"pd.read_excel  : {count} baris, {elapsed:.2f} dtk, puncak memori {peak:.0f} MB")
+        (count, first), elapsed, peak = measure(lambda p: asyncio.run(new_path(p)), path)
+        print(f"load_excel     : {count} baris valid, {elapsed:.2f} dtk (batch pertama {first:.2f} dtk), "
+              f"puncak memori {peak:.0f} MB")
+    finally:
+        os.remove(path)
+        asyncio.run(shutdown_executors())
+
+
+if __name__ == "__main__":
+    main()
@@ -14,19 +14,53 @@ from handler.inputftm_command import register_handler as inputftm_handler
 from handler.inputmetro_command import register_handler as inputmetro_handler
 from handler.cekgpon_command_v2 import register_handler as cekgpon_handler_v2
 from handler.cekmetro_command import register_handler as cekmetro_handler
+from handler.cari_command import register_handler as cari_handler
+from handler.batchgpon_command import register_handler as batchgpon_handler
+from handler.inline_query import register_handler as inline_handler
+from handler.access_control import flush_allowed_users
+from database import get_pool, close_pool, run_in_connection
+from migrations import apply_migrations
+from hostname_index import build_indexes
+from search_index import build_search_index
+from metro_summary import build_metro_summary
+from sto_registry import load_sto_registry
+from executor import shutdown_executors
+from updates import ChatOrderedUpdateProcessor
+from persistence import SQLitePersistence
 
 # 🔐 Load token dari .env
 load_dotenv()
 bot_token = os.getenv('BOT_TOKEN')
-app = Application.builder().token(bot_token).build()
+
+# 🌐 Mode penerimaan update: "polling" (default) atau "webhook"
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')            # URL publik (mis. https://bot.example.com), tanpa path
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or None  # dicek Telegram lewat header X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# 🔧 Opsional: arahkan ke Bot API lain (mis. server Bot API lokal / server palsu untuk uji offline)
+BOT_API_URL = os.getenv('BOT_API_URL')
+
+# ⚡ Update antar chat diproses paralel (terbatas), update dalam satu chat tetap berurutan
+builder = Application.builder().token(bot_token).concurrent_updates(ChatOrderedUpdateProcessor())
+# 💾 Pilihan user & state percakapan disimpan ke SQLite agar sesi tidak hilang saat restart
+builder = builder.persistence(SQLitePersistence())
+if BOT_API_URL:
+    builder = builder.base_url(BOT_API_URL)
+app = builder.build()
 
 # 📌 Registrasi semua handler modular
-base_handler(app)            # start, cancel, adduser, removeuser, listuser, promote, dismiss
+base_handler(app)            # start, cancel, adduser, removeuser, listuser, promote, dismiss, stats, reloadsto
 ceksto_handler(app)
 inputftm_handler(app)
 inputmetro_handler(app)
 cekgpon_handler_v2(app)
 cekmetro_handler(app)
+cari_handler(app)
+batchgpon_handler(app)
+inline_handler(app)          # @bot <nama_gpon> <card>/<port> | <hostname metro>
 
 # 📋 Set command menu Telegram (agar muncul di menu /)
 async def set_bot_commands(application):
@@ -41,12 +75,41 @@ async def set_bot_commands(application):
         BotCommand("cekgpon", "Cek data GPON"),
         BotCommand("ceksto", "Cek status STO"),
         BotCommand("cekmetro", "Cek data Metro"),
+        BotCommand("gpon", "Cari GPON langsung: /gpon <nama_gpon> <card>/<port>"),
+        BotCommand("metro", "Cari Metro langsung: /metro <gpon_hostname>"),
+        BotCommand("cari", "Cari nama GPON/ODC/hostname dari sebagian nama"),
+        BotCommand("batchgpon", "Cek banyak port GPON sekaligus (daftar/CSV/XLSX)"),
         BotCommand("inputftm", "Upload data FTM"),
         BotCommand("inputmetro", "Upload data Metro"),
+        BotCommand("stats", "Statistik bot (admin)"),
+        BotCommand("reloadsto", "Muat ulang master STO dari database (admin)"),
     ]
     await application.bot.set_my_commands(commands)
 
-app.post_init = lambda application: set_bot_commands(application)
+# 🔌 Siapkan pool koneksi DB bersama + migrasi skema + master STO + index hostname/pencarian + ringkasan Metro sebelum update pertama diproses
+async def on_startup(application):
+    await set_bot_commands(application)
+    try:
+        await get_pool().start()
+        applied = await run_in_connection(apply_migrations)
+        if applied:
+            logging.info(f"Migrasi database dijalankan: {applied}")
+        await load_sto_registry()
+        await build_indexes()
+        await build_search_index()
+        await build_metro_summary()
+    except Exception as e:
+        logging.error(f"Gagal menyiapkan database: {e}")
+
+app.post_init = on_startup
+
+# 💾 Pastikan perubahan user tertunda ditulis dan koneksi DB ditutup sebelum bot berhenti
+async def on_shutdown(application):
+    await flush_allowed_users()
+    await close_pool()
+    await shutdown_executors()
+
+app.post_shutdown = on_shutdown
 
 # 📍 Handler fallback untuk command tidak dikenal
 async def unknown_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -71,6 +134,26 @@ app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, unknown_message_
 logging.basicConfig(level=logging.INFO)
 
 # ▶️ Jalankan bot
+# Saat berhenti (Ctrl+C/SIGTERM) kedua mode menunggu handler yang sedang jalan selesai,
+# lalu on_shutdown menulis user tertunda, menutup pool DB, dan mematikan worker.
+def run():
+    if BOT_MODE == "webhook":
+        # Tanpa URL publik PTB akan mendaftarkan https://<listen>:<port>/<path> (mis. 0.0.0.0) yang ditolak Telegram
+        if not WEBHOOK_URL:
+            raise SystemExit("❌ WEBHOOK_URL wajib diisi untuk BOT_MODE=webhook (URL publik, mis. https://bot.example.com).")
+        webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}"
+        print(f'🤖 Bot running (webhook {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH})...')
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=webhook_url,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+    else:
+        print('🤖 Bot running...')
+        app.run_polling()
+
 if __name__ == "__main__":
-    print('🤖 Bot running...')
-    app.run_polling()
+    run()
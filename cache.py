@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+
+PICKLIST_CACHE_SIZE = int(os.getenv('PICKLIST_CACHE_SIZE', '512'))
+PICKLIST_CACHE_TTL = float(os.getenv('PICKLIST_CACHE_TTL', '3600'))
+INLINE_CACHE_SIZE = int(os.getenv('INLINE_CACHE_SIZE', '1024'))
+INLINE_CACHE_TTL = float(os.getenv('INLINE_CACHE_TTL', '600'))
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '2048'))
+RENDER_CACHE_TTL = float(os.getenv('RENDER_CACHE_TTL', '3600'))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU dengan masa berlaku (TTL) per entri.
+    - Entri yang paling lama tidak dipakai dibuang saat melebihi maxsize.
+    - Entri kedaluwarsa dianggap miss dan dibuang saat diakses.
+    - get_or_load untuk key yang sama hanya memanggil loader sekali; pemanggil lain menunggu hasilnya.
+    - `generation` naik setiap invalidate/clear. Hasil load yang dimulai sebelum invalidasi tidak
+      disimpan, dan pemanggil baru tidak lagi menunggu load lama itu (mereka memuat ulang).
+    - Mencatat hit/miss untuk /stats.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()   # key -> (expires_at, value)
+        self._loading: dict = {}                  # key -> asyncio.Future (loader yang sedang jalan)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, generation: int | None = None) -> None:
+        """Simpan value; bila `generation` diberikan dan cache sudah diinvalidasi sejak itu, abaikan."""
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get_or_load(self, key, loader):
+        """Read-through: kembalikan isi cache, atau panggil `await loader()` lalu simpan hasilnya."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        generation = self.generation
+        pending = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await loader()
+        except Exception as e:
+            pending.set_exception(e)
+            # Pemanggil lain sudah ikut menerima exception ini; hindari peringatan "never retrieved"
+            pending.exception()
+            raise
+        else:
+            self.set(key, value, generation)
+            pending.set_result(value)
+            return value
+        finally:
+            if not pending.done():
+                pending.cancel()   # loader dibatalkan (mis. bot berhenti)
+            if self._loading.get(key) is pending:
+                del self._loading[key]
+
+    def invalidate(self, predicate) -> int:
+        """Hapus semua entri yang key-nya memenuhi predicate(key); kembalikan jumlahnya."""
+        self.generation += 1
+        for key in [key for key in self._loading if predicate(key)]:
+            del self._loading[key]
+        stale = [key for key in self._data if predicate(key)]
+        for key in stale:
+            del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._loading.clear()
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# Daftar STO & GPON untuk keyboard pilihan; key = (table, witel, sto)
+# sto=None berarti daftar STO itu sendiri, witel=None jika query tidak memfilter witel.
+picklist_cache = TTLCache("picklist", PICKLIST_CACHE_SIZE, PICKLIST_CACHE_TTL)
+
+# Hasil inline query; key = query yang sudah dinormalisasi
+inline_cache = TTLCache("inline", INLINE_CACHE_SIZE, INLINE_CACHE_TTL)
+
+# Teks hasil lookup yang sudah dirender; key diawali (table, sto, versi STO), lihat sto_version
+render_cache = TTLCache("render", RENDER_CACHE_SIZE, RENDER_CACHE_TTL)
+
+
+class NameRegistry:
+    """
+    ID integer pendek untuk nama GPON/hostname, dipakai di callback_data tombol pilihan
+    (Telegram membatasi callback_data 64 byte).
+    - Append-only: ID tidak pernah dipakai ulang, jadi tombol lama tetap menunjuk nama yang sama
+      walaupun daftar berubah setelah upload.
+    - ID hanya berlaku di proses ini; callback_data memuat `epoch` agar tombol dari sebelum
+      restart dikenali sebagai kedaluwarsa, bukan dipetakan ke nama lain.
+    - String nama disimpan sekali dan dibagi semua user/picklist.
+    """
+
+    def __init__(self):
+        # Acak per proses (6 hex): tidak berulang setelah sekian hari seperti potongan timestamp
+        self.epoch = secrets.token_hex(3)
+        self._ids: dict[str, int] = {}
+        self._names: list[str] = []
+
+    def id_for(self, name: str) -> int:
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def name_for(self, name_id: int) -> str | None:
+        return self._names[name_id] if 0 <= name_id < len(self._names) else None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+name_ids = NameRegistry()
+
+
+def name_ref(name: str) -> str:
+    """Referensi pendek untuk nama: '<epoch>.<id>'."""
+    return f"{name_ids.epoch}.{name_ids.id_for(name)}"
+
+
+def resolve_ref(ref: str) -> str | None:
+    """Kebalikan name_ref; None bila referensi berasal dari proses sebelum restart."""
+    epoch, _, name_id = ref.partition(".")
+    if epoch != name_ids.epoch or not name_id.isdigit():
+        return None
+    return name_ids.name_for(int(name_id))
+
+
+_upload_listeners = []
+_sto_versions: dict[tuple, int] = {}   # (table, STO) -> versi, naik setiap upload
+# Referensi task listener async agar tidak dibuang garbage collector sebelum selesai
+_upload_tasks: set = set()
+
+
+def on_upload(fn):
+    """
+    Daftarkan fn(table, stos) yang dipanggil setiap kali data STO di sebuah tabel ditimpa.
+    fn boleh async: dijalankan sebagai task di latar belakang tanpa menahan handler upload.
+    """
+    _upload_listeners.append(fn)
+    return fn
+
+
+def _upload_task_done(task: asyncio.Task) -> None:
+    _upload_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Listener upload {task.get_name()} gagal: {task.exception()}")
+
+
+def notify_upload(table: str, stos) -> None:
+    """Dipanggil handler input setelah commit berhasil."""
+    stos = {s.upper() for s in stos}
+    for fn in _upload_listeners:
+        name = getattr(fn, '__name__', fn)
+        try:
+            result = fn(table, stos)
+            if asyncio.iscoroutine(result):
+                try:
+                    task = asyncio.get_running_loop().create_task(result, name=f"{fn.__module__}.{name}")
+                except RuntimeError:
+                    result.close()
+                    raise
+                _upload_tasks.add(task)
+                task.add_done_callback(_upload_task_done)
+        except Exception as e:
+            logging.error(f"Listener upload {name} gagal: {e}")
+
+
+@on_upload
+def _invalidate_picklists(table: str, stos: set) -> None:
+    picklist_cache.invalidate(
+        lambda key: key[0] == table and (key[2] is None or key[2].upper() in stos)
+    )
+
+
+def sto_version(table: str, sto: str) -> int:
+    """
+    Versi data (table, sto) saat ini. Ambil versi SEBELUM query agar hasil yang dibaca
+    sebelum upload selesai tidak tersimpan di bawah versi baru.
+    """
+    return _sto_versions.get((table, sto.upper()), 0)
+
+
+@on_upload
+def _bump_versions(table: str, stos: set) -> None:
+    # Entri render versi lama tidak akan dibaca lagi dan tersingkir oleh LRU/TTL
+    for sto in stos:
+        _sto_versions[(table, sto)] = _sto_versions.get((table, sto), 0) + 1
+
+
+@on_upload
+def _invalidate_inline(table: str, stos: set) -> None:
+    # Key inline tidak memuat tabel/STO, jadi upload apa pun mengosongkan semuanya
+    inline_cache.clear()
+
+
+def cache_stats() -> dict:
+    return {cache.name: cache.stats() for cache in (picklist_cache, inline_cache, render_cache)}
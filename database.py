@@ -1,7 +1,15 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
 import pymysql
 import os
 from dotenv import load_dotenv
 
+from executor import run_blocking
+
 load_dotenv()
 
 CONFIG = {
@@ -12,5 +20,165 @@ CONFIG = {
     'cursorclass': pymysql.cursors.DictCursor
 }
 
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX', '10'))
+POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+
+
 def get_connection_database():
-    return pymysql.connect(**CONFIG)
\ No newline at end of file
+    return pymysql.connect(**CONFIG)
+
+
+def _ping(conn) -> None:
+    conn.ping(reconnect=False)
+
+
+class ConnectionPool:
+    """
+    Pool koneksi blocking (PyMySQL) untuk dipakai dari handler async.
+    - Maksimal max_size koneksi aktif; pemanggil berikutnya menunggu tanpa memblokir event loop.
+    - Koneksi dicek (ping) saat diambil; yang mati dibuang dan diganti koneksi baru.
+    - Koneksi yang menganggur lebih dari max_idle detik ditutup (sisakan min_size).
+    - Saat dikembalikan, transaksi yang tersisa di-rollback supaya snapshot baca tidak basi.
+    """
+
+    def __init__(self, connect=get_connection_database, min_size: int = POOL_MIN_SIZE,
+                 max_size: int = POOL_MAX_SIZE, max_idle: float = POOL_MAX_IDLE, ping=_ping):
+        self._connect = connect
+        self._ping = ping
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self._idle: deque = deque()   # (conn, waktu_terakhir_dipakai)
+        self._slots = asyncio.Semaphore(max_size)
+        self._size = 0
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        """Jumlah koneksi terbuka (aktif + menganggur)."""
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def stats(self) -> dict:
+        return {"size": self._size, "idle": len(self._idle), "max": self.max_size}
+
+    async def _run(self, fn, *args):
+        return await run_blocking("db", fn, *args)
+
+    async def _open(self):
+        conn = await self._run(self._connect)
+        self._size += 1
+        return conn
+
+    async def _discard(self, conn) -> None:
+        self._size -= 1
+        try:
+            await self._run(conn.close)
+        except Exception:
+            pass
+
+    async def start(self) -> None:
+        """Buka min_size koneksi di awal supaya klik pertama tidak menunggu handshake."""
+        while self._size < self.min_size:
+            self._idle.append((await self._open(), time.monotonic()))
+
+    async def _recycle_idle(self) -> None:
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            await self._discard(conn)
+
+    async def acquire(self):
+        if self._closed:
+            raise RuntimeError("Pool database sudah ditutup.")
+        await self._slots.acquire()
+        try:
+            await self._recycle_idle()
+            while self._idle:
+                conn, _ = self._idle.pop()
+                try:
+                    await self._run(self._ping, conn)
+                    return conn
+                except Exception as e:
+                    logging.warning(f"Koneksi DB mati, dibuang dari pool: {e}")
+                    await self._discard(conn)
+            return await self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, conn, discard: bool = False) -> None:
+        try:
+            if not discard and not self._closed:
+                try:
+                    await self._run(conn.rollback)
+                except Exception:
+                    discard = True
+            if discard or self._closed:
+                await self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self):
+        """`async with pool.connection() as conn:` — koneksi otomatis kembali ke pool."""
+        conn = await self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            broken = True
+            raise
+        finally:
+            await self.release(conn, discard=broken)
+
+    async def run(self, fn, *args):
+        """Jalankan fn(conn, *args) yang blocking di thread, memakai koneksi dari pool."""
+        async with self.connection() as conn:
+            return await self._run(fn, conn, *args)
+
+    async def close(self) -> None:
+        self._closed = True
+        while self._idle:
+            conn, _ = self._idle.pop()
+            await self._discard(conn)
+
+
+_pool: ConnectionPool | None = None
+
+
+def get_pool() -> ConnectionPool:
+    """Pool bersama untuk semua handler (dibuat saat pertama dipakai)."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool()
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _fetch_all(conn, sql: str, params=None) -> list[dict]:
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+async def fetch_all(sql: str, params=None) -> list[dict]:
+    """SELECT lewat pool, dijalankan di luar event loop."""
+    return await get_pool().run(_fetch_all, sql, params)
+
+
+async def run_in_connection(fn, *args):
+    """Jalankan fungsi blocking fn(conn, *args) (mis. transaksi tulis) lewat pool."""
+    return await get_pool().run(fn, *args)
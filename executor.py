@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Konfigurasi jumlah worker & batas antrean per jenis pekerjaan
+PARSE_WORKERS = int(os.getenv('WORKER_PARSE_THREADS', '2'))
+PARSE_MAX_PENDING = int(os.getenv('WORKER_PARSE_MAX_PENDING', '8'))
+DB_WORKERS = int(os.getenv('WORKER_DB_THREADS', os.getenv('DB_POOL_MAX', '10')))
+DB_MAX_PENDING = int(os.getenv('WORKER_DB_MAX_PENDING', '100'))
+
+
+class WorkerQueue:
+    """
+    Executor thread terbatas untuk satu jenis pekerjaan blocking (parsing / DB).
+    - max_workers: berapa job jalan bersamaan.
+    - max_pending: batas job yang boleh antre + jalan; pemanggil berikutnya menunggu
+      (backpressure) tanpa memblokir event loop.
+    - Mencatat metrik: kedalaman antrean, waktu tunggu, dan durasi eksekusi.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"worker-{name}")
+        self._admission: asyncio.Semaphore | None = None
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._admission is None:
+            self._admission = asyncio.Semaphore(self.max_pending)
+        return self._admission
+
+    def _call(self, enqueued_at: float, fn, args, kwargs):
+        started = time.monotonic()
+        wait = started - enqueued_at
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.total_run += time.monotonic() - started
+
+    async def run(self, fn, *args, **kwargs):
+        enqueued_at = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        submitted = False
+        try:
+            async with self._semaphore():
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self._executor, self._call, enqueued_at, fn, args, kwargs)
+                submitted = True
+                result = await future
+        except BaseException:
+            with self._lock:
+                if not submitted:
+                    self.waiting -= 1
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            "workers": self.max_workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.total_wait / done * 1000, 1) if done else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "avg_run_ms": round(self.total_run / done * 1000, 1) if done else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=False)
+
+
+WORKERS = {
+    "parse": WorkerQueue("parse", PARSE_WORKERS, PARSE_MAX_PENDING),
+    "db": WorkerQueue("db", DB_WORKERS, DB_MAX_PENDING),
+}
+
+
+async def run_blocking(kind: str, fn, *args, **kwargs):
+    """Jalankan fungsi blocking di executor jenis `kind` ("parse" atau "db")."""
+    return await WORKERS[kind].run(fn, *args, **kwargs)
+
+
+def executor_stats() -> dict:
+    return {name: worker.stats() for name, worker in WORKERS.items()}
+
+
+async def shutdown_executors() -> None:
+    """Tunggu job yang sedang jalan selesai lalu matikan semua thread worker."""
+    for name, worker in WORKERS.items():
+        try:
+            await asyncio.to_thread(worker.shutdown)
+        except Exception as e:
+            logging.error(f"Gagal mematikan worker {name}: {e}")
@@ -1,85 +1,291 @@
+import asyncio
 import json
+import logging
 import os
+import tempfile
+import threading
+import time
 
 ALLOWED_USERS_FILE = "allowed_users.json"
 
+# Jeda minimum antar pengecekan stat() file, supaya cek akses tidak menyentuh disk tiap update
+STAT_CHECK_INTERVAL = 2.0
+# Mutasi dalam jendela ini digabung jadi satu kali tulis + fsync
+FLUSH_DELAY = 0.5
+# Jeda maksimum antar percobaan ulang bila penulisan gagal (jeda awal FLUSH_DELAY, lalu berlipat)
+FLUSH_RETRY_MAX = 30.0
 
-def load_allowed_users() -> list[dict]:
-    """Membaca semua user dari JSON."""
-    if not os.path.exists(ALLOWED_USERS_FILE):
+
+class UsersFileCorrupt(Exception):
+    """allowed_users.json tidak bisa di-parse; perubahan user ditolak sampai file diperbaiki."""
+
+
+def _read_users_file(path: str) -> list[dict] | None:
+    """Baca file user; None berarti file rusak (bukan kosong)."""
+    if not os.path.exists(path):
         return []
-    with open(ALLOWED_USERS_FILE, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         try:
             return json.load(f)
         except json.JSONDecodeError:
-            return []
+            return None
+
+
+def _atomic_write_json(path: str, data) -> None:
+    """Tulis ke file sementara di folder yang sama, fsync, lalu os.replace."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".allowed_users.", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_allowed_users() -> list[dict]:
+    """Membaca semua user dari JSON."""
+    return _read_users_file(ALLOWED_USERS_FILE) or []
+
 
 def save_allowed_users(users: list[dict]) -> None:
-    """Simpan semua user ke JSON."""
-    with open(ALLOWED_USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2, ensure_ascii=False)
+    """Simpan semua user ke JSON (atomik, pembaca tidak pernah melihat file setengah jadi)."""
+    _atomic_write_json(ALLOWED_USERS_FILE, users)
+
+
+class AccessRegistry:
+    """
+    Salinan allowed_users.json di memori, di-index per telegram_id.
+    - is_authorized / is_admin cukup lookup dict, tanpa baca file.
+    - File dibaca ulang hanya jika mtime/inode/ukuran berubah (dicek paling sering
+      tiap STAT_CHECK_INTERVAL detik) atau setelah data diubah lewat fungsi mutasi.
+    - Mutasi langsung berlaku di memori; penulisan ke disk digabung (FLUSH_DELAY)
+      dan dilakukan atomik oleh satu penulis; penulisan yang gagal dicoba ulang.
+    - Selama file rusak, mutasi ditolak (UsersFileCorrupt) agar snapshot memori — yang kosong
+      bila file sudah rusak sejak startup — tidak menimpa file tersebut.
+    """
+
+    def __init__(self, path: str, check_interval: float = STAT_CHECK_INTERVAL,
+                 flush_delay: float = FLUSH_DELAY):
+        self.path = path
+        self.check_interval = check_interval
+        self.flush_delay = flush_delay
+        self._users: dict[str, dict] = {}
+        self._signature = None
+        self._next_check = 0.0
+        self._corrupt = False
+        self._dirty = False
+        self._writing = False
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _reload(self, signature) -> None:
+        users = _read_users_file(self.path)
+        if users is None:
+            # File rusak: pertahankan data terakhir yang valid, jangan anggap kosong
+            logging.error(f"{self.path} tidak bisa di-parse, memakai data user terakhir yang valid.")
+            self._corrupt = True
+            self._signature = signature
+            return
+        self._users = {u["telegram_id"]: u for u in users}
+        self._signature = signature
+        self._corrupt = False
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            self._next_check = now + self.check_interval
+            if self._dirty or self._writing:
+                # Masih ada perubahan yang belum/sedang ditulis; memori adalah sumber kebenaran
+                return
+            signature = self._file_signature()
+            if signature != self._signature:
+                self._reload(signature)
+
+    def _mark_dirty(self) -> None:
+        """Dipanggil di dalam lock setelah data di memori diubah."""
+        self._dirty = True
+
+    def _check_writable(self) -> None:
+        """Dipanggil di dalam lock sebelum mutasi."""
+        self.invalidate()
+        self._refresh()
+        if self._corrupt:
+            raise UsersFileCorrupt(f"{self.path} rusak, perbaiki file terlebih dahulu.")
+
+    def _schedule_flush(self) -> None:
+        """Jadwalkan flush (digabung bila ada event loop); dipanggil di luar lock."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_now()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._delayed_flush())
+
+    def flush_now(self) -> None:
+        """Tulis snapshot terbaru ke disk secara sinkron (no-op jika tidak ada perubahan)."""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = [dict(u) for u in self._users.values()]
+                self._dirty = False
+                self._writing = True
+            try:
+                _atomic_write_json(self.path, snapshot)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                    self._writing = False
+                raise
+            with self._lock:
+                self._signature = self._file_signature()
+                self._writing = False
+
+    async def flush(self) -> None:
+        """Flush async: I/O di thread terpisah, satu penulis pada satu waktu (_write_lock)."""
+        await asyncio.to_thread(self.flush_now)
+
+    async def _delayed_flush(self) -> None:
+        delay = self.flush_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Perubahan tetap dirty di memori; coba lagi dengan jeda yang makin panjang
+                delay = min(max(delay, 0.1) * 2, FLUSH_RETRY_MAX)
+                logging.error(f"Gagal menyimpan {self.path}, dicoba lagi dalam {delay:.1f} detik: {e}")
+                continue
+            if not self._dirty:
+                return
+            # Mutasi yang masuk selama penulisan belum ikut tertulis
+            delay = self.flush_delay
+
+    def invalidate(self) -> None:
+        """Paksa pengecekan file pada akses berikutnya."""
+        self._next_check = 0.0
+
+    def is_authorized(self, telegram_id: str) -> bool:
+        self._refresh()
+        return telegram_id in self._users
+
+    def is_admin(self, telegram_id: str) -> bool:
+        self._refresh()
+        user = self._users.get(telegram_id)
+        return user is not None and user["role"] == "admin"
+
+    def all_users(self) -> list[dict]:
+        self._refresh()
+        return [dict(u) for u in self._users.values()]
+
+    def claim_first_admin(self, name: str, nik: str, telegram_id: str) -> bool:
+        """
+        Jadikan pemanggil admin hanya jika daftar user benar-benar kosong.
+        File yang rusak TIDAK dianggap kosong, dan cek + tambah terjadi dalam satu lock
+        sehingga dua /start bersamaan tidak bisa sama-sama jadi admin.
+        """
+        with self._lock:
+            self.invalidate()
+            self._refresh()
+            if self._users or self._corrupt:
+                return False
+            self._users[telegram_id] = {"name": name, "nik": nik, "telegram_id": telegram_id, "role": "admin"}
+            self._mark_dirty()
+        self._schedule_flush()
+        return True
+
+    def add(self, name: str, nik: str, telegram_id: str, role: str = "user") -> bool:
+        with self._lock:
+            self._check_writable()
+            if telegram_id in self._users:
+                return False
+            self._users[telegram_id] = {"name": name, "nik": nik, "telegram_id": telegram_id, "role": role}
+            self._mark_dirty()
+        self._schedule_flush()
+        return True
+
+    def remove(self, telegram_id: str) -> bool:
+        with self._lock:
+            self._check_writable()
+            if self._users.pop(telegram_id, None) is None:
+                return False
+            self._mark_dirty()
+        self._schedule_flush()
+        return True
+
+    def set_role(self, telegram_id: str, role: str) -> bool:
+        with self._lock:
+            self._check_writable()
+            user = self._users.get(telegram_id)
+            if user is None:
+                return False
+            user["role"] = role
+            self._mark_dirty()
+        self._schedule_flush()
+        return True
+
+
+registry = AccessRegistry(ALLOWED_USERS_FILE)
 
 
 def is_authorized(telegram_id: str) -> bool:
     """Cek apakah Telegram ID terdaftar sebagai user."""
-    users = load_allowed_users()
-    return any(u["telegram_id"] == telegram_id for u in users)
+    return registry.is_authorized(telegram_id)
 
 
 def is_admin(telegram_id: str) -> bool:
     """Cek apakah Telegram ID adalah admin."""
-    users = load_allowed_users()
-    return any(u["telegram_id"] == telegram_id and u["role"] == "admin" for u in users)
+    return registry.is_admin(telegram_id)
 
 
 def add_allowed_user(name: str, nik: str, telegram_id: str, role: str = "user") -> bool:
     """Tambahkan user baru ke daftar JSON."""
-    users = load_allowed_users()
-    if any(u["telegram_id"] == telegram_id for u in users):
-        return False
-    users.append({"name": name, "nik": nik, "telegram_id": telegram_id, "role": role})
-    save_allowed_users(users)
-    return True
+    return registry.add(name, nik, telegram_id, role)
 
 
 def remove_allowed_user(telegram_id: str) -> bool:
     """Hapus user berdasarkan Telegram ID."""
-    users = load_allowed_users()
-    filtered = [u for u in users if u["telegram_id"] != telegram_id]
-    if len(filtered) == len(users):
-        return False
-    save_allowed_users(filtered)
-    return True
+    return registry.remove(telegram_id)
 
 
 def promote_user(telegram_id: str) -> bool:
     """Naikkan user jadi admin."""
-    users = load_allowed_users()
-    updated = False
-    for u in users:
-        if u["telegram_id"] == telegram_id:
-            u["role"] = "admin"
-            updated = True
-            break
-    if updated:
-        save_allowed_users(users)
-    return updated
+    return registry.set_role(telegram_id, "admin")
 
 
 def dismiss_user(telegram_id: str) -> bool:
     """Turunkan admin jadi user biasa."""
-    users = load_allowed_users()
-    updated = False
-    for u in users:
-        if u["telegram_id"] == telegram_id:
-            u["role"] = "user"
-            updated = True
-            break
-    if updated:
-        save_allowed_users(users)
-    return updated
+    return registry.set_role(telegram_id, "user")
 
 
 def get_all_allowed_users() -> list[dict]:
-    """Ambil semua user dari JSON."""
-    return load_allowed_users()
+    """Ambil semua user dari registry."""
+    return registry.all_users()
+
+
+def claim_first_admin(name: str, nik: str, telegram_id: str) -> bool:
+    """Daftarkan admin pertama jika belum ada user sama sekali."""
+    return registry.claim_first_admin(name, nik, telegram_id)
+
+
+async def flush_allowed_users() -> None:
+    """Pastikan semua perubahan user sudah tertulis ke disk (dipanggil saat shutdown)."""
+    await registry.flush()
@@ -1,21 +1,30 @@
 from telegram import Update
 from telegram.ext import CommandHandler, ContextTypes, ConversationHandler
+from executor import executor_stats
+from cache import cache_stats
+from hostname_index import index_stats
+from search_index import search_index
+from metro_summary import metro_summary
+from sto_coverage import coverage
+from sto_registry import sto_registry
+from outbox import outbox_stats
 from handler.access_control import (
     is_authorized, is_admin, add_allowed_user, remove_allowed_user,
-    promote_user, dismiss_user, get_all_allowed_users
+    promote_user, dismiss_user, get_all_allowed_users, claim_first_admin, UsersFileCorrupt
 )
 
 
+# Balasan saat allowed_users.json rusak (perubahan user ditolak sampai file diperbaiki)
+USERS_FILE_CORRUPT = "⚠️ Data user sedang tidak bisa dibaca (file rusak). Perubahan ditunda, hubungi admin server."
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     telegram_id = str(user.id)
-    users = get_all_allowed_users()
 
-    if not users:
-        # Jika belum ada user sama sekali → jadikan admin pertama
-        name = user.full_name
-        nik = telegram_id  # bisa diubah nanti oleh admin
-        add_allowed_user(name, nik, telegram_id, role="admin")
+    # Jika belum ada user sama sekali → jadikan admin pertama (cek + tambah atomik)
+    name = user.full_name
+    nik = telegram_id  # bisa diubah nanti oleh admin
+    if claim_first_admin(name, nik, telegram_id):
         await update.message.reply_text(
             f"👑 Kamu adalah pengguna pertama. Ditambahkan sebagai *admin* otomatis.\n",
             parse_mode="Markdown"
@@ -69,7 +78,13 @@ async def removeuser(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         await update.message.reply_text("⚠️ Kamu tidak bisa menghapus dirimu sendiri.")
         return
 
-    if remove_allowed_user(target_id):
+    try:
+        removed = remove_allowed_user(target_id)
+    except UsersFileCorrupt:
+        await update.message.reply_text(USERS_FILE_CORRUPT)
+        return
+
+    if removed:
         await update.message.reply_text(f"✅ Telegram ID {target_id} berhasil dihapus.")
     else:
         await update.message.reply_text("ℹ️ User tidak ditemukan.")
@@ -88,7 +103,13 @@ async def promote(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     target_id = context.args[0]
 
-    if promote_user(target_id):
+    try:
+        promoted = promote_user(target_id)
+    except UsersFileCorrupt:
+        await update.message.reply_text(USERS_FILE_CORRUPT)
+        return
+
+    if promoted:
         await update.message.reply_text(f"✅ Telegram ID {target_id} berhasil dijadikan *admin*.", parse_mode="Markdown")
     else:
         await update.message.reply_text(f"ℹ️ User tidak ditemukan.")
@@ -107,7 +128,13 @@ async def dismiss(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     target_id = context.args[0]
 
-    if dismiss_user(target_id):
+    try:
+        dismissed = dismiss_user(target_id)
+    except UsersFileCorrupt:
+        await update.message.reply_text(USERS_FILE_CORRUPT)
+        return
+
+    if dismissed:
         await update.message.reply_text(f"✅ Telegram ID {target_id} berhasil diturunkan menjadi *user*.", parse_mode="Markdown")
     else:
         await update.message.reply_text(f"ℹ️ User tidak ditemukan.")
@@ -147,11 +174,91 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     name = " ".join(context.args[:-1]).strip('"')
     nik = context.args[-1]
 
-    if add_allowed_user(name, nik, telegram_id, role="user"):
+    try:
+        added = add_allowed_user(name, nik, telegram_id, role="user")
+    except UsersFileCorrupt:
+        await update.message.reply_text(USERS_FILE_CORRUPT)
+        return
+
+    if added:
         await update.message.reply_text(f"✅ Registrasi berhasil. Selamat datang, *{name}*!", parse_mode="Markdown")
     else:
         await update.message.reply_text("⚠️ Gagal menambahkan. Mungkin kamu sudah terdaftar.")
 
+# /stats — metrik antrean worker & cache (admin)
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    admin = update.effective_user
+    if not is_admin(str(admin.id)):
+        await update.message.reply_text("❌ Hanya admin yang dapat melihat statistik.")
+        return
+
+    lines = ["📈 *Statistik Worker:*"]
+    for name, st in executor_stats().items():
+        lines.append(
+            f"- `{name}`: antre {st['waiting']}, jalan {st['running']}/{st['workers']}, "
+            f"selesai {st['completed']}, gagal {st['failed']}, "
+            f"tunggu rata2 {st['avg_wait_ms']} ms (maks {st['max_wait_ms']} ms), "
+            f"eksekusi rata2 {st['avg_run_ms']} ms"
+        )
+    processor = context.application.update_processor
+    if hasattr(processor, "stats"):
+        st = processor.stats()
+        lines.append(
+            f"- `updates`: antre {st['waiting']}, jalan {st['running']}/{st['workers']}, "
+            f"chat aktif {st['chats']}, selesai {st['completed']}, gagal {st['failed']}, "
+            f"tunggu rata2 {st['avg_wait_ms']} ms (maks {st['max_wait_ms']} ms)"
+        )
+    st = outbox_stats()
+    lines.append(
+        f"- `kirim`: terkirim {st['sent']} ({st['blocks']} blok), gagal {st['failed']}, retry {st['retries']}, "
+        f"tunggu limit rata2 {st['avg_wait_ms']} ms, latensi rata2 {st['avg_latency_ms']} ms (maks {st['max_latency_ms']} ms)"
+    )
+    persistence = context.application.persistence
+    if hasattr(persistence, "stats"):
+        st = persistence.stats()
+        lines.append(
+            f"- `state`: {st['loaded_users']} user dimuat, antre tulis {st['pending']}, "
+            f"{st['writes']} kali tulis ({st['rows_written']} baris)"
+        )
+    lines.append("\n🗃 *Cache:*")
+    for name, st in cache_stats().items():
+        lines.append(f"- `{name}`: {st['size']} entri, hit {st['hits']}, miss {st['misses']}")
+    lines.append("\n🔎 *Index Hostname:*")
+    for name, st in index_stats().items():
+        status = "siap" if st["ready"] else "belum dibangun"
+        lines.append(f"- `{name}`: {st['names']} nama di {st['locations']} STO ({status})")
+    st = search_index.stats()
+    status = "siap" if st["ready"] else "belum dibangun"
+    lines.append(f"- `cari`: {st['names']} nama, {st['trigrams']} trigram ({status})")
+    st = metro_summary.stats()
+    status = "siap" if st["ready"] else "belum dibangun"
+    lines.append(
+        f"- `ringkasan metro`: {st['hostnames']} hostname dirender di {st['locations']} STO, "
+        f"{st['stale']} STO menunggu refresh ({status})"
+    )
+    st = coverage.stats()
+    status = "siap" if st["ready"] else "belum dibangun"
+    lines.append(f"- `cakupan sto`: {st['stos']} STO, versi {st['version']} ({status})")
+    st = sto_registry.stats()
+    lines.append(f"- `master sto`: {st['stos']} STO di {st['witels']} witel, sumber {st['source']}, versi {st['version']}")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+# /reloadsto — muat ulang master STO dari tabel sto_master tanpa restart (admin)
+async def reloadsto(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    admin = update.effective_user
+    if not is_admin(str(admin.id)):
+        await update.message.reply_text("❌ Hanya admin yang dapat memuat ulang master STO.")
+        return
+
+    try:
+        await sto_registry.load()
+    except Exception as e:
+        await update.message.reply_text(f"❌ Gagal memuat master STO: {e}")
+        return
+
+    counts = ", ".join(f"{w.label} {len(sto_registry.stos(w.id))}" for w in sto_registry.witels())
+    await update.message.reply_text(f"✅ Master STO dimuat ulang ({sto_registry.source}): {counts} STO.")
+
 # 📌 Register semua handler
 def register_handler(app):
     app.add_handler(CommandHandler("start", start))
@@ -162,4 +269,6 @@ def register_handler(app):
     app.add_handler(CommandHandler("promote", promote))
     app.add_handler(CommandHandler("dismiss", dismiss))
     app.add_handler(CommandHandler("register", register))
+    app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("reloadsto", reloadsto))
 
@@ -0,0 +1,284 @@
+import csv
+import logging
+import os
+import re
+import tempfile
+from collections import defaultdict
+import openpyxl
+from telegram import Update
+from telegram.ext import (
+    CallbackContext,
+    ConversationHandler,
+    CommandHandler,
+    MessageHandler,
+    filters,
+)
+from telegram.constants import ParseMode
+from database import fetch_all
+from executor import run_blocking
+from hostname_index import gpon_index
+from ingest import iter_excel_batches, normalize_header
+from handler.base_command import cancel
+from handler.inputftm_command import FTM_COLUMNS
+from handler.access_control import is_authorized  # ⬅️ proteksi akses
+
+ASK_LIST = 0
+
+# Batas jumlah (nama_gpon, card, port) per permintaan dan per query IN (...)
+BATCH_LOOKUP_MAX = int(os.getenv('BATCH_LOOKUP_MAX', '5000'))
+BATCH_LOOKUP_CHUNK = int(os.getenv('BATCH_LOOKUP_CHUNK', '500'))
+
+STATUS_FOUND = "ditemukan"
+STATUS_NOT_FOUND = "card/port tidak ditemukan"
+STATUS_UNKNOWN = "GPON tidak dikenal"
+
+RESULT_COLUMNS = ("no", "input_gpon", "input_card", "input_port", "status") + FTM_COLUMNS
+
+# "<nama_gpon> <card>/<port>" atau "<nama_gpon>,<card>,<port>" (pemisah spasi/koma/titik koma/tab)
+LINE_PATTERN = re.compile(r"^\s*([^\s,;]+)[\s,;]+(\d+)\s*[/\s,;]\s*(\d+)\s*$")
+
+CSV_MIME_TYPES = ("text/csv", "text/plain", "text/comma-separated-values", "application/csv")
+EXCEL_MIME_TYPES = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.ms-excel",
+)
+
+async def _auth_guard(update: Update) -> bool:
+    user = update.effective_user
+    telegram_id = str(user.id) if user else ""
+    if is_authorized(telegram_id):
+        return True
+
+    if update.message:
+        await update.message.reply_text(
+            "❌ *Akses ditolak*\nAnda belum terdaftar di sistem. Silahkan lakukan pendaftaran dengan register.",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+    return False
+
+def parse_lines(text: str) -> tuple[list[tuple], list[str]]:
+    """Daftar tempelan → ([(nama_gpon, card, port)], [baris yang tidak dikenali])."""
+    items, errors = [], []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = LINE_PATTERN.match(line)
+        if match:
+            items.append((match.group(1), int(match.group(2)), int(match.group(3))))
+        else:
+            errors.append(line.strip())
+    return items, errors
+
+def _record_item(record: dict):
+    """Satu baris file (header sudah dinormalisasi) → (nama_gpon, card, port) atau None."""
+    name = (record.get("nama_gpon") or "").strip()
+    card, port = record.get("card"), record.get("port")
+    if card is None and port is None and record.get("card/port"):
+        card, _, port = str(record["card/port"]).partition("/")
+    try:
+        return (name, int(str(card).strip()), int(str(port).strip())) if name else None
+    except ValueError:
+        return None
+
+def _iter_csv(path: str):
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        sample = fh.read(4096)
+        fh.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(fh, dialect)
+        header = [normalize_header(h) for h in next(reader, [])]
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield {**dict(zip(header, row)), "_row": reader.line_num}
+
+def parse_file(path: str, is_excel: bool, limit: int = BATCH_LOOKUP_MAX) -> tuple[list[tuple], list[str]]:
+    """
+    File CSV/XLSX dengan kolom nama_gpon, card, port (atau card/port) → (items, errors).
+    Dibaca streaming dan berhenti begitu item melebihi `limit` (cukup untuk menolak permintaan).
+    """
+    source = iter_excel_batches(path) if is_excel else _iter_csv(path)
+    records = (r for batch in source for r in batch) if is_excel else source
+    items, errors = [], []
+    try:
+        for record in records:
+            item = _record_item(record)
+            if item:
+                items.append(item)
+                if len(items) > limit:
+                    break
+            else:
+                errors.append(f"baris {record['_row']}")
+    finally:
+        # Tutup file/workbook segera meski berhenti di tengah
+        source.close()
+    return items, errors
+
+def _port_number(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+async def lookup_ports(items: list[tuple]) -> list[tuple]:
+    """
+    Ambil data semua (nama_gpon, card, port) sekaligus:
+    - Nama → lokasi (witel, table, sto) lewat gpon_index, tanpa query.
+    - Satu query `(sto, nama_gpon, card, port) IN (...)` per tabel witel
+      (dipecah per BATCH_LOOKUP_CHUNK tuple), memakai index idx_sto_gpon_card_port.
+    Hasil: [(item, status, [row, ...])] sesuai urutan input.
+    """
+    wanted = defaultdict(set)   # table -> {(sto, nama, card, port)}
+    keys_by_item = {}
+    for item in dict.fromkeys(items):
+        name, card, port = item
+        keys = []
+        for witel, table, sto, indexed_name in gpon_index.lookup(name):
+            key = (sto, indexed_name, card, port)
+            wanted[table].add(key)
+            keys.append((table, key))
+        keys_by_item[item] = keys
+
+    rows_by_key = defaultdict(list)
+    for table, keys in wanted.items():
+        keys = sorted(keys)
+        for i in range(0, len(keys), BATCH_LOOKUP_CHUNK):
+            chunk = keys[i:i + BATCH_LOOKUP_CHUNK]
+            placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(chunk))
+            rows = await fetch_all(
+                f"""
+                SELECT * FROM {table}
+                WHERE (sto, nama_gpon, card, port) IN ({placeholders})
+                """,
+                tuple(v for key in chunk for v in key)
+            )
+            for row in rows:
+                key = (row["sto"], row["nama_gpon"], _port_number(row["card"]), _port_number(row["port"]))
+                rows_by_key[(table, key)].append(row)
+
+    results = []
+    for item in items:
+        keys = keys_by_item[item]
+        if not keys:
+            results.append((item, STATUS_UNKNOWN, []))
+            continue
+        rows = [row for key in keys for row in rows_by_key.get(key, ())]
+        results.append((item, STATUS_FOUND if rows else STATUS_NOT_FOUND, rows))
+    return results
+
+def write_results(results: list[tuple]) -> str:
+    """Tulis hasil ke file XLSX sementara (satu baris per data port); pemanggil menghapus filenya."""
+    fd, path = tempfile.mkstemp(prefix="batchgpon_", suffix=".xlsx")
+    os.close(fd)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("hasil")
+    ws.append(RESULT_COLUMNS)
+    for no, ((name, card, port), status, rows) in enumerate(results, start=1):
+        for row in rows or [{}]:
+            ws.append([no, name, card, port, status] + [row.get(col) for col in FTM_COLUMNS])
+    wb.save(path)
+    return path
+
+async def start_batchgpon(update: Update, context: CallbackContext) -> int:
+    if not await _auth_guard(update):
+        return ConversationHandler.END
+
+    await update.message.reply_text(
+        "📋 Kirim daftar port yang ingin dicek, satu per baris:\n"
+        "<code>GPON01-D5-KPO-2 1/4\nGPON01-D5-KPO-2 1/5</code>\n\n"
+        "📎 Atau unggah file <b>CSV/XLSX</b> dengan kolom <code>nama_gpon</code>, <code>card</code>, <code>port</code>.\n"
+        f"Maksimal {BATCH_LOOKUP_MAX} port. Ketik /cancel untuk batal.",
+        parse_mode=ParseMode.HTML
+    )
+    return ASK_LIST
+
+async def main_batchgpon(update: Update, context: CallbackContext) -> int:
+    if not await _auth_guard(update):
+        return ConversationHandler.END
+
+    file = update.message.document
+    if file:
+        is_excel = file.mime_type in EXCEL_MIME_TYPES
+        if not is_excel and file.mime_type not in CSV_MIME_TYPES:
+            await update.message.reply_text("❌ Format file salah! Kirim file CSV atau Excel (.xlsx).")
+            return ASK_LIST
+        processed_file = await file.get_file()
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            temp_path = tmp.name
+        try:
+            await processed_file.download_to_drive(temp_path)
+            items, errors = await run_blocking("parse", parse_file, temp_path, is_excel)
+        except Exception as e:
+            await update.message.reply_text(f"❌ Gagal membaca file: {e}\n📎 Silakan kirim ulang file yang valid.")
+            return ASK_LIST
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    else:
+        items, errors = parse_lines(update.message.text)
+
+    if not items:
+        await update.message.reply_text(
+            "⚠️ Tidak ada port yang bisa dibaca. Gunakan format <code>nama_gpon card/port</code> per baris.",
+            parse_mode=ParseMode.HTML
+        )
+        return ASK_LIST
+    if len(items) > BATCH_LOOKUP_MAX:
+        await update.message.reply_text(f"⚠️ Terlalu banyak port (lebih dari {BATCH_LOOKUP_MAX}). Maksimal {BATCH_LOOKUP_MAX} per permintaan.")
+        return ASK_LIST
+    if not await gpon_index.ensure_ready():
+        await update.message.reply_text("⏳ Index GPON belum siap, silakan coba lagi sebentar.")
+        return ASK_LIST
+
+    try:
+        results = await lookup_ports(items)
+    except Exception as e:
+        logging.error(f"Query error: {e}")
+        await update.message.reply_text("❌ Terjadi kesalahan saat mengambil data dari database.")
+        return ConversationHandler.END
+
+    counts = defaultdict(int)
+    for _, status, _ in results:
+        counts[status] += 1
+    caption = [
+        f"📊 Hasil cek {len(results)} port:",
+        f"✅ Ditemukan: {counts[STATUS_FOUND]}",
+        f"⚠️ Card/port tidak ditemukan: {counts[STATUS_NOT_FOUND]}",
+        f"❓ GPON tidak dikenal: {counts[STATUS_UNKNOWN]}",
+    ]
+    if errors:
+        caption.append(f"🚫 Tidak terbaca: {len(errors)} ({', '.join(errors[:3])}{', ...' if len(errors) > 3 else ''})")
+
+    path = await run_blocking("parse", write_results, results)
+    try:
+        with open(path, "rb") as fh:
+            await update.message.reply_document(
+                document=fh,
+                filename="hasil_cekgpon.xlsx",
+                caption="\n".join(caption)[:1024],
+            )
+    finally:
+        os.remove(path)
+    return ConversationHandler.END
+
+def register_handler(rh):
+    rh.add_handler(
+        ConversationHandler(
+            name='batchgpon',
+            persistent=True,
+            entry_points=[CommandHandler('batchgpon', start_batchgpon)],
+            states={
+                ASK_LIST: [
+                    MessageHandler(filters.Document.ALL, main_batchgpon),
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, main_batchgpon),
+                ]
+            },
+            fallbacks=[
+                CommandHandler('cancel', cancel),
+                CommandHandler('batchgpon', start_batchgpon)
+            ],
+            allow_reentry=True
+        )
+    )
@@ -0,0 +1,82 @@
+from html import escape
+from telegram import Update
+from telegram.ext import CallbackContext, CommandHandler
+from telegram.constants import ParseMode
+from search_index import search_index
+from handler.access_control import is_authorized  # ⬅️ proteksi akses
+
+FIELD_LABELS = {
+    "nama_gpon": "GPON",
+    "nama_odc": "ODC",
+    "nama_lemari_ftm_eakses": "Lemari FTM",
+    "gpon_hostname": "GPON Metro",
+    "neighbor_hostname": "Neighbor Metro",
+}
+
+# Perintah lanjutan yang bisa langsung dipakai dari hasil pencarian
+NEXT_COMMANDS = {
+    "nama_gpon": "/gpon {name} &lt;card&gt;/&lt;port&gt;",
+    "gpon_hostname": "/metro {name}",
+}
+
+MAX_LOCATIONS = 3
+
+async def _auth_guard(update: Update) -> bool:
+    user = update.effective_user
+    telegram_id = str(user.id) if user else ""
+    if is_authorized(telegram_id):
+        return True
+
+    if update.message:
+        await update.message.reply_text(
+            "❌ <b>Akses ditolak</b>\nAnda belum terdaftar di sistem. Silahkan lakukan pendaftaran dengan register.",
+            parse_mode=ParseMode.HTML
+        )
+    return False
+
+def _format_locations(locations: list) -> str:
+    places = sorted({f"{witel or '-'}/{sto}" for witel, _, sto in locations})
+    text = ", ".join(places[:MAX_LOCATIONS])
+    if len(places) > MAX_LOCATIONS:
+        text += f" +{len(places) - MAX_LOCATIONS}"
+    return text
+
+def format_results(query: str, results: list[dict]) -> str:
+    if not results:
+        return f"⚠️ Tidak ada nama yang cocok dengan <code>{escape(query)}</code>."
+
+    if results[0]["fuzzy"]:
+        lines = [f"🔎 Tidak ada yang cocok persis dengan <code>{escape(query)}</code>. Nama yang mirip:"]
+    else:
+        lines = [f"🔎 Hasil pencarian <code>{escape(query)}</code>:"]
+    for i, item in enumerate(results, start=1):
+        lines.append(
+            f"{i}. <code>{escape(item['name'])}</code> — {FIELD_LABELS.get(item['field'], item['field'])}"
+            f" · {escape(_format_locations(item['locations']))}"
+        )
+        next_command = NEXT_COMMANDS.get(item["field"])
+        if next_command:
+            lines.append(f"    ↳ <code>{next_command.format(name=escape(item['name']))}</code>")
+    return "\n".join(lines)
+
+async def cari(update: Update, context: CallbackContext) -> None:
+    """/cari <teks> — cari nama GPON/ODC/lemari/hostname dari sebagian nama."""
+    if not await _auth_guard(update):
+        return
+
+    query = " ".join(context.args).strip()
+    if not query:
+        await update.message.reply_text(
+            "Format: <code>/cari &lt;sebagian nama&gt;</code>\n"
+            "Contoh: <code>/cari kpo fa12</code> atau <code>/cari GPON01-D5</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    if not await search_index.ensure_ready():
+        await update.message.reply_text("⏳ Index pencarian belum siap, silakan coba lagi sebentar.")
+        return
+
+    await update.message.reply_text(format_results(query, search_index.search(query)), parse_mode=ParseMode.HTML)
+
+def register_handler(app):
+    app.add_handler(CommandHandler("cari", cari))
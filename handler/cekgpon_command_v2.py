@@ -9,20 +9,19 @@ from telegram.ext import (
     filters,
 )
 from telegram.constants import ParseMode
-from database import get_connection_database
+from database import fetch_all
+from cache import render_cache, sto_version
+from hostname_index import gpon_index
+from sto_registry import sto_registry
+from outbox import send_blocks
 from handler.base_command import cancel, start
+from handler.picklist import NEXT, Picklist
 from handler.access_control import is_authorized  # <-- pakai auth JSON
 
 logging.basicConfig(level=logging.INFO)
 
 ASK_WITEL, ASK_STO, ASK_GPON, ASK_CARD = range(4)
 
-WITEL_TABLE_MAP = {
-    "Malang": "ftm_data_mlg",
-    "Madiun": "ftm_data_mdn",
-    "Kediri": "ftm_data_kdr",
-}
-
 async def _auth_guard(update: Update, _: CallbackContext) -> bool:
     """Blokir akses jika telegram_id belum terdaftar di allowed_users.json."""
     user = update.effective_user
@@ -55,11 +54,7 @@ async def start_cekgpon(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update, context):
         return ConversationHandler.END
 
-    keyboard = [
-        [InlineKeyboardButton("Malang", callback_data="Malang")],
-        [InlineKeyboardButton("Madiun", callback_data="Madiun")],
-        [InlineKeyboardButton("Kediri", callback_data="Kediri")],
-    ]
+    keyboard = [[InlineKeyboardButton(w.label, callback_data=w.id)] for w in sto_registry.witels()]
     await update.message.reply_text(
         "📍 Silakan pilih *Witel* terlebih dahulu:",
         parse_mode="Markdown",
@@ -67,52 +62,39 @@ async def start_cekgpon(update: Update, context: CallbackContext) -> int:
     )
     return ASK_WITEL
 
+# Pilihan STO & GPON berhalaman (keyset pagination, lihat handler/picklist.py)
+sto_picklist = Picklist("STO_", "sto", page_size=15)
+gpon_picklist = Picklist("GPON_", "nama_gpon", page_size=9)
+
+def _sto_text(witel: str, page: int) -> str:
+    return f"✅ Witel *{witel}* dipilih.\n\nSilakan pilih *STO* yang tersedia _(halaman {page + 1})_:"
+
 async def handle_witel_selection(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update, context):
         return ConversationHandler.END
 
     query = update.callback_query
     await query.answer()
-    witel = query.data
+    selected = sto_registry.witel(query.data)
+    if selected is None:
+        await query.message.reply_text("❌ Witel tidak dikenali.")
+        return ConversationHandler.END
+    witel = selected.label
     context.user_data["witel"] = witel
-    table_name = WITEL_TABLE_MAP.get(witel)
+    table_name = selected.table("FTM")
 
     try:
-        conn = get_connection_database()
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT DISTINCT sto FROM {table_name}
-                WHERE LOWER(witel) = LOWER(%s)
-                ORDER BY sto
-                """,
-                (witel,)
-            )
-            sto_result = cursor.fetchall()
-            sto_list = [row["sto"] for row in sto_result if row["sto"]]
+        markup, _ = await sto_picklist.markup(table_name, (("witel", witel.upper()),))
     except Exception as e:
         logging.error(f"Gagal ambil daftar STO: {e}")
         await query.message.reply_text("❌ Gagal mengambil daftar STO dari database.")
         return ConversationHandler.END
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
-
-    if sto_list:
-        buttons = []
-        for i in range(0, len(sto_list), 3):
-            row_buttons = [
-                InlineKeyboardButton(sto, callback_data=f"STO_{sto}")
-                for sto in sto_list[i:i+3]
-            ]
-            buttons.append(row_buttons)
 
+    if markup:
         await query.message.reply_text(
-            f"✅ Witel *{witel}* dipilih.\n\nSilakan pilih *STO* yang tersedia:",
+            _sto_text(witel, 0),
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(buttons)
+            reply_markup=markup
         )
         return ASK_STO
     else:
@@ -129,31 +111,21 @@ async def handle_sto_selection(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     await query.answer()
 
-    sto_selected = query.data.replace("STO_", "")
-    context.user_data["nama_sto"] = sto_selected
-
     witel = context.user_data.get("witel")
-    table_name = WITEL_TABLE_MAP.get(witel)
+    table_name = sto_registry.table("FTM", witel)
+    choice = sto_picklist.parse(query.data)
 
     try:
-        conn = get_connection_database()
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT DISTINCT nama_gpon FROM {table_name}
-                WHERE LOWER(witel) = LOWER(%s) AND LOWER(sto) = LOWER(%s)
-                """,
-                (witel, sto_selected),
-            )
-            results = cursor.fetchall()
-
-        gpon_list = [row["nama_gpon"] for row in results if row["nama_gpon"]]
-        unique_gpon = sorted(set(gpon_list))
-
-        if unique_gpon:
-            context.user_data["gpon_list"] = unique_gpon
-            context.user_data["gpon_page"] = 0
-            await show_gpon_page(update, context, use_message=False)
+        if choice is None or choice[0] == "page":
+            # Geser halaman STO (atau tampilkan ulang halaman pertama untuk tombol sebelum restart)
+            _, direction, anchor, page = choice or (None, NEXT, None, 0)
+            markup, _ = await sto_picklist.markup(table_name, (("witel", witel.upper()),), direction, anchor, page)
+            await query.edit_message_text(_sto_text(witel, page), parse_mode="Markdown", reply_markup=markup)
+            return ASK_STO
+
+        sto_selected = choice[1]
+        context.user_data["nama_sto"] = sto_selected
+        if await show_gpon_page(update, context):
             return ASK_GPON
         else:
             await query.edit_message_text(
@@ -166,65 +138,24 @@ async def handle_sto_selection(update: Update, context: CallbackContext) -> int:
         logging.error(f"DB Error: {e}")
         await query.edit_message_text("❌ Terjadi kesalahan saat mengambil data dari database.")
         return ConversationHandler.END
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
-async def show_gpon_page(update: Update, context: CallbackContext, use_message=True):
+async def show_gpon_page(update: Update, context: CallbackContext, direction: str = NEXT,
+                         anchor: str | None = None, page: int = 0) -> bool:
+    """Tampilkan satu halaman GPON di STO terpilih; False bila STO tidak punya GPON."""
     # Fungsi ini dipanggil dari handler yang sudah lewat _auth_guard
-    gpons = context.user_data.get("gpon_list", [])
-    page = context.user_data.get("gpon_page", 0)
-    per_page = 9
-
-    total_pages = (len(gpons) + per_page - 1) // per_page or 1
-    # amankan indeks halaman
-    page = max(0, min(page, total_pages - 1))
-    context.user_data["gpon_page"] = page
-
-    start = page * per_page
-    end = start + per_page
-    current_page = gpons[start:end]
-
-    buttons = []
-    for i in range(0, len(current_page), 3):
-        row = [
-            InlineKeyboardButton(gpon, callback_data=f"GPON_{gpon}")
-            for gpon in current_page[i:i+3]
-        ]
-        buttons.append(row)
-
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Sebelumnya", callback_data="prev_gpon"))
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("➡️ Berikutnya", callback_data="next_gpon"))
-    if nav_buttons:
-        buttons.append(nav_buttons)
-
-    msg = f"*Pilih GPON* _(halaman {page+1}/{total_pages})_ untuk STO *{context.user_data.get('nama_sto')}*:"
-    markup = InlineKeyboardMarkup(buttons)
-
-    if use_message and update.message:
-        await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
-    else:
-        await update.callback_query.edit_message_text(msg, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
-
-async def handle_pagination(update: Update, context: CallbackContext) -> int:
-    if not await _auth_guard(update, context):
-        return ConversationHandler.END
-
-    query = update.callback_query
-    await query.answer()
-
-    if query.data == "next_gpon":
-        context.user_data["gpon_page"] = context.user_data.get("gpon_page", 0) + 1
-    elif query.data == "prev_gpon":
-        context.user_data["gpon_page"] = context.user_data.get("gpon_page", 0) - 1
+    witel = context.user_data["witel"]
+    nama_sto = context.user_data["nama_sto"]
+    markup, _ = await gpon_picklist.markup(
+        sto_registry.table("FTM", witel),
+        (("witel", witel.upper()), ("sto", nama_sto.upper())),
+        direction, anchor, page,
+    )
+    if markup is None:
+        return False
 
-    await show_gpon_page(update, context, use_message=False)
-    return ASK_GPON
+    msg = f"*Pilih GPON* _(halaman {page + 1})_ untuk STO *{nama_sto}*:"
+    await update.callback_query.edit_message_text(msg, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+    return True
 
 async def handle_gpon_selection(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update, context):
@@ -232,8 +163,18 @@ async def handle_gpon_selection(update: Update, context: CallbackContext) -> int
 
     query = update.callback_query
     await query.answer()
-    selected_gpon = query.data.replace("GPON_", "")
-    context.user_data["nama_gpon"] = selected_gpon
+    choice = gpon_picklist.parse(query.data)
+    if choice is None or choice[0] == "page":
+        # Geser halaman, atau tombol dari sebelum bot restart: tampilkan ulang halaman pertama
+        _, direction, anchor, page = choice or (None, NEXT, None, 0)
+        try:
+            await show_gpon_page(update, context, direction, anchor, page)
+        except Exception as e:
+            logging.error(f"DB Error: {e}")
+            await query.edit_message_text("❌ Terjadi kesalahan saat mengambil data dari database.")
+            return ConversationHandler.END
+        return ASK_GPON
+    context.user_data["nama_gpon"] = choice[1]
 
     await query.message.reply_text(
         "Silakan masukkan Nomor Slot/Port dalam format `card/port`.\n\nContoh: `1/1`",
@@ -241,6 +182,53 @@ async def handle_gpon_selection(update: Update, context: CallbackContext) -> int
     )
     return ASK_CARD
 
+def _parse_card_port(text: str) -> tuple[int, int]:
+    card_number, port_number = text.split("/")
+    return int(card_number.strip()), int(port_number.strip())
+
+def format_gpon(gpon_data: dict) -> str:
+    return f"""
+✅ *Data GPON Ditemukan!*
+📌 *Witel:* {gpon_data["witel"]}
+🏢 *STO:* {gpon_data["sto"]}
+🛜 *IP:* {gpon_data["ip"]}
+🔢 *Nama GPON:* {gpon_data["nama_gpon"]}
+🛠 *Card:* {gpon_data["card"]}
+🔌 *Port:* {gpon_data["port"]}
+
+📡 *Lemari FTM Eakses:* {gpon_data["nama_lemari_ftm_eakses"]}
+🎛 *Panel Eakses:* {gpon_data["no_panel_eakses"]} (Port {gpon_data["no_port_panel_eakses"]})
+
+🟢 *Status Feeder:* {gpon_data["status_feeder"]}
+🔗 *Nama Feeder:* {gpon_data["nama_segmen_feeder_utama"]}
+
+🏢 *ODC:* {gpon_data["nama_odc"]}
+"""
+
+async def gpon_blocks(table_name: str, witel: str, sto: str, nama_gpon: str, card_number: int, port_number: int) -> list[str]:
+    """
+    Blok hasil (Markdown) untuk satu card/port, lewat render_cache.
+    Key memuat versi STO, jadi upload /inputftm untuk STO itu otomatis membuat cache lama tidak terpakai.
+    """
+    # witel bisa NULL di data lama (lokasi dari gpon_index); <=> mencocokkan NULL dengan NULL
+    witel, sto = (witel.upper() if witel else None), sto.upper()
+    key = (table_name, sto, sto_version(table_name, sto), witel or "", nama_gpon.upper(), card_number, port_number)
+
+    async def load():
+        results = await fetch_all(
+            f"""
+            SELECT * FROM {table_name}
+            WHERE sto = %s
+            AND nama_gpon = %s
+            AND card = %s AND port = %s
+            AND witel <=> %s
+            """,
+            (sto, nama_gpon, card_number, port_number, witel)
+        )
+        return [format_gpon(row).strip() for row in results]
+
+    return await render_cache.get_or_load(key, load)
+
 async def main_cekgpon(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update, context):
         return ConversationHandler.END
@@ -249,16 +237,14 @@ async def main_cekgpon(update: Update, context: CallbackContext) -> int:
     nama_sto = context.user_data.get("nama_sto")
     nama_gpon = context.user_data.get("nama_gpon")
     slot_input = update.message.text.strip()
-    table_name = WITEL_TABLE_MAP.get(witel)
+    table_name = sto_registry.table("FTM", witel)
 
     if not table_name:
         await update.message.reply_text("❌ Witel tidak dikenali.")
         return ConversationHandler.END
 
     try:
-        card_number, port_number = slot_input.split("/")
-        card_number = int(card_number.strip())
-        port_number = int(port_number.strip())
+        card_number, port_number = _parse_card_port(slot_input)
     except ValueError:
         await update.message.reply_text(
             "❌ Format salah. Gunakan format `card/port`.\nContoh: `3/4`",
@@ -267,65 +253,73 @@ async def main_cekgpon(update: Update, context: CallbackContext) -> int:
         return ASK_CARD
 
     try:
-        conn = get_connection_database()
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT * FROM {table_name}
-                WHERE LOWER(witel) = LOWER(%s)
-                AND LOWER(sto) = LOWER(%s)
-                AND LOWER(nama_gpon) = LOWER(%s)
-                AND card = %s AND port = %s
-                """,
-                (witel, nama_sto, nama_gpon, card_number, port_number)
-            )
-            results = cursor.fetchall()
+        blocks = await gpon_blocks(table_name, witel, nama_sto, nama_gpon, card_number, port_number)
 
-        if results:
-            for gpon_data in results:
-                result_text = f"""
-✅ *Data GPON Ditemukan!*
-📌 *Witel:* {gpon_data["witel"]}
-🏢 *STO:* {gpon_data["sto"]}
-🛜 *IP:* {gpon_data["ip"]}
-🔢 *Nama GPON:* {gpon_data["nama_gpon"]}
-🛠 *Card:* {gpon_data["card"]}
-🔌 *Port:* {gpon_data["port"]}
-
-📡 *Lemari FTM Eakses:* {gpon_data["nama_lemari_ftm_eakses"]}
-🎛 *Panel Eakses:* {gpon_data["no_panel_eakses"]} (Port {gpon_data["no_port_panel_eakses"]})
-
-🟢 *Status Feeder:* {gpon_data["status_feeder"]}
-🔗 *Nama Feeder:* {gpon_data["nama_segmen_feeder_utama"]}
-
-🏢 *ODC:* {gpon_data["nama_odc"]}
-"""
-                await update.message.reply_text(result_text, parse_mode="Markdown")
+        if blocks:
+            # Banyak baris digabung per pesan (≤4096 karakter) dan dikirim lewat rate limiter
+            await send_blocks(update.message, blocks, parse_mode="Markdown")
         else:
             await update.message.reply_text("⚠️ Data tidak ditemukan untuk input tersebut.")
 
     except Exception as e:
         logging.error(f"Query error: {e}")
         await update.message.reply_text("❌ Terjadi kesalahan saat mengambil data dari database.")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
     return ConversationHandler.END
 
+async def cek_gpon_direct(update: Update, context: CallbackContext) -> None:
+    """/gpon <nama_gpon> <card>/<port> — langsung cari tanpa menu witel/STO/GPON."""
+    if not await _auth_guard(update, context):
+        return
+
+    usage = "Format: `/gpon <nama_gpon> <card>/<port>`\nContoh: `/gpon GPON01-D5-KPO-2 1/4`"
+    if len(context.args) != 2:
+        await update.message.reply_text(usage, parse_mode="Markdown")
+        return
+    nama_gpon, slot_input = context.args
+    try:
+        card_number, port_number = _parse_card_port(slot_input)
+    except ValueError:
+        await update.message.reply_text(f"❌ Format card/port salah.\n{usage}", parse_mode="Markdown")
+        return
+
+    locations = await gpon_index.locate(nama_gpon)
+    if not locations:
+        similar = gpon_index.suggest(nama_gpon)
+        text = f"⚠️ GPON `{nama_gpon}` tidak ditemukan."
+        if similar:
+            text += "\nMungkin maksud Anda: " + ", ".join(f"`{x}`" for x in similar)
+        await update.message.reply_text(text, parse_mode="Markdown")
+        return
+
+    messages = []
+    try:
+        # Biasanya satu lokasi → satu query (atau nol bila sudah ada di render_cache)
+        for witel, table_name, sto, name in locations:
+            messages.extend(await gpon_blocks(table_name, witel, sto, name, card_number, port_number))
+    except Exception as e:
+        logging.error(f"Query error: {e}")
+        await update.message.reply_text("❌ Terjadi kesalahan saat mengambil data dari database.")
+        return
+
+    if messages:
+        await send_blocks(update.message, messages, parse_mode="Markdown")
+    else:
+        await update.message.reply_text(
+            f"⚠️ Tidak ada data untuk `{nama_gpon}` card/port `{card_number}/{port_number}`.",
+            parse_mode="Markdown"
+        )
+
 def register_handler(rh):
     print("✅ cekgpon handler registered")
     handler = ConversationHandler(
+        name="cekgpon",
+        persistent=True,
         entry_points=[CommandHandler("cekgpon", start_cekgpon)],
         states={
             ASK_WITEL: [CallbackQueryHandler(handle_witel_selection)],
             ASK_STO: [CallbackQueryHandler(handle_sto_selection, pattern="^STO_")],
-            ASK_GPON: [
-                CallbackQueryHandler(handle_pagination, pattern="^(next_gpon|prev_gpon)$"),
-                CallbackQueryHandler(handle_gpon_selection, pattern="^GPON_"),
-            ],
+            ASK_GPON: [CallbackQueryHandler(handle_gpon_selection, pattern="^GPON_")],
             ASK_CARD: [MessageHandler(filters.TEXT & ~filters.COMMAND, main_cekgpon)],
         },
         fallbacks=[
@@ -336,3 +330,4 @@ def register_handler(rh):
         allow_reentry=True
     )
     rh.add_handler(handler)
+    rh.add_handler(CommandHandler("gpon", cek_gpon_direct))
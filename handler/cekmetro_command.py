@@ -4,25 +4,19 @@ from telegram.ext import (
     MessageHandler, CallbackQueryHandler, filters
 )
 from telegram.constants import ParseMode
-from database import get_connection_database
+from hostname_index import metro_index
+from metro_summary import metro_blocks
+from sto_registry import sto_registry
+from outbox import send_blocks
 from handler.base_command import cancel
+from handler.picklist import NEXT, Picklist
 from handler.access_control import is_authorized  # ⬅️ pakai authorisasi JSON
 from html import escape
-from collections import defaultdict, Counter
 
 ASK_WITEL, ASK_STO, ASK_GPON, SHOW_RESULT = range(4)
 
-WITEL_TABLE_MAP = {
-    "MALANG": "metro_data_mlg",
-    "MADIUN": "metro_data_mdn",
-    "KEDIRI": "metro_data_kdr",
-}
-
-def chunk_list(lst, n):
-    return [lst[i:i + n] for i in range(0, len(lst), n)]
-
-def format_counter(counter_dict):
-    return ', '.join([f"{v} × {k}" for k, v in counter_dict.items()])
+# Pilihan sebelumnya hilang dari user_data (mis. bot restart di tengah percakapan)
+SESSION_EXPIRED = "⚠️ Sesi pilihan sudah berakhir. Silakan /cekmetro ulang."
 
 async def _auth_guard(update: Update) -> bool:
     user = update.effective_user
@@ -51,11 +45,7 @@ async def start_cekmetro(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
 
-    keyboard = [
-        [InlineKeyboardButton("Malang", callback_data="MALANG")],
-        [InlineKeyboardButton("Madiun", callback_data="MADIUN")],
-        [InlineKeyboardButton("Kediri", callback_data="KEDIRI")]
-    ]
+    keyboard = [[InlineKeyboardButton(w.label, callback_data=w.id)] for w in sto_registry.witels()]
     await update.message.reply_text(
         "📍 Silakan pilih <b>Witel</b> terlebih dahulu:",
         reply_markup=InlineKeyboardMarkup(keyboard),
@@ -63,44 +53,41 @@ async def start_cekmetro(update: Update, context: CallbackContext) -> int:
     )
     return ASK_WITEL
 
+# Pilihan STO & hostname berhalaman (keyset pagination, lihat handler/picklist.py)
+sto_picklist = Picklist("sto_", "sto", page_size=15)
+hostname_picklist = Picklist("gpon_", "gpon_hostname", page_size=12)
+
+def _sto_text(witel: str, page: int) -> str:
+    return f"✅ Witel <b>{escape(witel)}</b> dipilih.\n\nSilakan pilih <b>STO</b> yang tersedia <i>(halaman {page + 1})</i>:"
+
+def _hostname_text(sto: str, page: int) -> str:
+    return f"✅ STO <b>{escape(sto)}</b> dipilih.\n\nSilakan pilih <b>GPON Hostname</b> <i>(halaman {page + 1})</i>:"
+
 async def handle_witel_selection(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
 
     query = update.callback_query
     await query.answer()
-    witel = query.data
+    selected = sto_registry.witel(query.data)
+    if selected is None:
+        await query.edit_message_text("⚠️ Witel tidak dikenali.")
+        return ConversationHandler.END
+    witel = selected.name
     context.user_data["selected_witel"] = witel
-    context.user_data["table_name"] = WITEL_TABLE_MAP[witel]
+    context.user_data["table_name"] = selected.table("Metro")
 
     try:
-        conn = get_connection_database()
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"SELECT DISTINCT sto FROM {WITEL_TABLE_MAP[witel]} WHERE LOWER(witel) = LOWER(%s) ORDER BY sto",
-                (witel,)
-            )
-            sto_rows = cursor.fetchall()
-            sto_list = [row["sto"] for row in sto_rows if row["sto"]]
+        markup, _ = await sto_picklist.markup(selected.table("Metro"), (("witel", witel),))
     except Exception as e:
         await query.edit_message_text(f"❌ Gagal mengambil daftar STO: {escape(str(e))}")
         return ConversationHandler.END
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
-    if not sto_list:
+    if markup is None:
         await query.edit_message_text("⚠️ Tidak ditemukan data STO.")
         return ConversationHandler.END
 
-    buttons = chunk_list([InlineKeyboardButton(sto, callback_data=f"sto_{sto}") for sto in sto_list], 3)
-    await query.edit_message_text(
-        f"✅ Witel <b>{escape(witel)}</b> dipilih.\n\nSilakan pilih <b>STO</b> yang tersedia:",
-        parse_mode=ParseMode.HTML,
-        reply_markup=InlineKeyboardMarkup(buttons)
-    )
+    await query.edit_message_text(_sto_text(witel, 0), parse_mode=ParseMode.HTML, reply_markup=markup)
     return ASK_STO
 
 async def handle_sto_selection(update: Update, context: CallbackContext) -> int:
@@ -109,219 +96,123 @@ async def handle_sto_selection(update: Update, context: CallbackContext) -> int:
 
     query = update.callback_query
     await query.answer()
-    sto = query.data.replace("sto_", "")
+    witel = context.user_data.get("selected_witel")
+    table = context.user_data.get("table_name")
+    if not witel or not table:
+        await query.edit_message_text(SESSION_EXPIRED)
+        return ConversationHandler.END
+    choice = sto_picklist.parse(query.data)
+
+    if choice is None or choice[0] == "page":
+        # Geser halaman STO (atau tampilkan ulang halaman pertama untuk tombol sebelum restart)
+        _, direction, anchor, page = choice or (None, NEXT, None, 0)
+        try:
+            markup, _ = await sto_picklist.markup(table, (("witel", witel),), direction, anchor, page)
+        except Exception as e:
+            await query.edit_message_text(f"❌ Gagal mengambil daftar STO: {escape(str(e))}")
+            return ConversationHandler.END
+        await query.edit_message_text(_sto_text(witel, page), parse_mode=ParseMode.HTML, reply_markup=markup)
+        return ASK_STO
+
+    sto = choice[1]
     context.user_data["selected_sto"] = sto
-    table = context.user_data["table_name"]
 
     try:
-        conn = get_connection_database()
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT DISTINCT gpon_hostname FROM {table}
-                WHERE LOWER(sto) = LOWER(%s)
-                ORDER BY gpon_hostname
-                """,
-                (sto,)
-            )
-            results = cursor.fetchall()
-            gpons = [r["gpon_hostname"] for r in results if r["gpon_hostname"]]
+        markup, _ = await hostname_picklist.markup(table, (("sto", sto.upper()),))
     except Exception as e:
         await query.edit_message_text(f"❌ Gagal ambil gpon_hostname: {escape(str(e))}")
         return ConversationHandler.END
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
-    if not gpons:
+    if markup is None:
         await query.edit_message_text("❌ Tidak ada GPON Hostname ditemukan.")
         return ConversationHandler.END
 
-    context.user_data["gpon_hostnames"] = gpons
-    buttons = chunk_list([InlineKeyboardButton(h, callback_data=f"gpon_{h}") for h in gpons], 3)
-
-    await query.edit_message_text(
-        f"✅ STO <b>{escape(sto)}</b> dipilih.\n\nSilakan pilih <b>GPON Hostname</b>:",
-        parse_mode=ParseMode.HTML,
-        reply_markup=InlineKeyboardMarkup(buttons)
-    )
+    await query.edit_message_text(_hostname_text(sto, 0), parse_mode=ParseMode.HTML, reply_markup=markup)
     return ASK_GPON
 
-def _build_metro_message(
-    row_sample: dict,
-    gpon_intfs: list,
-    neighbor_intfs: list,
-    sfp_counter: Counter,
-    bw_counter: Counter,
-    header: str = "📅 <b>Data Metro</b>",
-    hide_otn_port: bool = False,
-    override_gpon_lacp: str | None = None,
-    extra_lines: str = ""
-) -> str:
-    """
-    Susun blok pesan dengan format seragam.
-    - gpon_intfs: list of interfaces (akan ditampilkan menumpuk).
-    - hide_otn_port: True untuk menyembunyikan baris OTN & Port (dipakai di otn_kosong).
-    - override_gpon_lacp: pakai nilai ini bila perlu (mis. dari key grouping).
-    - extra_lines: baris tambahan opsional (mis. Neighbor LACP).
-    """
-    hostname = row_sample.get("gpon_hostname") or "-"
-    gpon_ip = row_sample.get("gpon_ip") or "-"
-    merk_tipe = row_sample.get("gpon_merk_tipe") or "-"
-    gpon_lacp = override_gpon_lacp if override_gpon_lacp is not None else (row_sample.get("gpon_lacp") or "-")
-
-    # Tampilkan GPON Intf menumpuk
-    gpon_intfs = sorted(set(filter(None, gpon_intfs)))
-    if gpon_intfs:
-        gpon_intfs_str = "\n".join([f"• {escape(x)}" for x in gpon_intfs])
-    else:
-        gpon_intfs_str = "-"
-
-    neighbor_str = "\n".join([f"• {escape(x)}" for x in sorted(set(filter(None, neighbor_intfs)))]) or "-"
-
-    sfp_str = format_counter(sfp_counter) or "-"
-    bw_str = format_counter(bw_counter) or "-"
-
-    lines = [
-        f"{header}",
-        f"🖥 <b>GPON Hostname:</b> {escape(hostname)}",
-        f"🌐 <b>GPON IP:</b> {escape(gpon_ip)}",
-        f"🛠 <b>Merk/Tipe:</b> {escape(merk_tipe)}",
-        f"🔗 <b>GPON LACP:</b> {escape(gpon_lacp)}",
-    ]
-    if extra_lines:
-        lines.append(extra_lines)
-
-    # GPON Intf blok multi-baris
-    lines.append("🔌 <b>GPON Intf:</b>")
-    lines.append(gpon_intfs_str)
-
-    # OTN/Port hanya jika tidak disembunyikan dan memang ada
-    if not hide_otn_port:
-        otn = row_sample.get("otn")
-        port = row_sample.get("port")
-        if otn or port:
-            if otn:
-                lines.append(f"🧹 <b>OTN:</b> {escape(otn)}")
-            if port:
-                lines.append(f"🔌 <b>Port:</b> {escape(port)}")
-
-    # Bagian agregat
-    lines.extend([
-        "↔️ <b>Neighbor Intf:</b>",
-        neighbor_str,
-        f"💡 <b>SFP:</b> {escape(sfp_str)}",
-        f"📆 <b>BW:</b> {escape(bw_str)}",
-    ])
-
-    return "\n".join(lines).strip()
-
 async def handle_gpon_selection(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
 
     query = update.callback_query
     await query.answer()
-    gpon = query.data.replace("gpon_", "")
+    sto = context.user_data.get("selected_sto")
+    table = context.user_data.get("table_name")
+    if not sto or not table:
+        await query.edit_message_text(SESSION_EXPIRED)
+        return ConversationHandler.END
+    choice = hostname_picklist.parse(query.data)
+
+    if choice is None or choice[0] == "page":
+        # Geser halaman hostname (atau tampilkan ulang halaman pertama untuk tombol sebelum restart)
+        _, direction, anchor, page = choice or (None, NEXT, None, 0)
+        try:
+            markup, _ = await hostname_picklist.markup(table, (("sto", sto.upper()),), direction, anchor, page)
+        except Exception as e:
+            await query.edit_message_text(f"❌ Gagal ambil gpon_hostname: {escape(str(e))}")
+            return ConversationHandler.END
+        await query.edit_message_text(_hostname_text(sto, page), parse_mode=ParseMode.HTML, reply_markup=markup)
+        return ASK_GPON
+
+    gpon = choice[1]
     context.user_data["selected_gpon"] = gpon
-    sto = context.user_data["selected_sto"]
-    table = context.user_data["table_name"]
 
     try:
-        conn = get_connection_database()
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT * FROM {table}
-                WHERE LOWER(sto) = LOWER(%s)
-                AND LOWER(gpon_hostname) = LOWER(%s)
-                """,
-                (sto, gpon)
-            )
-            results = cursor.fetchall()
+        # Blok sudah dikelompokkan + dirender saat upload/startup (metro_summary)
+        messages = await metro_blocks(table, sto, gpon)
     except Exception as e:
         await query.edit_message_text(f"❌ Gagal ambil data: {escape(str(e))}")
         return ConversationHandler.END
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
-    if not results:
+    if not messages:
         await query.edit_message_text("⚠️ Data tidak ditemukan.")
         return ConversationHandler.END
 
-    otn_kosong = []
-    otn_ada = []
-    for row in results:
-        if row.get("otn"):
-            otn_ada.append(row)
-        else:
-            otn_kosong.append(row)
-
-    # === OTN KOSONG: tampilkan tanpa OTN/Port, GPON Intf ditumpuk ===
-    if otn_kosong:
-        grouped = defaultdict(list)
-        # Group by (gpon_lacp, neighbor_lacp)
-        for row in otn_kosong:
-            key = (row.get("gpon_lacp") or "-", row.get("neighbor_lacp") or "-")
-            grouped[key].append(row)
-
-        for (g_lacp, n_lacp), group_rows in grouped.items():
-            sample = group_rows[0]
-            gpon_intfs = [r.get("gpon_intf") for r in group_rows if r.get("gpon_intf")]
-            neighbor_intfs = [r.get("neighbor_intf") for r in group_rows if r.get("neighbor_intf")]
-            sfp_counter = Counter([r.get("sfp") for r in group_rows if r.get("sfp")])
-            bw_counter = Counter([r.get("bw") for r in group_rows if r.get("bw")])
-
-            extra = f"🧭 <b>Neighbor LACP:</b> {escape(n_lacp)}"
-            msg = _build_metro_message(
-                row_sample=sample,
-                gpon_intfs=gpon_intfs,
-                neighbor_intfs=neighbor_intfs,
-                sfp_counter=sfp_counter,
-                bw_counter=bw_counter,
-                header="📅 <b>Data Metro (Tidak melalui OTN)</b>",
-                hide_otn_port=True,                 # ⬅️ sembunyikan OTN/Port
-                override_gpon_lacp=g_lacp,
-                extra_lines=extra
-            )
-            await query.message.reply_text(msg, parse_mode=ParseMode.HTML)
-
-    # === OTN ADA: pakai template yang sama, Intf ditumpuk, OTN/Port ditampilkan bila ada ===
-    if otn_ada:
-        grouped = defaultdict(list)
-        # Group by gpon_hostname
-        for row in otn_ada:
-            key = row.get("gpon_hostname") or "-"
-            grouped[key].append(row)
-
-        for hostname, group_rows in grouped.items():
-            sample = group_rows[0]
-            gpon_intfs = [r.get("gpon_intf") for r in group_rows if r.get("gpon_intf")]
-            neighbor_intfs = [r.get("neighbor_intf") for r in group_rows if r.get("neighbor_intf")]
-            sfp_counter = Counter([r.get("sfp") for r in group_rows if r.get("sfp")])
-            bw_counter = Counter([r.get("bw") for r in group_rows if r.get("bw")])
-
-            msg = _build_metro_message(
-                row_sample=sample,
-                gpon_intfs=gpon_intfs,
-                neighbor_intfs=neighbor_intfs,
-                sfp_counter=sfp_counter,
-                bw_counter=bw_counter,
-                header="📅 <b>Data Metro</b>",
-                hide_otn_port=False,   # hanya muncul kalau field-nya ada
-            )
-            await query.message.reply_text(msg, parse_mode=ParseMode.HTML)
+    await send_blocks(query.message, messages, parse_mode=ParseMode.HTML)
 
     return ConversationHandler.END
 
+async def cek_metro_direct(update: Update, context: CallbackContext) -> None:
+    """/metro <gpon_hostname> — langsung cari tanpa menu witel/STO/GPON."""
+    if not await _auth_guard(update):
+        return
+
+    if len(context.args) != 1:
+        await update.message.reply_text(
+            "Format: <code>/metro &lt;gpon_hostname&gt;</code>\nContoh: <code>/metro GPON01-D5-APG-3</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    hostname = context.args[0]
+
+    locations = await metro_index.locate(hostname)
+    if not locations:
+        similar = metro_index.suggest(hostname)
+        text = f"⚠️ GPON Hostname <code>{escape(hostname)}</code> tidak ditemukan."
+        if similar:
+            text += "\nMungkin maksud Anda: " + ", ".join(f"<code>{escape(x)}</code>" for x in similar)
+        await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+        return
+
+    messages = []
+    try:
+        for witel, table, sto, name in locations:
+            messages.extend(await metro_blocks(table, sto, name))
+    except Exception as e:
+        await update.message.reply_text(f"❌ Gagal ambil data: {escape(str(e))}")
+        return
+
+    if not messages:
+        await update.message.reply_text("⚠️ Data tidak ditemukan.")
+        return
+
+    await send_blocks(update.message, messages, parse_mode=ParseMode.HTML)
+
 def register_handler(app):
     app.add_handler(
         ConversationHandler(
+            name="cekmetro",
+            persistent=True,
             entry_points=[CommandHandler("cekmetro", start_cekmetro)],
             states={
                 ASK_WITEL: [CallbackQueryHandler(handle_witel_selection)],
@@ -332,3 +223,4 @@ def register_handler(app):
             allow_reentry=True,
         )
     )
+    app.add_handler(CommandHandler("metro", cek_metro_direct))
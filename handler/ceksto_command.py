@@ -4,37 +4,21 @@ from telegram.ext import (
     CommandHandler, CallbackQueryHandler
 )
 from telegram.constants import ParseMode
-from database import get_connection_database
+from html import escape
+from outbox import send_blocks
+from sto_coverage import coverage
+from sto_registry import DATA_TYPES, sto_registry
 from handler.access_control import is_authorized  # ⬅️ proteksi akses
 import logging
+import os
 
-CHOOSE_DATA_TYPE, CHOOSE_WITEL = range(2)
-
-TABLE_MAP = {
-    'FTM': {
-        'Malang': 'ftm_data_mlg',
-        'Madiun': 'ftm_data_mdn',
-        'Kediri': 'ftm_data_kdr',
-    },
-    'Metro': {
-        'Malang': 'metro_data_mlg',
-        'Madiun': 'metro_data_mdn',
-        'Kediri': 'metro_data_kdr',
-    }
-}
-
-STO_MASTER = {
-    'FTM': {
-        'Malang': ['BTU', 'KPO', 'NTG', 'GKW', 'KEP', 'PGK', 'SBP', 'DPT', 'SBM', 'TUR', 'BNR', 'GDI', 'APG', 'DNO', 'BLB', 'GDG', 'KLJ', 'MLG', 'PKS', 'TMP', 'BRG', 'SWJ', 'LWG', 'SGS'],
-        'Madiun': ['BCR', 'BJN', 'CRB', 'GGR', 'JEN', 'JGO', 'JTR', 'KDU', 'KRJ', 'KRK', 'LOG', 'MGT', 'MNZ', 'MRR', 'MSP', 'NWI', 'PAD', 'PLG', 'PNG', 'PNZ', 'PON', 'RGL', 'SAR', 'SAT', 'SLH', 'SMJ', 'SMO', 'TAW', 'TNZ', 'UTR', 'WKU'],
-        'Kediri': ['BLR', 'BNU', 'CAT', 'DRN', 'GON', 'GUR', 'KAA', 'KBN', 'KTS', 'KWR', 'LDY', 'MJT', 'NDL', 'NGU', 'NJK', 'PAE', 'PAN', 'PPR', 'PRB', 'PRI', 'SBI', 'SNT', 'TRE', 'TUL', 'WAT', 'WGI', 'WRJ']
-    },
-    'Metro': {
-        'Malang': ['BTU', 'KPO', 'NTG', 'GKW', 'KEP', 'PGK', 'SBP', 'DPT', 'SBM', 'TUR', 'BNR', 'GDI', 'APG', 'DNO', 'BLB', 'GDG', 'KLJ', 'MLG', 'PKS', 'TMP', 'BRG', 'SWJ', 'LWG', 'SGS'],
-        'Madiun': ['BCR', 'BJN', 'CRB', 'GGR', 'JEN', 'JGO', 'JTR', 'KDU', 'KRJ', 'KRK', 'LOG', 'MGT', 'MNZ', 'MRR', 'MSP', 'NWI', 'PAD', 'PLG', 'PNG', 'PNZ', 'PON', 'RGL', 'SAR', 'SAT', 'SLH', 'SMJ', 'SMO', 'TAW', 'TNZ', 'UTR', 'WKU'],
-        'Kediri': ['BLR', 'BNU', 'CAT', 'DRN', 'GON', 'GUR', 'KAA', 'KBN', 'KTS', 'KWR', 'LDY', 'MJT', 'NDL', 'NGU', 'NJK', 'PAE', 'PAN', 'PPR', 'PRB', 'PRI', 'SBI', 'SNT', 'TRE', 'TUL', 'WAT', 'WGI', 'WRJ']
-    }
-}
+CHOOSE_DATA_TYPE = 0
+
+# Nama kolom "GPON" di dashboard per jenis data
+UNIT_LABEL = {'FTM': 'GPON', 'Metro': 'Host'}
+
+# Baris STO per tabel <pre>; tabel dipecah agar tiap blok jauh di bawah batas pesan
+DASHBOARD_TABLE_ROWS = int(os.getenv('DASHBOARD_TABLE_ROWS', '40'))
 
 async def _auth_guard(update: Update) -> bool:
     user = update.effective_user
@@ -74,6 +58,56 @@ async def start_ceksto(update: Update, context: CallbackContext) -> int:
     )
     return CHOOSE_DATA_TYPE
 
+def _number(value: int) -> str:
+    return f"{value:,}".replace(",", ".")
+
+def _date(value, fmt: str = "%d-%m") -> str:
+    return value.strftime(fmt) if value else "-"
+
+def render_dashboard(data_type: str) -> list[str]:
+    """
+    Cakupan STO ketiga witel untuk satu jenis data sebagai blok HTML kecil
+    (ringkasan witel, potongan tabel <pre>, daftar STO), supaya pack_blocks bisa memecah
+    pesan di atas 4096 karakter tanpa memotong tag.
+    """
+    unit = UNIT_LABEL[data_type]
+    blocks = []
+    for witel in sto_registry.witels():
+        master = sto_registry.stos(witel.id)
+        valid = sto_registry.valid_stos(witel.id)
+        info = coverage.table(witel.table(data_type))
+        present = [sto for sto in master if sto in info]
+        missing = [sto for sto in master if sto not in info]
+        unknown = sorted(set(info) - valid)
+
+        shown = present + unknown
+        total_rows = sum(info[sto]["rows"] for sto in shown)
+        total_gpons = sum(info[sto]["gpons"] for sto in shown)
+        uploads = [info[sto]["uploaded_at"] for sto in shown if info[sto]["uploaded_at"]]
+
+        header = (
+            f"\n<b>{escape(witel.label)}</b> ✔️ {len(present)}/{len(master)} STO · {_number(total_rows)} baris · "
+            f"{_number(total_gpons)} {unit}"
+        )
+        if uploads:
+            header += f"\n🕒 Upload terakhir: {_date(max(uploads), '%d-%m-%Y %H:%M')}"
+        blocks.append(header)
+        for i in range(0, len(shown), DASHBOARD_TABLE_ROWS):
+            table = [f"{'STO':<4}{'baris':>8}{unit:>6} upload"]
+            for sto in shown[i:i + DASHBOARD_TABLE_ROWS]:
+                row = info[sto]
+                mark = "" if sto in present else " ?"
+                table.append(f"{escape(f'{sto:<4}')}{row['rows']:>8}{row['gpons']:>6} {_date(row['uploaded_at'])}{mark}")
+            blocks.append("<pre>" + "\n".join(table) + "</pre>")
+        if missing:
+            blocks.append(f"❌ Belum ada data: {escape(', '.join(missing))}")
+        if unknown:
+            blocks.append(f"⚠️ Tidak ada di master (?): {escape(', '.join(unknown))}")
+    return blocks
+
+# Blok dashboard terakhir per jenis data: data_type → ((versi coverage, versi master STO), blok)
+_rendered: dict[str, tuple[tuple, list[str]]] = {}
+
 async def choose_data_type(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
@@ -81,59 +115,32 @@ async def choose_data_type(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     await query.answer()
     data_type = query.data
-    context.user_data["data_type"] = data_type
-
-    keyboard = [[InlineKeyboardButton(witel, callback_data=witel)] for witel in TABLE_MAP[data_type].keys()]
-    await query.edit_message_text(
-        f"✅ Jenis data *{data_type}* dipilih.\n\nSekarang pilih *WITEL*:",
-        parse_mode='Markdown',
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
-    return CHOOSE_WITEL
-
-async def choose_witel(update: Update, context: CallbackContext) -> int:
-    if not await _auth_guard(update):
+    if data_type not in DATA_TYPES:
         return ConversationHandler.END
 
-    query = update.callback_query
-    await query.answer()
-
-    witel = query.data
-    data_type = context.user_data["data_type"]
-    context.user_data["witel"] = witel
-
-    table_name = TABLE_MAP[data_type][witel]
-    sto_master = STO_MASTER[data_type][witel]
-
     try:
-        conn = get_connection_database()
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT DISTINCT sto FROM {table_name}")
-            db_sto = {row['sto'].upper() for row in cursor.fetchall()}
+        await coverage.ensure_ready()
     except Exception as e:
         logging.error(f"DB Error: {e}")
         await query.edit_message_text("❌ Gagal mengakses database.")
         return ConversationHandler.END
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
 
-    result_text = f"📋 *Status STO - {data_type} - {witel}*\n\n"
-    for idx, sto in enumerate(sto_master, start=1):
-        status = '✔️' if sto in db_sto else '❌'
-        result_text += f"{idx}. {sto} {status}\n"
+    version = (coverage.version, sto_registry.version)
+    cached = _rendered.get(data_type)
+    if cached is None or cached[0] != version:
+        cached = _rendered[data_type] = (version, render_dashboard(data_type))
 
-    await query.edit_message_text(result_text, parse_mode="Markdown")
+    await query.edit_message_text(f"📋 <b>Cakupan STO - {data_type}</b>", parse_mode=ParseMode.HTML)
+    await send_blocks(query.message, cached[1], parse_mode=ParseMode.HTML, sep="\n")
     return ConversationHandler.END
 
 def register_handler(app):
     conv_handler = ConversationHandler(
+        name="ceksto",
+        persistent=True,
         entry_points=[CommandHandler("ceksto", start_ceksto)],
         states={
             CHOOSE_DATA_TYPE: [CallbackQueryHandler(choose_data_type)],
-            CHOOSE_WITEL: [CallbackQueryHandler(choose_witel)]
         },
         fallbacks=[],
         allow_reentry=True,
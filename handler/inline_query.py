@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+import re
+from html import escape
+from telegram import (
+    Update,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
+)
+from telegram.ext import CallbackContext, InlineQueryHandler
+from telegram.constants import ParseMode, InlineQueryLimit
+from cache import inline_cache
+from hostname_index import gpon_index, metro_index
+from metro_summary import metro_blocks
+from search_index import search_index
+from handler.cekgpon_command_v2 import gpon_blocks
+from handler.cari_command import FIELD_LABELS
+from handler.access_control import is_authorized  # ⬅️ proteksi akses
+
+# Lama Telegram boleh menyimpan jawaban inline di server-nya (detik)
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+
+CARD_PORT = re.compile(r"^(\d+)\s*/\s*(\d+)$")
+_WHITESPACE = re.compile(r"\s+")
+
+def _result_id(*parts) -> str:
+    return hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()
+
+def _cache_key(query: str) -> str:
+    """
+    Lookup GPON/Metro mencocokkan nama persis (UPPER), jadi key hanya menyamakan huruf besar
+    dan spasi berlebih: "gpon01-d5-kpo-2  1/4" dan "GPON01-D5-KPO-2 1/4" berbagi hasil.
+    """
+    return _WHITESPACE.sub(" ", query.strip().upper())
+
+def _article(result_id: str, title: str, description: str, text: str, parse_mode: str) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(text, parse_mode=parse_mode),
+    )
+
+async def _gpon_results(name: str, card: int, port: int) -> list:
+    results = []
+    for witel, table_name, sto, nama_gpon in await gpon_index.locate(name):
+        # Query + render yang sama dengan /gpon, ikut memakai render_cache
+        for text in await gpon_blocks(table_name, witel, sto, nama_gpon, card, port):
+            results.append(_article(
+                _result_id("gpon", table_name, sto, nama_gpon, card, port, len(results)),
+                f"{nama_gpon} {card}/{port}",
+                f"{witel or '-'}/{sto}",
+                text,
+                ParseMode.MARKDOWN,
+            ))
+    return results
+
+async def _metro_results(name: str) -> list:
+    results = []
+    for witel, table, sto, hostname in await metro_index.locate(name):
+        for i, msg in enumerate(await metro_blocks(table, sto, hostname)):
+            results.append(_article(
+                _result_id("metro", table, sto, hostname, i),
+                hostname,
+                f"Metro · {witel}/{sto} · blok {i + 1}",
+                msg,
+                ParseMode.HTML,
+            ))
+    return results
+
+async def _search_results(text: str) -> list:
+    """Saran nama dari index pencarian; pesan yang dikirim berisi perintah lanjutan."""
+    results = []
+    if not await search_index.ensure_ready():
+        return results
+    for item in search_index.search(text):
+        places = ", ".join(sorted({f"{w or '-'}/{s}" for w, _, s in item["locations"]}))
+        label = FIELD_LABELS.get(item["field"], item["field"])
+        hint = ""
+        if item["field"] == "nama_gpon":
+            hint = " — tambahkan card/port, mis. <code>1/1</code>"
+        results.append(_article(
+            _result_id("cari", item["field"], item["name"]),
+            item["name"] + (" (mirip)" if item["fuzzy"] else ""),
+            f"{label} · {places}",
+            f"🔎 <b>{escape(label)}:</b> <code>{escape(item['name'])}</code>\n📍 {escape(places)}{hint}",
+            ParseMode.HTML,
+        ))
+    return results
+
+async def build_results(query: str) -> list:
+    """
+    - "<nama_gpon> <card>/<port>" → data port FTM (satu query)
+    - "<gpon_hostname>"           → data Metro
+    - lainnya                     → saran nama dari index pencarian
+    """
+    parts = query.rsplit(maxsplit=1)
+    match = CARD_PORT.match(parts[-1]) if len(parts) == 2 else None
+    if match:
+        results = await _gpon_results(parts[0], int(match.group(1)), int(match.group(2)))
+        if results:
+            return results
+    results = await _metro_results(query)
+    if results:
+        return results
+    return await _search_results(parts[0] if match else query)
+
+async def inline_lookup(update: Update, context: CallbackContext) -> None:
+    inline_query = update.inline_query
+    query = inline_query.query.strip()
+    user = inline_query.from_user
+
+    if not is_authorized(str(user.id)):
+        await inline_query.answer(
+            [],
+            cache_time=0,
+            is_personal=True,
+            button=InlineQueryResultsButton(text="Belum terdaftar — buka bot untuk register", start_parameter="register"),
+        )
+        return
+    if not query:
+        await inline_query.answer(
+            [],
+            cache_time=0,
+            button=InlineQueryResultsButton(text="Ketik nama GPON + card/port, hostname Metro, atau sebagian nama", start_parameter="help"),
+        )
+        return
+
+    key = _cache_key(query)
+    results = inline_cache.get(key)
+    if results is None:
+        # Upload selama build_results mengosongkan cache; hasil yang mungkin basi tidak disimpan
+        generation = inline_cache.generation
+        try:
+            results = (await build_results(query))[:InlineQueryLimit.RESULTS]
+        except Exception as e:
+            logging.error(f"Inline query gagal: {e}")
+            await inline_query.answer([], cache_time=0, is_personal=True)
+            return
+        inline_cache.set(key, results, generation)
+
+    # is_personal: hanya user terdaftar yang boleh melihat hasil, jadi jangan dibagi antar user di server Telegram
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+def register_handler(app):
+    app.add_handler(InlineQueryHandler(inline_lookup))
@@ -1,6 +1,6 @@
 import os
 import tempfile
-import pandas as pd
+from functools import partial
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     CallbackContext,
@@ -11,7 +11,10 @@ from telegram.ext import (
     filters,
 )
 from telegram.constants import ParseMode
-from database import get_connection_database
+from cache import notify_upload
+from sto_registry import sto_registry
+from validation import RejectReport, format_rejects, new_stats, record_batch, validate_batch
+from ingest import ExcelReadError, format_diff, format_timings, load_excel, make_loader
 from handler.base_command import cancel
 from handler.access_control import is_authorized  # ⬅️ proteksi akses
 # from handler.access_control import is_admin     # ⬅️ pakai ini jika mau khusus admin
@@ -20,20 +23,6 @@ ASK_WITEL, ASK_INPUT = range(2)
 
 EXAMPLE_LINK = "https://docs.google.com/spreadsheets/d/1bI1CQ44VFmTKug_S6m2m2vmORTV2JUwg/edit?usp=drive_link&ouid=113431965399677755925&rtpof=true&sd=true"
 
-STO_MASTER = {
-    'FTM': {
-        'mlg': ['BTU', 'KPO', 'NTG', 'GKW', 'KEP', 'PGK', 'SBP', 'DPT', 'SBM', 'TUR', 'BNR', 'GDI', 'APG', 'DNO', 'BLB', 'GDG', 'KLJ', 'MLG', 'PKS', 'TMP', 'BRG', 'SWJ', 'LWG', 'SGS'],
-        'mdn': ['BCR', 'BJN', 'CRB', 'GGR', 'JEN', 'JGO', 'JTR', 'KDU', 'KRJ', 'KRK', 'LOG', 'MGT', 'MNZ', 'MRR', 'MSP', 'NWI', 'PAD', 'PLG', 'PNG', 'PNZ', 'PON', 'RGL', 'SAR', 'SAT', 'SLH', 'SMJ', 'SMO', 'TAW', 'TNZ', 'UTR', 'WKU'],
-        'kdr': ['BLR', 'BNU', 'CAT', 'DRN', 'GON', 'GUR', 'KAA', 'KBN', 'KTS', 'KWR', 'LDY', 'MJT', 'NDL', 'NGU', 'NJK', 'PAE', 'PAN', 'PPR', 'PRB', 'PRI', 'SBI', 'SNT', 'TRE', 'TUL', 'WAT', 'WGI', 'WRJ']
-    }
-}
-
-WITEL_TABLES = {
-    "mlg": "ftm_data_mlg",
-    "kdr": "ftm_data_kdr",
-    "mdn": "ftm_data_mdn"
-}
-
 async def _auth_guard(update: Update) -> bool:
     user = update.effective_user
     telegram_id = str(user.id) if user else ""
@@ -63,11 +52,7 @@ async def start_inputftm(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
 
-    keyboard = [[
-        InlineKeyboardButton("Malang", callback_data="mlg"),
-        InlineKeyboardButton("Kediri", callback_data="kdr"),
-        InlineKeyboardButton("Madiun", callback_data="mdn"),
-    ]]
+    keyboard = [[InlineKeyboardButton(w.label, callback_data=w.id) for w in sto_registry.witels()]]
     await update.message.reply_text(
         "📍 Pilih *WITEL* tujuan input data:",
         reply_markup=InlineKeyboardMarkup(keyboard),
@@ -82,7 +67,11 @@ async def choose_witel(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     await query.answer()
 
-    witel_code = query.data
+    witel = sto_registry.witel(query.data)
+    if witel is None:
+        await query.edit_message_text("⚠️ Witel tidak valid. Silakan mulai kembali dengan /inputftm.")
+        return ConversationHandler.END
+    witel_code = witel.id
     context.user_data["witel_code"] = witel_code
 
     await query.edit_message_text(
@@ -96,18 +85,60 @@ async def choose_witel(update: Update, context: CallbackContext) -> int:
     )
     return ASK_INPUT
 
+FTM_COLUMNS = (
+    "witel", "sto", "nama_gpon", "ip", "card", "port",
+    "nama_lemari_ftm_eakses", "no_panel_eakses", "no_port_panel_eakses",
+    "nama_lemari_ftm_oakses", "no_panel_oakses", "no_port_panel_oakses",
+    "no_core_feeder", "nama_segmen_feeder_utama", "status_feeder",
+    "kapasitas_kabel_feeder_utama", "nama_odc"
+)
+
+# Kunci unik baris untuk upload diff
+FTM_KEY = ("sto", "nama_gpon", "card", "port")
+
+FTM_REQUIRED = ("sto", "nama_gpon", "card", "port")
+
+def _prepare_batch(records: list[dict], valid_sto: frozenset, stats: dict, rejects: RejectReport) -> list[dict]:
+    """Normalisasi + validasi satu batch baris Excel (dijalankan di worker 'parse')."""
+    valid, report = validate_batch(
+        records,
+        FTM_COLUMNS,
+        FTM_REQUIRED,
+        valid_sto,
+        upper=("sto", "witel"),
+    )
+    record_batch(stats, len(records), valid, report)
+    rejects.write(report)
+    return valid
+
+async def _send_rejects(update: Update, rejects: RejectReport, table_code: str) -> None:
+    """Kirim laporan baris yang ditolak sebagai dokumen CSV, lalu hapus file sementaranya."""
+    try:
+        if rejects.count:
+            with open(rejects.path, "rb") as fh:
+                await update.message.reply_document(
+                    document=fh,
+                    filename=f"ditolak_{table_code.lower()}.csv",
+                    caption=f"🚫 {rejects.count} baris ditolak (baris, alasan, kolom, nilai).",
+                )
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Gagal mengirim laporan baris ditolak: {e}")
+    finally:
+        rejects.discard()
+
 async def main_inputftm(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
 
     file = update.message.document
-    table_code = context.user_data.get("witel_code")
+    witel = sto_registry.witel(context.user_data.get("witel_code"))
 
-    if not table_code or table_code not in WITEL_TABLES:
+    if witel is None:
         await update.message.reply_text("⚠️ Witel tidak valid. Silakan mulai kembali dengan /inputftm.")
         return ConversationHandler.END
 
-    table_name = WITEL_TABLES[table_code]
+    table_code = witel.id
+    table_name = witel.table("FTM")
     status_log = ["📂 File diterima."]
 
     if not file or file.mime_type not in [
@@ -122,106 +153,65 @@ async def main_inputftm(update: Update, context: CallbackContext) -> int:
         temp_path = tmp.name
     await processed_file.download_to_drive(temp_path)
 
+    # Baca + simpan secara streaming: batch yang sudah valid langsung ditulis ke DB
+    stats = new_stats()
+    rejects = RejectReport()
+    loader = make_loader(table_name, FTM_COLUMNS, FTM_KEY)
+    # Satu snapshot master STO untuk seluruh upload (aman bila /reloadsto dijalankan di tengah)
+    valid_sto = sto_registry.valid_stos(table_code)
     try:
-        df = pd.read_excel(temp_path)
-        df.columns = df.columns.str.lower().str.replace(" ", "_")
-        df = df.astype(str).replace([pd.NA, 'nan', 'NaN', ''], None)
-        records = df.to_dict(orient="records")
-        status_log.append(f"📄 File berhasil dibaca. Jumlah baris: {len(records)}")
-    except Exception as e:
-        os.remove(temp_path)
+        await load_excel(temp_path, partial(_prepare_batch, valid_sto=valid_sto, stats=stats, rejects=rejects), loader)
+    except ExcelReadError as e:
+        rejects.discard()
         await update.message.reply_text(f"❌ Gagal membaca file Excel: {e}\n📎 Silakan kirim ulang file yang valid.")
         return ASK_INPUT
+    except Exception as e:
+        rejects.discard()
+        await update.message.reply_text(f"❌ Gagal menyimpan ke database: {e}")
+        return ASK_INPUT
     finally:
+        rejects.close()
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
-    fields = {
-        "witel", "sto", "nama_gpon", "ip", "card", "port",
-        "nama_lemari_ftm_eakses", "no_panel_eakses", "no_port_panel_eakses",
-        "nama_lemari_ftm_oakses", "no_panel_oakses", "no_port_panel_oakses",
-        "no_core_feeder", "nama_segmen_feeder_utama", "status_feeder",
-        "kapasitas_kabel_feeder_utama", "nama_odc"
-    }
-
-    data_transformed = []
-    for row in records:
-        item = {key: row.get(key) for key in fields}
-        if item.get("sto"):
-            item["sto"] = item["sto"].strip().upper()
-        if item.get("witel"):
-            item["witel"] = item["witel"].strip()
-        if item.get("sto") and item.get("nama_gpon") and item.get("card") and item.get("port"):
-            data_transformed.append(item)
-
-    valid_sto_list = STO_MASTER['FTM'].get(table_code, [])
-    valid_sto_set = set(valid_sto_list)
-    data_valid_sto = [row for row in data_transformed if row.get("sto") in valid_sto_set]
-    invalid_sto = [row["sto"] for row in data_transformed if row.get("sto") and row["sto"] not in valid_sto_set]
-
-    if invalid_sto:
-        status_log.append(f"⚠️ Ditemukan STO tidak valid (contoh): {', '.join(sorted(set(invalid_sto[:5])))}")
-
-    status_log.append(f"✅ Data valid ditemukan: {len(data_valid_sto)} baris.")
-
-    if not data_valid_sto:
+    status_log.append(f"📄 File berhasil dibaca. Jumlah baris: {stats['total_rows']}")
+    if stats["rejected"]:
+        status_log.append(f"🚫 Baris ditolak: {sum(stats['rejected'].values())} ({format_rejects(stats)})")
+        status_log.append("📎 Detail baris ditolak dikirim sebagai file CSV.")
+    if stats["invalid_sto"]:
+        status_log.append(f"⚠️ Ditemukan STO tidak valid (contoh): {', '.join(sorted(set(stats['invalid_sto'])))}")
+
+    status_log.append(f"✅ Data valid ditemukan: {stats['valid_rows']} baris.")
+
+    if not stats["valid_rows"]:
         await update.message.reply_text(
             "\n".join(status_log + [
                 "❌ Semua baris memiliki STO yang tidak valid.",
                 "📎 Silakan periksa kembali dan kirim ulang file yang benar."
             ])
         )
+        await _send_rejects(update, rejects, table_code)
         return ASK_INPUT
 
-    sto_set = {row["sto"] for row in data_valid_sto if row.get("sto")}
+    sto_set = loader.stos
+    notify_upload(table_name, sto_set)
     status_log.append(f"📌 STO diproses: {', '.join(sorted(sto_set))}")
-    status_log.append("💾 Menyimpan data ke database...")
-
-    conn = get_connection_database()
-    try:
-        with conn.cursor() as cursor:
-            delete_sql = f"DELETE FROM {table_name} WHERE sto IN ({','.join(['%s'] * len(sto_set))})"
-            cursor.execute(delete_sql, list(sto_set))
-
-            insert_sql = f"""
-                INSERT INTO {table_name} (
-                    witel, sto, nama_gpon, ip, card, port,
-                    nama_lemari_ftm_eakses, no_panel_eakses, no_port_panel_eakses,
-                    nama_lemari_ftm_oakses, no_panel_oakses, no_port_panel_oakses,
-                    no_core_feeder, nama_segmen_feeder_utama, status_feeder,
-                    kapasitas_kabel_feeder_utama, nama_odc
-                ) VALUES (
-                    %(witel)s, %(sto)s, %(nama_gpon)s, %(ip)s, %(card)s, %(port)s,
-                    %(nama_lemari_ftm_eakses)s, %(no_panel_eakses)s, %(no_port_panel_eakses)s,
-                    %(nama_lemari_ftm_oakses)s, %(no_panel_oakses)s, %(no_port_panel_oakses)s,
-                    %(no_core_feeder)s, %(nama_segmen_feeder_utama)s, %(status_feeder)s,
-                    %(kapasitas_kabel_feeder_utama)s, %(nama_odc)s
-                )
-            """
-            cursor.executemany(insert_sql, data_valid_sto)
-            conn.commit()
-    except Exception as e:
-        try:
-            conn.close()
-        except Exception:
-            pass
-        await update.message.reply_text(f"❌ Gagal menyimpan ke database: {e}")
-        return ASK_INPUT
-    try:
-        conn.close()
-    except Exception:
-        pass
+    status_log.append("💾 Data tersimpan ke database.")
+    if loader.diff:
+        status_log.append(f"🔁 Perubahan: {format_diff(loader.diff)}")
+    status_log.append(f"⏱ Waktu: {format_timings(loader.timings)}")
 
     status_log.append("✅ *Hasil Input Data:*")
     status_log.append(f"- Witel: *{table_code.upper()}*")
     status_log.append(f"- Total STO yang dioverwrite: {len(sto_set)}")
-    status_log.append(f"- Total Baris Disimpan: {len(data_valid_sto)}")
+    status_log.append(f"- Total Baris Disimpan: {loader.rows_written}")
     status_log.append("\n📎 Silakan kirim file Excel berikutnya untuk STO lain.\n❌ Atau ketik /cancel untuk mengakhiri proses.")
 
     await update.message.reply_text(
         "\n".join(status_log),
         parse_mode="Markdown"
     )
+    await _send_rejects(update, rejects, table_code)
     return ASK_INPUT
 
 async def restart(update: Update, context: CallbackContext) -> int:
@@ -232,6 +222,8 @@ async def restart(update: Update, context: CallbackContext) -> int:
 def register_handler(rh):
     rh.add_handler(
         ConversationHandler(
+            name='inputftm',
+            persistent=True,
             entry_points=[CommandHandler('inputftm', start_inputftm)],
             states={
                 ASK_WITEL: [CallbackQueryHandler(choose_witel)],
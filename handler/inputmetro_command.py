@@ -1,6 +1,6 @@
 import os
 import tempfile
-import pandas as pd
+from functools import partial
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     CallbackContext,
@@ -10,28 +10,17 @@ from telegram.ext import (
     CallbackQueryHandler,
     filters,
 )
-from database import get_connection_database
+from cache import notify_upload
+from sto_registry import sto_registry
+from validation import RejectReport, format_rejects, new_stats, record_batch, validate_batch
+from ingest import ExcelReadError, format_diff, format_timings, load_excel, make_loader
 from handler.base_command import cancel
 from handler.access_control import is_authorized  # ⬅️ proteksi user terdaftar
 
 ASK_WITEL, ASK_INPUT = range(2)
 
-WITEL_TABLE_MAP = {
-    "MALANG": "metro_data_mlg",
-    "MADIUN": "metro_data_mdn",
-    "KEDIRI": "metro_data_kdr",
-}
-
 EXAMPLE_LINK = "https://docs.google.com/spreadsheets/d/15iRZyXPMc79F1lADJtW39sB4QdVsWLBx/edit?usp=sharing&ouid=113431965399677755925&rtpof=true&sd=true"
 
-STO_MASTER = {
-    'Metro': {
-        'MALANG': ['BTU', 'KPO', 'NTG', 'GKW', 'KEP', 'PGK', 'SBP', 'DPT', 'SBM', 'TUR', 'BNR', 'GDI', 'APG', 'DNO', 'BLB', 'GDG', 'KLJ', 'MLG', 'PKS', 'TMP', 'BRG', 'SWJ', 'LWG', 'SGS'],
-        'MADIUN': ['BCR', 'BJN', 'CRB', 'GGR', 'JEN', 'JGO', 'JTR', 'KDU', 'KRJ', 'KRK', 'LOG', 'MGT', 'MNZ', 'MRR', 'MSP', 'NWI', 'PAD', 'PLG', 'PNG', 'PNZ', 'PON', 'RGL', 'SAR', 'SAT', 'SLH', 'SMJ', 'SMO', 'TAW', 'TNZ', 'UTR', 'WKU'],
-        'KEDIRI': ['BLR', 'BNU', 'CAT', 'DRN', 'GON', 'GUR', 'KAA', 'KBN', 'KTS', 'KWR', 'LDY', 'MJT', 'NDL', 'NGU', 'NJK', 'PAE', 'PAN', 'PPR', 'PRB', 'PRI', 'SBI', 'SNT', 'TRE', 'TUL', 'WAT', 'WGI', 'WRJ']
-    }
-}
-
 # ==========================
 # AUTH GUARD
 # ==========================
@@ -66,7 +55,7 @@ async def start_inputmetro(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(k.title(), callback_data=k)] for k in WITEL_TABLE_MAP]
+    keyboard = [[InlineKeyboardButton(w.label, callback_data=w.id)] for w in sto_registry.witels()]
     await update.message.reply_text(
         "📍 Silakan pilih *Witel* terlebih dahulu:",
         reply_markup=InlineKeyboardMarkup(keyboard),
@@ -80,9 +69,13 @@ async def handle_witel_selection(update: Update, context: CallbackContext) -> in
 
     query = update.callback_query
     await query.answer()
-    witel = query.data.upper()
+    selected = sto_registry.witel(query.data)
+    if selected is None:
+        await query.edit_message_text("⚠️ Witel tidak valid. Silakan mulai dari /inputmetro.")
+        return ConversationHandler.END
+    witel = selected.name
     context.user_data['selected_witel'] = witel
-    context.user_data['table_name'] = WITEL_TABLE_MAP.get(witel)
+    context.user_data['table_name'] = selected.table("Metro")
 
     await query.edit_message_text(
         text=(
@@ -95,6 +88,46 @@ async def handle_witel_selection(update: Update, context: CallbackContext) -> in
     )
     return ASK_INPUT
 
+METRO_COLUMNS = (
+    "witel", "sto", "gpon_hostname", "gpon_ip", "gpon_merk", "gpon_tipe",
+    "gpon_merk_tipe", "gpon_intf", "gpon_lacp",
+    "neighbor_hostname", "neighbor_intf", "neighbor_lacp",
+    "bw", "sfp", "vlan_sip", "vlan_internet", "keterangan", "otn", "port"
+)
+
+# Kunci unik baris untuk upload diff
+METRO_KEY = ("sto", "gpon_hostname", "gpon_intf")
+
+METRO_REQUIRED = ("sto", "gpon_hostname", "gpon_intf", "neighbor_hostname")
+
+def _prepare_batch(records: list[dict], witel: str, valid_sto: frozenset, stats: dict, rejects: RejectReport) -> list[dict]:
+    """Normalisasi + validasi satu batch baris Excel (dijalankan di worker 'parse')."""
+    valid, report = validate_batch(
+        records,
+        METRO_COLUMNS,
+        METRO_REQUIRED,
+        valid_sto,
+        constants={"witel": witel},
+    )
+    record_batch(stats, len(records), valid, report)
+    rejects.write(report)
+    return valid
+
+async def _send_rejects(update: Update, rejects: RejectReport, witel: str) -> None:
+    """Kirim laporan baris yang ditolak sebagai dokumen CSV, lalu hapus file sementaranya."""
+    try:
+        if rejects.count:
+            with open(rejects.path, "rb") as fh:
+                await update.message.reply_document(
+                    document=fh,
+                    filename=f"ditolak_{witel.lower()}.csv",
+                    caption=f"🚫 {rejects.count} baris ditolak (baris, alasan, kolom, nilai).",
+                )
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Gagal mengirim laporan baris ditolak: {e}")
+    finally:
+        rejects.discard()
+
 async def main_inputmetro(update: Update, context: CallbackContext) -> int:
     if not await _auth_guard(update):
         return ConversationHandler.END
@@ -116,101 +149,71 @@ async def main_inputmetro(update: Update, context: CallbackContext) -> int:
         await update.message.reply_text("❌ Format file tidak valid. Harap kirim file Excel (.xlsx/.xls) yang sesuai.")
         return ASK_INPUT
 
+    tg_file = await file.get_file()
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        temp_path = tmp.name
+    await tg_file.download_to_drive(temp_path)
+
+    # Baca + simpan secara streaming: batch yang sudah valid langsung ditulis ke DB
+    stats = new_stats()
+    rejects = RejectReport()
+    loader = make_loader(table, METRO_COLUMNS, METRO_KEY)
+    # Satu snapshot master STO untuk seluruh upload (aman bila /reloadsto dijalankan di tengah)
+    valid_sto = sto_registry.valid_stos(witel)
     try:
-        tg_file = await file.get_file()
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            temp_path = tmp.name
-        await tg_file.download_to_drive(temp_path)
-        df = pd.read_excel(temp_path)
-        os.remove(temp_path)
-
-        df.columns = df.columns.str.lower().str.replace(' ', '_')
-        df = df.astype(str).replace([pd.NA, 'nan', 'NaN', '', 'None'], None)
-        raw_data = df.to_dict(orient='records')
-        status_log.append(f"📄 File berhasil dibaca. Jumlah baris: {len(raw_data)}")
-    except Exception as e:
+        await load_excel(
+            temp_path,
+            partial(_prepare_batch, witel=witel, valid_sto=valid_sto, stats=stats, rejects=rejects),
+            loader
+        )
+    except ExcelReadError as e:
+        rejects.discard()
         await update.message.reply_text(f"❌ Gagal membaca file Excel: {e}\n📎 Silakan kirim ulang file yang valid.")
         return ASK_INPUT
+    except Exception as e:
+        rejects.discard()
+        await update.message.reply_text(f"❌ Gagal menyimpan ke database: {e}")
+        return ASK_INPUT
+    finally:
+        rejects.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
-    for row in raw_data:
-        if row.get("sto"):
-            row["sto"] = row["sto"].strip().upper()
-        row["witel"] = witel
-
-    required_fields = ["sto", "gpon_hostname", "gpon_intf", "neighbor_hostname"]
-    filtered_data = [
-        row for row in raw_data
-        if all(row.get(f) and str(row.get(f)).strip().lower() not in ['none', 'nan', ''] for f in required_fields)
-    ]
-
-    valid_sto_set = set(STO_MASTER['Metro'].get(witel, []))
-    invalid_sto = [row["sto"] for row in filtered_data if row.get("sto") and row["sto"] not in valid_sto_set]
-    filtered_data = [row for row in filtered_data if row.get("sto") in valid_sto_set]
-
-    if invalid_sto:
-        status_log.append(f"⚠️ STO tidak valid ditemukan (contoh): {', '.join(set(invalid_sto[:5]))}")
+    status_log.append(f"📄 File berhasil dibaca. Jumlah baris: {stats['total_rows']}")
+    if stats["rejected"]:
+        status_log.append(f"🚫 Baris ditolak: {sum(stats['rejected'].values())} ({format_rejects(stats)})")
+        status_log.append("📎 Detail baris ditolak dikirim sebagai file CSV.")
+    if stats["invalid_sto"]:
+        status_log.append(f"⚠️ STO tidak valid ditemukan (contoh): {', '.join(set(stats['invalid_sto']))}")
 
-    status_log.append(f"✅ Data valid ditemukan: {len(filtered_data)} baris.")
+    status_log.append(f"✅ Data valid ditemukan: {stats['valid_rows']} baris.")
 
-    if not filtered_data:
+    if not stats["valid_rows"]:
         await update.message.reply_text(
             "\n".join(status_log + [
                 "❌ Semua baris memiliki STO yang tidak valid atau kosong.",
                 "📎 Silakan kirim ulang file yang sesuai."
             ])
         )
+        await _send_rejects(update, rejects, witel)
         return ASK_INPUT
 
-    allowed_fields = {
-        "witel", "sto", "gpon_hostname", "gpon_ip", "gpon_merk", "gpon_tipe",
-        "gpon_merk_tipe", "gpon_intf", "gpon_lacp",
-        "neighbor_hostname", "neighbor_intf", "neighbor_lacp",
-        "bw", "sfp", "vlan_sip", "vlan_internet", "keterangan", "otn", "port"
-    }
-
-    uplink_data = [{k: row.get(k) for k in allowed_fields} for row in filtered_data]
-    sto_set = {row["sto"] for row in uplink_data if row.get("sto")}
-
+    sto_set = loader.stos
+    notify_upload(table, sto_set)
     status_log.append(f"📌 STO diproses: {', '.join(sorted(sto_set))}")
-    status_log.append("💾 Menyimpan data ke database...")
-
-    conn = get_connection_database()
-    try:
-        with conn.cursor() as cursor:
-            delete_sql = f"DELETE FROM {table} WHERE sto IN ({','.join(['%s'] * len(sto_set))})"
-            cursor.execute(delete_sql, list(sto_set))
-
-            insert_sql = f"""
-                INSERT INTO {table} (
-                    witel, sto, gpon_hostname, gpon_ip, gpon_merk, gpon_tipe,
-                    gpon_merk_tipe, gpon_intf, gpon_lacp,
-                    neighbor_hostname, neighbor_intf, neighbor_lacp,
-                    bw, sfp, vlan_sip, vlan_internet, keterangan, otn, port
-                ) VALUES (
-                    %(witel)s, %(sto)s, %(gpon_hostname)s, %(gpon_ip)s, %(gpon_merk)s, %(gpon_tipe)s,
-                    %(gpon_merk_tipe)s, %(gpon_intf)s, %(gpon_lacp)s,
-                    %(neighbor_hostname)s, %(neighbor_intf)s, %(neighbor_lacp)s,
-                    %(bw)s, %(sfp)s, %(vlan_sip)s, %(vlan_internet)s, %(keterangan)s, %(otn)s, %(port)s
-                )
-            """
-            cursor.executemany(insert_sql, uplink_data)
-            conn.commit()
-    except Exception as e:
-        await update.message.reply_text(f"❌ Gagal menyimpan ke database: {e}")
-        return ASK_INPUT
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+    status_log.append("💾 Data tersimpan ke database.")
+    if loader.diff:
+        status_log.append(f"🔁 Perubahan: {format_diff(loader.diff)}")
+    status_log.append(f"⏱ Waktu: {format_timings(loader.timings)}")
 
     status_log.append("✅ *Hasil Input Data Metro:*")
     status_log.append(f"- Witel: *{witel.upper()}*")
     status_log.append(f"- Total STO dioverwrite: {len(sto_set)}")
-    status_log.append(f"- Total Baris Disimpan: {len(uplink_data)}")
+    status_log.append(f"- Total Baris Disimpan: {loader.rows_written}")
     status_log.append("\n📎 Silakan kirim file berikutnya untuk STO lain.\n❌ Atau ketik /cancel untuk mengakhiri proses.")
 
     await update.message.reply_text("\n".join(status_log), parse_mode="Markdown")
+    await _send_rejects(update, rejects, witel)
     return ASK_INPUT
 
 async def restart(update: Update, context: CallbackContext) -> int:
@@ -221,6 +224,8 @@ async def restart(update: Update, context: CallbackContext) -> int:
 def register_handler(rh):
     rh.add_handler(
         ConversationHandler(
+            name='inputmetro',
+            persistent=True,
             entry_points=[CommandHandler('inputmetro', start_inputmetro)],
             states={
                 ASK_WITEL: [CallbackQueryHandler(handle_witel_selection)],
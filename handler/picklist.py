@@ -0,0 +1,94 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from database import fetch_all
+from cache import picklist_cache, name_ref, resolve_ref
+
+PREV, NEXT = "<", ">"
+
+
+class Picklist:
+    """
+    Keyboard pilihan berhalaman untuk nilai unik satu kolom (STO, GPON, hostname).
+    - Setiap halaman diambil dengan keyset pagination: `kolom > terakhir ORDER BY kolom LIMIT n+1`
+      (atau `< pertama ... DESC` untuk mundur) sehingga memakai index dan hanya membaca
+      baris yang ditampilkan.
+    - Halaman di-cache di picklist_cache dengan key (table, witel, sto, ...) sehingga
+      ikut dibuang saat upload menimpa STO tersebut.
+    - callback_data pendek dan tanpa state per user:
+      pilih  → '<prefix><epoch>.<id>'
+      geser  → '<prefix><|><halaman>:<epoch>.<id>' (id = nama pertama/terakhir di halaman)
+    """
+
+    def __init__(self, prefix: str, column: str, page_size: int = 9, columns: int = 3):
+        self.prefix = prefix
+        self.column = column
+        self.page_size = page_size
+        self.columns = columns
+
+    async def _fetch(self, table: str, filters: tuple, direction: str, anchor: str | None) -> list[str]:
+        where = [f"{self.column} IS NOT NULL", f"{self.column} <> ''"]
+        where += [f"{column} = %s" for column, _ in filters]
+        params = [value for _, value in filters]
+        order = "ASC"
+        if anchor is not None:
+            where.append(f"{self.column} {'<' if direction == PREV else '>'} %s")
+            params.append(anchor)
+        if direction == PREV:
+            order = "DESC"
+        rows = await fetch_all(
+            f"""
+            SELECT DISTINCT {self.column} AS name FROM {table}
+            WHERE {' AND '.join(where)}
+            ORDER BY {self.column} {order}
+            LIMIT {self.page_size + 1}
+            """,
+            tuple(params)
+        )
+        return [row["name"] for row in rows]
+
+    async def page(self, table: str, filters: tuple, direction: str = NEXT, anchor: str | None = None) -> tuple[list[str], bool, bool]:
+        """(nama di halaman, ada halaman sebelumnya, ada halaman berikutnya)."""
+        values = dict(filters)
+        key = (table, values.get("witel"), values.get("sto"), self.column, direction, anchor, self.page_size)
+        names = await picklist_cache.get_or_load(key, lambda: self._fetch(table, filters, direction, anchor))
+        more = len(names) > self.page_size
+        names = names[:self.page_size]
+        if direction == PREV:
+            return names[::-1], more, True
+        return names, anchor is not None, more
+
+    def _nav(self, direction: str, page: int, name: str) -> str:
+        return f"{self.prefix}{direction}{page}:{name_ref(name)}"
+
+    async def markup(self, table: str, filters: tuple, direction: str = NEXT, anchor: str | None = None,
+                     page: int = 0) -> tuple[InlineKeyboardMarkup | None, list[str]]:
+        """Keyboard untuk satu halaman; (None, []) bila tidak ada pilihan sama sekali."""
+        names, has_prev, has_next = await self.page(table, filters, direction, anchor)
+        if not names:
+            return None, []
+        buttons = [
+            [InlineKeyboardButton(name, callback_data=self.prefix + name_ref(name)) for name in names[i:i + self.columns]]
+            for i in range(0, len(names), self.columns)
+        ]
+        nav = []
+        if has_prev:
+            nav.append(InlineKeyboardButton("⬅️ Sebelumnya", callback_data=self._nav(PREV, page - 1, names[0])))
+        if has_next:
+            nav.append(InlineKeyboardButton("➡️ Berikutnya", callback_data=self._nav(NEXT, page + 1, names[-1])))
+        if nav:
+            buttons.append(nav)
+        return InlineKeyboardMarkup(buttons), names
+
+    def parse(self, data: str):
+        """
+        callback_data → ("pick", nama) | ("page", arah, anchor, halaman) | None.
+        None berarti tombol dari sebelum restart (referensi tidak dikenal).
+        """
+        rest = data[len(self.prefix):]
+        if rest[:1] in (PREV, NEXT):
+            page, _, ref = rest[1:].partition(":")
+            anchor = resolve_ref(ref)
+            if anchor is None or not page.isdigit():
+                return None
+            return ("page", rest[0], anchor, int(page))
+        name = resolve_ref(rest)
+        return ("pick", name) if name is not None else None
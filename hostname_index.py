@@ -0,0 +1,127 @@
+import logging
+
+from cache import inline_cache, on_upload
+from database import fetch_all
+from memory_index import MemoryIndex, location_key
+from migrations import FTM_TABLES, METRO_TABLES
+
+# Batas saran nama mirip saat nama tidak ditemukan
+SUGGEST_LIMIT = 5
+
+
+class HostnameIndex(MemoryIndex):
+    """
+    Index di memori: nama perangkat (UPPER) → lokasi (witel, table, sto, nama asli).
+    - Dibangun sekali saat startup dari semua tabel `tables` (kolom `column`).
+    - Diperbarui per STO setiap kali upload menimpa data STO tersebut (lihat on_upload).
+    - Satu nama bisa muncul di beberapa lokasi; lookup mengembalikan semuanya.
+    - Selama index belum siap (lihat MemoryIndex.ensure_ready), locate() mencari langsung ke DB.
+    """
+
+    def __init__(self, name: str, tables: tuple, column: str):
+        super().__init__(name)
+        self.tables = tables
+        self.column = column
+        self._names: dict[str, set] = {}       # NAMA → {(witel, table, sto, nama)}
+        self._locations: dict[tuple, set] = {}  # (table, sto) → {NAMA}
+
+    def _add(self, table: str, row: dict) -> None:
+        name = (row["name"] or "").strip()
+        if not name:
+            return
+        sto = (row["sto"] or "").upper()
+        key = name.upper()
+        self._names.setdefault(key, set()).add((row["witel"], table, sto, name))
+        self._locations.setdefault((table, sto), set()).add(key)
+
+    def _drop(self, table: str, sto: str) -> None:
+        for key in self._locations.pop((table, sto), ()):
+            entries = self._names.get(key)
+            if entries is None:
+                continue
+            entries.difference_update({e for e in entries if e[1] == table and e[2] == sto})
+            if not entries:
+                del self._names[key]
+
+    async def build(self) -> None:
+        rows = {table: await self._load(table, self.column) for table in self.tables}
+        self._names.clear()
+        self._locations.clear()
+        for table, table_rows in rows.items():
+            for row in table_rows:
+                self._add(table, row)
+        self._built()
+        logging.info(f"Index {self.name}: {len(self._names)} nama dari {len(self.tables)} tabel")
+
+    async def refresh(self, table: str, stos: set) -> None:
+        rows = await self._load(table, self.column, sorted(stos))
+        for sto in stos:
+            self._drop(table, sto)
+        for row in rows:
+            self._add(table, row)
+
+    async def _query_locations(self, name: str) -> list[tuple]:
+        locations = set()
+        for table in self.tables:
+            rows = await fetch_all(
+                f"SELECT DISTINCT witel, sto, {self.column} AS name FROM {table} WHERE {self.column} = %s",
+                (name.strip(),)
+            )
+            locations.update((row["witel"], table, (row["sto"] or "").upper(), row["name"]) for row in rows)
+        return sorted(locations, key=location_key)
+
+    def lookup(self, name: str) -> list[tuple]:
+        """Lokasi (witel, table, sto, nama) untuk nama perangkat, tanpa peka huruf besar/kecil."""
+        return sorted(self._names.get(name.strip().upper(), ()), key=location_key)
+
+    async def locate(self, name: str) -> list[tuple]:
+        """Seperti lookup, tetapi query langsung ke DB bila index belum/tidak bisa dibangun."""
+        if await self.ensure_ready():
+            return self.lookup(name)
+        return await self._query_locations(name)
+
+    def suggest(self, text: str, limit: int = SUGGEST_LIMIT) -> list[str]:
+        """Nama yang mengandung `text`, untuk saran saat lookup tidak ketemu."""
+        text = text.strip().upper()
+        found = sorted({e[3] for key, entries in self._names.items() if text in key for e in entries})
+        return found[:limit]
+
+    def stats(self) -> dict:
+        return {"names": len(self._names), "locations": len(self._locations), "ready": self.ready}
+
+
+gpon_index = HostnameIndex("gpon", FTM_TABLES, "nama_gpon")
+metro_index = HostnameIndex("metro", METRO_TABLES, "gpon_hostname")
+
+INDEXES = (gpon_index, metro_index)
+
+
+async def build_indexes() -> None:
+    """Dipanggil saat startup (post_init) setelah pool & migrasi siap."""
+    for index in INDEXES:
+        try:
+            await index.build()
+        except Exception as e:
+            logging.error(f"Gagal membangun index {index.name}: {e}")
+            index.mark_failed()
+
+
+async def _refresh(index: HostnameIndex, table: str, stos: set) -> None:
+    try:
+        await index.refresh(table, stos)
+        # Hasil inline yang dibuat selama refresh bisa memakai lokasi lama
+        inline_cache.clear()
+    except Exception as e:
+        logging.error(f"Gagal memperbarui index {index.name} ({table}): {e}")
+        index.mark_failed()
+
+
+@on_upload
+async def _refresh_on_upload(table: str, stos: set) -> None:
+    for index in INDEXES:
+        if table in index.tables and stos:
+            await _refresh(index, table, stos)
+
+
+def index_stats() -> dict:
+    return {index.name: index.stats() for index in INDEXES}
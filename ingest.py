@@ -0,0 +1,415 @@
+import asyncio
+import datetime
+import hashlib
+import os
+import queue
+import threading
+import time
+
+import openpyxl
+
+from database import get_pool
+from executor import run_blocking
+
+# Jumlah baris per batch parsing/INSERT dan berapa batch boleh menunggu di antara keduanya
+BATCH_SIZE = int(os.getenv('UPLOAD_BATCH_SIZE', '1000'))
+QUEUE_BATCHES = int(os.getenv('UPLOAD_QUEUE_BATCHES', '4'))
+# "diff": hanya tulis baris yang berubah; "staged": staging lalu swap per-STO;
+# "direct": DELETE + INSERT langsung ke tabel live
+UPLOAD_MODE = os.getenv('UPLOAD_MODE', 'diff')
+
+_DONE = object()
+
+
+class ExcelReadError(Exception):
+    """File Excel tidak bisa dibaca / diproses (bukan kesalahan database)."""
+
+
+def normalize_header(value) -> str:
+    return str(value).strip().lower().replace(" ", "_") if value is not None else ""
+
+
+def _dedupe_headers(headers: list[str]) -> list[str]:
+    """Kolom kembar diberi akhiran .1, .2, ... (sama seperti pandas)."""
+    seen = {}
+    result = []
+    for h in headers:
+        if h and h in seen:
+            seen[h] += 1
+            result.append(f"{h}.{seen[h]}")
+        else:
+            seen[h] = 0
+            result.append(h)
+    return result
+
+
+def normalize_cell(value):
+    """Nilai sel → string rapi atau None (tanpa round-trip 'nan')."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return str(value)
+    text = str(value).strip()
+    return text or None
+
+
+def iter_excel_batches(path: str, batch_size: int = BATCH_SIZE):
+    """
+    Baca sheet pertama secara streaming (openpyxl read_only) dan yield list dict per batch.
+    Setiap dict menyimpan nomor baris Excel-nya di "_row". Baris kosong dilewati;
+    header dinormalisasi (lowercase, spasi → _).
+    """
+    # Dibuka sebagai file object: file unduhan Telegram disimpan tanpa ekstensi,
+    # sedangkan load_workbook(path) menolak nama file yang bukan .xlsx/.xlsm
+    with open(path, "rb") as fh:
+        wb = openpyxl.load_workbook(fh, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = _dedupe_headers([normalize_header(h) for h in header])
+            batch = []
+            for excel_row, values in enumerate(rows, start=2):
+                if all(v is None for v in values):
+                    continue
+                record = {col: normalize_cell(v) for col, v in zip(columns, values) if col}
+                record["_row"] = excel_row
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            wb.close()
+
+
+class DirectLoader:
+    """
+    Tulis batch langsung ke tabel live dalam satu transaksi:
+    STO yang baru muncul di batch dihapus dulu, lalu baris batch di-INSERT.
+    """
+
+    def __init__(self, table: str, columns: tuple, key: tuple = ()):
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self.stos: set = set()
+        self.rows_written = 0
+        self.diff: dict | None = None
+        self.timings: dict[str, float] = {}
+        self.insert_sql = self._insert_sql(table)
+
+    def _insert_sql(self, table: str) -> str:
+        return (
+            f"INSERT INTO {table} ({', '.join(self.columns)}, row_hash) "
+            f"VALUES ({', '.join(['%s'] * (len(self.columns) + 1))})"
+        )
+
+    def _values(self, rows: list[dict]) -> list[tuple]:
+        """Nilai kolom + row_hash (md5 dari semua kolom) untuk setiap baris."""
+        values = []
+        for row in rows:
+            item = tuple(row.get(c) for c in self.columns)
+            digest = hashlib.md5("\x1f".join("" if v is None else str(v) for v in item).encode()).hexdigest()
+            values.append(item + (digest,))
+        return values
+
+    def _timed(self, phase: str, started: float) -> None:
+        self.timings[phase] = self.timings.get(phase, 0.0) + time.monotonic() - started
+
+    def record_upload(self, cursor) -> None:
+        """Catat waktu upload STO yang ditimpa (sto_uploads), di transaksi yang sama dengan datanya."""
+        cursor.executemany(
+            """
+            INSERT INTO sto_uploads (table_name, sto) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE uploaded_at = CURRENT_TIMESTAMP
+            """,
+            [(self.table, sto) for sto in sorted(self.stos)]
+        )
+
+    def begin(self, conn) -> None:
+        pass
+
+    def write(self, conn, rows: list[dict]) -> None:
+        started = time.monotonic()
+        new_stos = {row["sto"] for row in rows} - self.stos
+        with conn.cursor() as cursor:
+            if new_stos:
+                cursor.execute(
+                    f"DELETE FROM {self.table} WHERE sto IN ({','.join(['%s'] * len(new_stos))})",
+                    list(new_stos)
+                )
+                self.stos |= new_stos
+            cursor.executemany(self.insert_sql, self._values(rows))
+        self.rows_written += len(rows)
+        self._timed("tulis", started)
+
+    def finish(self, conn) -> None:
+        started = time.monotonic()
+        if self.stos:
+            with conn.cursor() as cursor:
+                self.record_upload(cursor)
+        conn.commit()
+        self._timed("commit", started)
+
+    def abort(self, conn) -> None:
+        pass
+
+
+class StagedLoader(DirectLoader):
+    """
+    Tulis batch ke tabel staging sementara (multi-row INSERT, tabel live tidak dikunci),
+    lalu tukar baris per-STO ke tabel live dalam satu transaksi singkat.
+    """
+
+    def __init__(self, table: str, columns: tuple, key: tuple = ()):
+        super().__init__(table, columns, key)
+        self.staging = f"stg_{table}"
+        self.insert_sql = self._insert_sql(self.staging)
+
+    def begin(self, conn) -> None:
+        started = time.monotonic()
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {self.staging}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {self.staging} LIKE {self.table}")
+        self._timed("staging", started)
+
+    def write(self, conn, rows: list[dict]) -> None:
+        started = time.monotonic()
+        with conn.cursor() as cursor:
+            # PyMySQL menggabungkan executemany INSERT ... VALUES menjadi multi-row VALUES
+            cursor.executemany(self.insert_sql, self._values(rows))
+        conn.commit()
+        self.stos |= {row["sto"] for row in rows}
+        self.rows_written += len(rows)
+        self._timed("staging", started)
+
+    def _swap_stos(self, cursor, stos: set) -> tuple[int, int]:
+        """Ganti isi `stos` di tabel live dengan isi staging; kembalikan (dihapus, dimasukkan)."""
+        cols = ", ".join(self.columns + ("row_hash",))
+        placeholders = ','.join(['%s'] * len(stos))
+        cursor.execute(f"DELETE FROM {self.table} WHERE sto IN ({placeholders})", list(stos))
+        deleted = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {self.table} ({cols}) SELECT {cols} FROM {self.staging} WHERE sto IN ({placeholders})",
+            list(stos)
+        )
+        return deleted, cursor.rowcount
+
+    def swap(self, cursor) -> None:
+        """Ganti isi STO yang diupload di tabel live dengan isi staging."""
+        self._swap_stos(cursor, self.stos)
+
+    def finish(self, conn) -> None:
+        if self.stos:
+            started = time.monotonic()
+            with conn.cursor() as cursor:
+                self.swap(cursor)
+                self.record_upload(cursor)
+            conn.commit()
+            self._timed("swap", started)
+        self.abort(conn)
+
+    def abort(self, conn) -> None:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {self.staging}")
+        except Exception:
+            pass
+
+
+class DiffLoader(StagedLoader):
+    """
+    Seperti StagedLoader, tetapi tabel live hanya menerima selisihnya:
+    baris dicocokkan lewat kolom kunci (key) dan dibandingkan lewat row_hash,
+    lalu hanya INSERT/UPDATE/DELETE untuk baris yang memang berubah.
+    STO yang kuncinya tidak unik atau memuat NULL (di file atau di data lama) di-swap penuh:
+    baris seperti itu tidak pernah cocok lewat JOIN kunci dan akan terhitung hapus + tambah.
+    """
+
+    def _join_on(self, left: str, right: str) -> str:
+        return " AND ".join(f"{left}.{k} = {right}.{k}" for k in self.key)
+
+    def _full_swap_stos(self, cursor) -> set:
+        """STO yang kuncinya kembar atau ada kolom kunci NULL, di staging maupun tabel live."""
+        keys = ", ".join(self.key)
+        null_key = " OR ".join(f"{k} IS NULL" for k in self.key)
+        placeholders = ','.join(['%s'] * len(self.stos))
+        stos = set()
+        for table, where, params in (
+            (self.staging, "", []),
+            (self.table, f"WHERE sto IN ({placeholders})", list(self.stos)),
+        ):
+            cursor.execute(f"SELECT DISTINCT sto FROM {table} {where} GROUP BY {keys} HAVING COUNT(*) > 1", params)
+            stos |= {row["sto"] for row in cursor.fetchall()}
+            cursor.execute(
+                f"SELECT DISTINCT sto FROM {table} {where} {'AND' if where else 'WHERE'} ({null_key})", params
+            )
+            stos |= {row["sto"] for row in cursor.fetchall()}
+        return stos
+
+    def swap(self, cursor) -> None:
+        diff = {"inserted": 0, "updated": 0, "deleted": 0}
+
+        full_swap = self._full_swap_stos(cursor) & self.stos
+        if full_swap:
+            deleted, inserted = self._swap_stos(cursor, full_swap)
+            diff["deleted"] += deleted
+            diff["inserted"] += inserted
+
+        stos = list(self.stos - full_swap)
+        if stos:
+            placeholders = ','.join(['%s'] * len(stos))
+            cursor.execute(
+                f"""
+                DELETE t FROM {self.table} t
+                LEFT JOIN {self.staging} s ON {self._join_on('t', 's')}
+                WHERE t.sto IN ({placeholders}) AND s.sto IS NULL
+                """,
+                stos
+            )
+            diff["deleted"] += cursor.rowcount
+
+            assignments = ", ".join(f"t.{c} = s.{c}" for c in self.columns + ("row_hash",) if c not in self.key)
+            cursor.execute(
+                f"""
+                UPDATE {self.table} t JOIN {self.staging} s ON {self._join_on('t', 's')}
+                SET {assignments}
+                WHERE s.sto IN ({placeholders}) AND NOT (t.row_hash <=> s.row_hash)
+                """,
+                stos
+            )
+            diff["updated"] += cursor.rowcount
+
+            cols = self.columns + ("row_hash",)
+            cursor.execute(
+                f"""
+                INSERT INTO {self.table} ({', '.join(cols)})
+                SELECT {', '.join(f's.{c}' for c in cols)} FROM {self.staging} s
+                LEFT JOIN {self.table} t ON {self._join_on('t', 's')}
+                WHERE s.sto IN ({placeholders}) AND t.sto IS NULL
+                """,
+                stos
+            )
+            diff["inserted"] += cursor.rowcount
+
+        diff["unchanged"] = max(self.rows_written - diff["inserted"] - diff["updated"], 0)
+        self.diff = diff
+
+
+LOADERS = {
+    "direct": DirectLoader,
+    "staged": StagedLoader,
+    "diff": DiffLoader,
+}
+
+
+def make_loader(table: str, columns: tuple, key: tuple = (), mode: str = UPLOAD_MODE):
+    """Buat loader sesuai UPLOAD_MODE (default: diff; tanpa key memakai staged)."""
+    if mode == "diff" and not key:
+        mode = "staged"
+    return LOADERS.get(mode, DiffLoader)(table, columns, key)
+
+
+def format_diff(diff: dict) -> str:
+    return (
+        f"➕ {diff['inserted']} baru, ✏️ {diff['updated']} diubah, "
+        f"➖ {diff['deleted']} dihapus, {diff['unchanged']} tetap"
+    )
+
+
+def format_timings(timings: dict) -> str:
+    return ", ".join(f"{phase} {seconds:.2f} dtk" for phase, seconds in timings.items())
+
+
+def _produce(path: str, prepare, outbox: queue.Queue, stop: threading.Event, batch_size: int) -> None:
+    """Worker 'parse': baca + validasi per batch lalu kirim ke antrean DB (menunggu bila penuh)."""
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    batches = iter_excel_batches(path, batch_size)
+    while True:
+        # Hanya kegagalan membaca file yang dilaporkan sebagai ExcelReadError; error dari prepare apa adanya
+        try:
+            records = next(batches, _DONE)
+        except Exception as e:
+            error = ExcelReadError(str(e))
+            put(error)
+            raise error from e
+        if records is _DONE:
+            break
+        try:
+            rows = prepare(records)
+        except Exception as e:
+            put(e)
+            raise
+        if rows and not put(rows):
+            return
+    put(_DONE)
+
+
+def _consume(conn, loader, inbox: queue.Queue, stop: threading.Event):
+    """Worker 'db': tulis batch segera setelah tersedia; rollback jika ada yang gagal."""
+    try:
+        loader.begin(conn)
+        while True:
+            try:
+                item = inbox.get(timeout=0.5)
+            except queue.Empty:
+                if stop.is_set():
+                    raise RuntimeError("Upload dibatalkan.")
+                continue
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            loader.write(conn, item)
+        return loader.finish(conn)
+    except BaseException:
+        stop.set()
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        loader.abort(conn)
+        raise
+
+
+async def load_excel(path: str, prepare, loader, batch_size: int = BATCH_SIZE):
+    """
+    Pipeline upload streaming: parsing (worker 'parse') dan INSERT (worker 'db')
+    berjalan bersamaan lewat antrean terbatas, sehingga memori tetap datar dan
+    batch pertama sudah masuk DB sebelum baris terakhir selesai dibaca.
+    - prepare(records) → baris valid siap tulis (dipanggil per batch di worker parse).
+    - loader: hasil make_loader() (objek dengan begin/write/finish/abort).
+    """
+    started = time.monotonic()
+    pipe = queue.Queue(maxsize=QUEUE_BATCHES)
+    stop = threading.Event()
+    async with get_pool().connection() as conn:
+        try:
+            results = await asyncio.gather(
+                run_blocking("parse", _produce, path, prepare, pipe, stop, batch_size),
+                run_blocking("db", _consume, conn, loader, pipe, stop),
+                return_exceptions=True,
+            )
+        finally:
+            stop.set()
+    errors = [r for r in results if isinstance(r, BaseException)]
+    read_errors = [e for e in errors if isinstance(e, ExcelReadError)]
+    if read_errors:
+        raise read_errors[0]
+    if errors:
+        raise errors[0]
+    loader.timings["total"] = time.monotonic() - started
+    return results[1]
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import os
+import time
+
+from database import fetch_all
+
+# Jeda minimal sebelum membangun ulang index yang gagal dibangun/diperbarui (detik)
+INDEX_RETRY_INTERVAL = float(os.getenv('INDEX_RETRY_INTERVAL', '60'))
+
+
+def location_key(location: tuple) -> tuple:
+    """Kunci urut lokasi (witel, ...); witel bisa NULL di data lama dan None tidak bisa dibandingkan dengan str."""
+    return (location[0] or "",) + tuple(location[1:])
+
+
+class MemoryIndex:
+    """
+    Dasar index di memori yang dibangun dari tabel witel (hostname_index, search_index).
+    Subclass mengisi build(); bila build/refresh gagal, mark_failed() membuat index dianggap
+    belum siap dan ensure_ready() membangunnya ulang (paling cepat tiap INDEX_RETRY_INTERVAL).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = asyncio.Lock()
+        self._failed_at: float | None = None
+        self.ready = False
+
+    async def _load(self, table: str, column: str, stos=None) -> list[dict]:
+        sql = f"SELECT DISTINCT witel, sto, {column} AS name FROM {table} WHERE {column} IS NOT NULL"
+        params = None
+        if stos:
+            sql += f" AND sto IN ({', '.join(['%s'] * len(stos))})"
+            params = tuple(stos)
+        return await fetch_all(sql, params)
+
+    async def build(self) -> None:
+        raise NotImplementedError
+
+    def _built(self) -> None:
+        self.ready = True
+        self._failed_at = None
+
+    def mark_failed(self) -> None:
+        """Index mungkin tidak lengkap: bangun ulang pada permintaan berikutnya."""
+        self.ready = False
+        self._failed_at = time.monotonic()
+
+    async def ensure_ready(self) -> bool:
+        """Bangun index bila belum siap (dengan jeda antar percobaan); True bila siap dipakai."""
+        if self.ready:
+            return True
+        if self._failed_at is not None and time.monotonic() - self._failed_at < INDEX_RETRY_INTERVAL:
+            return False
+        async with self._lock:
+            if not self.ready:
+                try:
+                    await self.build()
+                except Exception as e:
+                    logging.error(f"Gagal membangun index {self.name}: {e}")
+                    self.mark_failed()
+        return self.ready
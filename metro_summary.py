@@ -0,0 +1,285 @@
+import logging
+from collections import defaultdict, Counter
+from html import escape
+
+from cache import on_upload
+from database import fetch_all
+from migrations import METRO_TABLES
+
+
+def format_counter(counter_dict):
+    return ', '.join([f"{v} × {k}" for k, v in counter_dict.items()])
+
+
+def _build_metro_message(
+    row_sample: dict,
+    gpon_intfs: list,
+    neighbor_intfs: list,
+    sfp_counter: Counter,
+    bw_counter: Counter,
+    header: str = "📅 <b>Data Metro</b>",
+    hide_otn_port: bool = False,
+    override_gpon_lacp: str | None = None,
+    extra_lines: str = ""
+) -> str:
+    """
+    Susun blok pesan dengan format seragam.
+    - gpon_intfs: list of interfaces (akan ditampilkan menumpuk).
+    - hide_otn_port: True untuk menyembunyikan baris OTN & Port (dipakai di otn_kosong).
+    - override_gpon_lacp: pakai nilai ini bila perlu (mis. dari key grouping).
+    - extra_lines: baris tambahan opsional (mis. Neighbor LACP).
+    """
+    hostname = row_sample.get("gpon_hostname") or "-"
+    gpon_ip = row_sample.get("gpon_ip") or "-"
+    merk_tipe = row_sample.get("gpon_merk_tipe") or "-"
+    gpon_lacp = override_gpon_lacp if override_gpon_lacp is not None else (row_sample.get("gpon_lacp") or "-")
+
+    # Tampilkan GPON Intf menumpuk
+    gpon_intfs = sorted(set(filter(None, gpon_intfs)))
+    if gpon_intfs:
+        gpon_intfs_str = "\n".join([f"• {escape(x)}" for x in gpon_intfs])
+    else:
+        gpon_intfs_str = "-"
+
+    neighbor_str = "\n".join([f"• {escape(x)}" for x in sorted(set(filter(None, neighbor_intfs)))]) or "-"
+
+    sfp_str = format_counter(sfp_counter) or "-"
+    bw_str = format_counter(bw_counter) or "-"
+
+    lines = [
+        f"{header}",
+        f"🖥 <b>GPON Hostname:</b> {escape(hostname)}",
+        f"🌐 <b>GPON IP:</b> {escape(gpon_ip)}",
+        f"🛠 <b>Merk/Tipe:</b> {escape(merk_tipe)}",
+        f"🔗 <b>GPON LACP:</b> {escape(gpon_lacp)}",
+    ]
+    if extra_lines:
+        lines.append(extra_lines)
+
+    # GPON Intf blok multi-baris
+    lines.append("🔌 <b>GPON Intf:</b>")
+    lines.append(gpon_intfs_str)
+
+    # OTN/Port hanya jika tidak disembunyikan dan memang ada
+    if not hide_otn_port:
+        otn = row_sample.get("otn")
+        port = row_sample.get("port")
+        if otn or port:
+            if otn:
+                lines.append(f"🧹 <b>OTN:</b> {escape(otn)}")
+            if port:
+                lines.append(f"🔌 <b>Port:</b> {escape(port)}")
+
+    # Bagian agregat
+    lines.extend([
+        "↔️ <b>Neighbor Intf:</b>",
+        neighbor_str,
+        f"💡 <b>SFP:</b> {escape(sfp_str)}",
+        f"📆 <b>BW:</b> {escape(bw_str)}",
+    ])
+
+    return "\n".join(lines).strip()
+
+
+def metro_messages(results: list[dict]) -> list[str]:
+    """Kelompokkan baris Metro satu GPON menjadi blok pesan (tanpa OTN per LACP, dengan OTN per hostname)."""
+    messages = []
+    otn_kosong = []
+    otn_ada = []
+    for row in results:
+        if row.get("otn"):
+            otn_ada.append(row)
+        else:
+            otn_kosong.append(row)
+
+    # === OTN KOSONG: tampilkan tanpa OTN/Port, GPON Intf ditumpuk ===
+    if otn_kosong:
+        grouped = defaultdict(list)
+        # Group by (gpon_lacp, neighbor_lacp)
+        for row in otn_kosong:
+            key = (row.get("gpon_lacp") or "-", row.get("neighbor_lacp") or "-")
+            grouped[key].append(row)
+
+        for (g_lacp, n_lacp), group_rows in grouped.items():
+            sample = group_rows[0]
+            gpon_intfs = [r.get("gpon_intf") for r in group_rows if r.get("gpon_intf")]
+            neighbor_intfs = [r.get("neighbor_intf") for r in group_rows if r.get("neighbor_intf")]
+            sfp_counter = Counter([r.get("sfp") for r in group_rows if r.get("sfp")])
+            bw_counter = Counter([r.get("bw") for r in group_rows if r.get("bw")])
+
+            extra = f"🧭 <b>Neighbor LACP:</b> {escape(n_lacp)}"
+            msg = _build_metro_message(
+                row_sample=sample,
+                gpon_intfs=gpon_intfs,
+                neighbor_intfs=neighbor_intfs,
+                sfp_counter=sfp_counter,
+                bw_counter=bw_counter,
+                header="📅 <b>Data Metro (Tidak melalui OTN)</b>",
+                hide_otn_port=True,                 # ⬅️ sembunyikan OTN/Port
+                override_gpon_lacp=g_lacp,
+                extra_lines=extra
+            )
+            messages.append(msg)
+
+    # === OTN ADA: pakai template yang sama, Intf ditumpuk, OTN/Port ditampilkan bila ada ===
+    if otn_ada:
+        grouped = defaultdict(list)
+        # Group by gpon_hostname
+        for row in otn_ada:
+            key = row.get("gpon_hostname") or "-"
+            grouped[key].append(row)
+
+        for hostname, group_rows in grouped.items():
+            sample = group_rows[0]
+            gpon_intfs = [r.get("gpon_intf") for r in group_rows if r.get("gpon_intf")]
+            neighbor_intfs = [r.get("neighbor_intf") for r in group_rows if r.get("neighbor_intf")]
+            sfp_counter = Counter([r.get("sfp") for r in group_rows if r.get("sfp")])
+            bw_counter = Counter([r.get("bw") for r in group_rows if r.get("bw")])
+
+            msg = _build_metro_message(
+                row_sample=sample,
+                gpon_intfs=gpon_intfs,
+                neighbor_intfs=neighbor_intfs,
+                sfp_counter=sfp_counter,
+                bw_counter=bw_counter,
+                header="📅 <b>Data Metro</b>",
+                hide_otn_port=False,   # hanya muncul kalau field-nya ada
+            )
+            messages.append(msg)
+
+    return messages
+
+
+def _group_key(table: str, sto, hostname) -> tuple:
+    return (table, (sto or "").upper(), (hostname or "").strip().upper())
+
+
+class MetroSummary:
+    """
+    Blok pesan Metro yang sudah dirender, per (table, sto, gpon_hostname).
+    - Dibangun sekali saat startup dari semua tabel Metro (pengelompokan + Counter sfp/bw
+      dikerjakan di sini, bukan setiap kali user memilih hostname).
+    - Diperbarui per STO setiap kali upload menimpa data STO tersebut (lihat on_upload).
+      STO yang diupload langsung dibuang & ditandai basi sampai refresh-nya berhasil;
+      selama itu get() mengembalikan None sehingga pemanggil query langsung ke DB.
+    - Lookup = satu baca dict; tidak ada query maupun render ulang.
+    """
+
+    def __init__(self, tables: tuple):
+        self.tables = tables
+        self._groups: dict[tuple, list[str]] = {}   # (table, STO, HOSTNAME) → [pesan HTML]
+        self._locations: dict[tuple, set] = {}      # (table, STO) → {key}
+        self._stale: dict[tuple, int] = {}          # (table, STO) → generasi upload yang belum di-refresh
+        self._generation = 0
+        self.ready = False
+
+    async def _load(self, table: str, stos=None) -> list[dict]:
+        sql = f"SELECT * FROM {table} WHERE gpon_hostname IS NOT NULL"
+        params = None
+        if stos:
+            sql += f" AND sto IN ({', '.join(['%s'] * len(stos))})"
+            params = tuple(stos)
+        return await fetch_all(sql, params)
+
+    def _render(self, table: str, rows: list[dict]) -> dict[tuple, list[str]]:
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[_group_key(table, row.get("sto"), row.get("gpon_hostname"))].append(row)
+        return {key: metro_messages(group) for key, group in grouped.items() if key[2]}
+
+    def _add(self, groups: dict[tuple, list[str]]) -> None:
+        for key, messages in groups.items():
+            self._groups[key] = messages
+            self._locations.setdefault(key[:2], set()).add(key)
+
+    def _drop(self, table: str, sto: str) -> None:
+        for key in self._locations.pop((table, sto), ()):
+            self._groups.pop(key, None)
+
+    async def build(self) -> None:
+        rendered = {}
+        for table in self.tables:
+            rendered.update(self._render(table, await self._load(table)))
+        self._groups.clear()
+        self._locations.clear()
+        self._add(rendered)
+        self.ready = True
+        logging.info(f"Ringkasan Metro: {len(self._groups)} hostname dari {len(self.tables)} tabel")
+
+    def mark_stale(self, table: str, stos: set) -> None:
+        """Dipanggil sinkron saat upload: blok lama STO tersebut tidak boleh dilayani lagi."""
+        self._generation += 1
+        for sto in stos:
+            self._drop(table, sto)
+            self._stale[(table, sto)] = self._generation
+
+    async def refresh(self, table: str, stos: set) -> None:
+        started = {sto: self._stale.get((table, sto)) for sto in stos}
+        rendered = self._render(table, await self._load(table, sorted(stos)))
+        # STO yang diupload lagi selama query berjalan tetap basi (menunggu refresh berikutnya)
+        current = {sto for sto in stos if self._stale.get((table, sto)) == started[sto]}
+        for sto in current:
+            self._drop(table, sto)
+            self._stale.pop((table, sto), None)
+        self._add({key: messages for key, messages in rendered.items() if key[1] in current})
+
+    def get(self, table: str, sto: str, hostname: str) -> list[str] | None:
+        """Blok pesan untuk satu hostname di STO; [] bila tidak ada, None bila STO sedang basi."""
+        key = _group_key(table, sto, hostname)
+        if key[:2] in self._stale:
+            return None
+        return self._groups.get(key, [])
+
+    def stats(self) -> dict:
+        return {
+            "hostnames": len(self._groups),
+            "locations": len(self._locations),
+            "stale": len(self._stale),
+            "ready": self.ready,
+        }
+
+
+metro_summary = MetroSummary(METRO_TABLES)
+
+
+async def metro_blocks(table: str, sto: str, hostname: str) -> list[str]:
+    """Blok pesan Metro dari ringkasan; sebelum siap atau saat STO basi, query + render langsung."""
+    if metro_summary.ready:
+        blocks = metro_summary.get(table, sto, hostname)
+        if blocks is not None:
+            return blocks
+    results = await fetch_all(
+        f"""
+        SELECT * FROM {table}
+        WHERE sto = %s
+        AND gpon_hostname = %s
+        """,
+        (sto.upper(), hostname)
+    )
+    return metro_messages(results)
+
+
+async def build_metro_summary() -> None:
+    """Dipanggil saat startup (post_init) setelah pool & migrasi siap."""
+    try:
+        await metro_summary.build()
+    except Exception as e:
+        logging.error(f"Gagal membangun ringkasan Metro: {e}")
+
+
+@on_upload
+def _mark_stale_on_upload(table: str, stos: set) -> None:
+    # Sinkron: sejak upload selesai, STO ini tidak boleh dilayani dari ringkasan lama
+    if table in metro_summary.tables and stos:
+        metro_summary.mark_stale(table, stos)
+
+
+@on_upload
+async def _refresh_on_upload(table: str, stos: set) -> None:
+    if table not in metro_summary.tables or not stos:
+        return
+    try:
+        await metro_summary.refresh(table, stos)
+    except Exception as e:
+        # STO tetap ditandai basi → metro_blocks terus query langsung sampai upload/restart berikutnya
+        logging.error(f"Gagal memperbarui ringkasan Metro ({table}): {e}")
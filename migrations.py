@@ -0,0 +1,146 @@
+import logging
+
+from sto_registry import DEFAULT_STOS
+
+FTM_TABLES = ("ftm_data_mlg", "ftm_data_mdn", "ftm_data_kdr")
+METRO_TABLES = ("metro_data_mlg", "metro_data_mdn", "metro_data_kdr")
+
+# Panjang prefix index bila kolom bertipe TEXT (VARCHAR di-index penuh)
+TEXT_PREFIX = 64
+
+
+def _text_columns(cursor, table: str) -> set:
+    cursor.execute(
+        """
+        SELECT column_name AS name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+        AND data_type IN ('tinytext', 'text', 'mediumtext', 'longtext', 'blob')
+        """,
+        (table,)
+    )
+    return {row["name"] for row in cursor.fetchall()}
+
+
+def _create_index(cursor, table: str, name: str, columns: tuple) -> None:
+    text_cols = _text_columns(cursor, table)
+    parts = [f"{c}({TEXT_PREFIX})" if c in text_cols else c for c in columns]
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """,
+        (table, name)
+    )
+    if cursor.fetchone():
+        return
+    cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(parts)})")
+
+
+def _add_column(cursor, table: str, column: str, definition: str) -> None:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """,
+        (table, column)
+    )
+    if not cursor.fetchone():
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _normalize_existing_rows(cursor) -> None:
+    """Samakan format data lama dengan yang ditulis handler input (UPPER/TRIM)."""
+    for table in FTM_TABLES:
+        cursor.execute(
+            f"UPDATE {table} SET witel = UPPER(TRIM(witel)), sto = UPPER(TRIM(sto)), nama_gpon = TRIM(nama_gpon)"
+        )
+    for table in METRO_TABLES:
+        cursor.execute(
+            f"UPDATE {table} SET witel = UPPER(TRIM(witel)), sto = UPPER(TRIM(sto)), gpon_hostname = TRIM(gpon_hostname)"
+        )
+
+
+def _add_lookup_indexes(cursor) -> None:
+    for table in FTM_TABLES:
+        _create_index(cursor, table, "idx_sto_gpon_card_port", ("sto", "nama_gpon", "card", "port"))
+        _create_index(cursor, table, "idx_witel_sto", ("witel", "sto"))
+    for table in METRO_TABLES:
+        _create_index(cursor, table, "idx_sto_hostname", ("sto", "gpon_hostname"))
+        _create_index(cursor, table, "idx_witel_sto", ("witel", "sto"))
+
+
+def _add_row_hash(cursor) -> None:
+    for table in FTM_TABLES + METRO_TABLES:
+        _add_column(cursor, table, "row_hash", "CHAR(32) NULL")
+
+
+def _add_sto_uploads(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sto_uploads (
+            table_name VARCHAR(64) NOT NULL,
+            sto VARCHAR(16) NOT NULL,
+            uploaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, sto)
+        )
+        """
+    )
+
+
+def _add_sto_master(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sto_master (
+            witel_id VARCHAR(8) NOT NULL,
+            sto VARCHAR(16) NOT NULL,
+            urutan INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (witel_id, sto)
+        )
+        """
+    )
+    cursor.executemany(
+        "INSERT IGNORE INTO sto_master (witel_id, sto, urutan) VALUES (%s, %s, %s)",
+        [(witel_id, sto, i) for witel_id, stos in DEFAULT_STOS.items() for i, sto in enumerate(stos)]
+    )
+
+
+# (versi, deskripsi, fungsi(cursor)) — urutan tidak boleh diubah, tambah versi baru di bawah
+MIGRATIONS = [
+    (1, "normalisasi witel/sto/nama GPON (UPPER/TRIM)", _normalize_existing_rows),
+    (2, "index lookup sto/gpon/card/port dan sto/hostname", _add_lookup_indexes),
+    (3, "kolom row_hash untuk upload diff", _add_row_hash),
+    (4, "tabel sto_uploads (waktu upload terakhir per STO)", _add_sto_uploads),
+    (5, "tabel sto_master (master STO per witel)", _add_sto_master),
+]
+
+
+def apply_migrations(conn) -> list[int]:
+    """Jalankan migrasi yang belum tercatat di schema_migrations; kembalikan versi yang dijalankan."""
+    applied = []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        cursor.execute("SELECT version FROM schema_migrations")
+        done = {row["version"] for row in cursor.fetchall()}
+    conn.commit()
+
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        logging.info(f"Menjalankan migrasi {version}: {description}")
+        with conn.cursor() as cursor:
+            step(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+        conn.commit()
+        applied.append(version)
+    return applied
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import time
+
+from telegram.constants import MessageLimit
+from telegram.error import RetryAfter
+
+# Telegram: ±30 pesan/detik total, ±1 pesan/detik per chat (grup 20/menit)
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '25'))
+SEND_GLOBAL_BURST = int(os.getenv('SEND_GLOBAL_BURST', '25'))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', '1'))
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', '3'))
+# Berapa kali satu pesan dicoba ulang setelah RetryAfter (flood control)
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+
+MAX_MESSAGE_LENGTH = MessageLimit.MAX_TEXT_LENGTH
+
+# Bucket per chat yang sudah penuh kembali dibuang bila jumlahnya melewati batas ini
+_MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """
+    Token bucket dengan reservasi: setiap pengiriman mengambil satu token sekarang
+    dan mendapat waktu tunggu bila token habis, sehingga antrean tetap FIFO tanpa polling.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Ambil satu token; kembalikan berapa detik pemanggil harus menunggu."""
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+def _split_long(block: str, limit: int) -> list[str]:
+    """Pecah blok yang melebihi limit di batas baris (baris yang terlalu panjang dipotong)."""
+    parts, current = [], ""
+    for line in block.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def pack_blocks(blocks: list[str], sep: str = "\n\n", limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Gabungkan blok hasil menjadi sesedikit mungkin pesan ≤ limit karakter, urutan tetap."""
+    messages, current = [], ""
+    for block in blocks:
+        for part in _split_long(block, limit) if len(block) > limit else [block]:
+            if current and len(current) + len(sep) + len(part) <= limit:
+                current += sep + part
+            else:
+                if current:
+                    messages.append(current)
+                current = part
+    if current:
+        messages.append(current)
+    return messages
+
+
+class Outbox:
+    """
+    Lapisan kirim pesan keluar:
+    - Batas kecepatan per chat dan global (token bucket), menunggu tanpa memblokir event loop.
+    - RetryAfter dari Telegram → tunggu sesuai permintaan lalu coba lagi (maks max_retries).
+    - Metrik: jumlah terkirim/gagal/retry, blok yang digabung, waktu tunggu limit dan latensi kirim.
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, global_burst: int = SEND_GLOBAL_BURST,
+                 chat_rate: float = SEND_CHAT_RATE, chat_burst: int = SEND_CHAT_BURST,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: dict = {}   # chat_id -> TokenBucket
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.blocks = 0
+        self.total_wait = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                self._chats = {k: b for k, b in self._chats.items() if not b.full()}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _throttle(self, chat_id) -> None:
+        # Tunggu giliran chat dulu, baru ambil token global (agar token global tidak terbuang)
+        for bucket in (self._chat_bucket(chat_id), self._global):
+            delay = bucket.reserve()
+            if delay:
+                self.total_wait += delay
+                await asyncio.sleep(delay)
+
+    async def call(self, chat_id, send, *args, **kwargs):
+        """Jalankan `send(*args, **kwargs)` (mis. message.reply_text) di bawah rate limit chat_id."""
+        started = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                await self._throttle(chat_id)
+                try:
+                    result = await send(*args, **kwargs)
+                    self.sent += 1
+                    return result
+                except RetryAfter as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    self.retries += 1
+                    logging.warning(f"Flood control chat {chat_id}: tunggu {e.retry_after} detik (percobaan {attempt})")
+                    await asyncio.sleep(e.retry_after)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            latency = time.monotonic() - started
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    async def send_blocks(self, message, blocks: list[str], parse_mode=None, sep: str = "\n\n") -> list:
+        """Kirim blok-blok hasil sebagai balasan `message`, digabung sampai batas 4096 karakter."""
+        self.blocks += len(blocks)
+        return [
+            await self.call(message.chat_id, message.reply_text, text, parse_mode=parse_mode)
+            for text in pack_blocks(blocks, sep)
+        ]
+
+    def stats(self) -> dict:
+        done = self.sent + self.failed
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "blocks": self.blocks,
+            "chats": len(self._chats),
+            "avg_wait_ms": round(self.total_wait / done * 1000, 1) if done else 0.0,
+            "avg_latency_ms": round(self.total_latency / done * 1000, 1) if done else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+        }
+
+
+outbox = Outbox()
+
+
+async def send_blocks(message, blocks: list[str], parse_mode=None, sep: str = "\n\n") -> list:
+    return await outbox.send_blocks(message, blocks, parse_mode=parse_mode, sep=sep)
+
+
+def outbox_stats() -> dict:
+    return outbox.stats()
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from executor import run_blocking
+
+PERSIST_PATH = os.getenv('PERSIST_PATH', 'bot_state.sqlite3')
+# Seberapa sering Application mengumpulkan perubahan user_data/state untuk ditulis (detik)
+PERSIST_INTERVAL = float(os.getenv('PERSIST_INTERVAL', '10'))
+# Sesi yang tidak disentuh lebih lama dari ini dibuang saat startup (detik)
+PERSIST_MAX_AGE = float(os.getenv('PERSIST_MAX_AGE', str(7 * 24 * 3600)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    conv_key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (name, conv_key)
+);
+"""
+
+
+def _compact(data: dict) -> str | None:
+    """user_data → JSON (nilai yang tidak bisa di-serialisasi dilewati); None bila kosong."""
+    kept = {}
+    for key, value in data.items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        kept[key] = value
+    return json.dumps(kept, separators=(",", ":")) if kept else None
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Persistence user_data + state ConversationHandler di satu file SQLite.
+    - user_data dimuat lazy: baris user dibaca saat update pertamanya setelah restart
+      (refresh_user_data), bukan semuanya saat startup.
+    - Penulisan digabung: perubahan dari satu putaran update_persistence ditampung dulu,
+      lalu ditulis dalam satu transaksi di worker "db".
+    - Yang disimpan hanya kunci pilihan (witel/STO/GPON/halaman), bukan picklist utuh.
+    """
+
+    def __init__(self, path: str = PERSIST_PATH, update_interval: float = PERSIST_INTERVAL,
+                 max_age: float = PERSIST_MAX_AGE):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.max_age = max_age
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._loaded: set = set()          # user_id yang sudah dimuat ke Application.user_data
+        self._pending_users: dict = {}     # user_id -> JSON | None (None = hapus)
+        self._pending_conversations: dict = {}  # (name, JSON key) -> JSON state | None
+        self._writer: asyncio.Task | None = None
+        self.writes = 0
+        self.rows_written = 0
+
+    # --- akses SQLite (blocking, dijalankan di worker "db") ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            cutoff = time.time() - self.max_age
+            with conn:
+                conn.execute("DELETE FROM user_data WHERE updated < ?", (cutoff,))
+                conn.execute("DELETE FROM conversations WHERE updated < ?", (cutoff,))
+            self._conn = conn
+        return self._conn
+
+    def _read_user(self, user_id: int) -> dict:
+        with self._lock:
+            row = self._connect().execute("SELECT data FROM user_data WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _read_conversations(self, name: str) -> dict:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT conv_key, state FROM conversations WHERE name = ?", (name,)
+            ).fetchall()
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    def _write(self, users: dict, conversations: dict) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO user_data (user_id, data, updated) VALUES (?, ?, ?)",
+                    [(uid, data, now) for uid, data in users.items() if data is not None],
+                )
+                conn.executemany(
+                    "DELETE FROM user_data WHERE user_id = ?",
+                    [(uid,) for uid, data in users.items() if data is None],
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO conversations (name, conv_key, state, updated) VALUES (?, ?, ?, ?)",
+                    [(name, key, state, now) for (name, key), state in conversations.items() if state is not None],
+                )
+                conn.executemany(
+                    "DELETE FROM conversations WHERE name = ? AND conv_key = ?",
+                    [key for key, state in conversations.items() if state is None],
+                )
+
+    # --- penggabungan tulis ---
+
+    def _schedule_write(self) -> None:
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        # Beri kesempatan semua update_* dari putaran yang sama masuk dulu
+        await asyncio.sleep(0)
+        while self._pending_users or self._pending_conversations:
+            users, self._pending_users = self._pending_users, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            try:
+                await run_blocking("db", self._write, users, conversations)
+                self.writes += 1
+                self.rows_written += len(users) + len(conversations)
+            except Exception as e:
+                logging.error(f"Gagal menyimpan state percakapan: {e}")
+                # kembalikan agar dicoba lagi di putaran berikutnya (yang lebih baru menang)
+                self._pending_users = {**users, **self._pending_users}
+                self._pending_conversations = {**conversations, **self._pending_conversations}
+                return
+
+    # --- API BasePersistence ---
+
+    async def get_user_data(self) -> dict:
+        # Dimuat per user lewat refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return await run_blocking("db", self._read_conversations, name)
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        state = None if new_state is None else json.dumps(new_state)
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._loaded.add(user_id)
+        self._pending_users[user_id] = _compact(data)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_users[user_id] = None
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+        stored = await run_blocking("db", self._read_user, user_id)
+        for key, value in stored.items():
+            user_data.setdefault(key, value)
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Dipanggil saat Application berhenti: tulis sisa perubahan lalu tutup file."""
+        if self._writer is not None:
+            await self._writer
+        await self._write_pending()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "loaded_users": len(self._loaded),
+            "pending": len(self._pending_users) + len(self._pending_conversations),
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+        }
@@ -0,0 +1,220 @@
+import logging
+import heapq
+import re
+
+from cache import on_upload
+from memory_index import MemoryIndex, location_key
+from migrations import FTM_TABLES, METRO_TABLES
+
+# Kolom yang bisa dicari per tabel
+SEARCH_FIELDS = {
+    **{table: ("nama_gpon", "nama_odc", "nama_lemari_ftm_eakses") for table in FTM_TABLES},
+    **{table: ("gpon_hostname", "neighbor_hostname") for table in METRO_TABLES},
+}
+
+SEARCH_LIMIT = 10
+# Skor minimal (kemiripan trigram) untuk hasil fuzzy saat tidak ada yang cocok persis
+FUZZY_THRESHOLD = 0.3
+# Kandidat fuzzy hanya diambil dari trigram yang cukup langka (posting ≤ batas ini)
+FUZZY_MAX_POSTING = 500
+
+_SEPARATORS = re.compile(r"[\s_\-./]+")
+
+
+def normalize(text: str) -> str:
+    """UPPER + samakan pemisah (spasi, _, -, ., /) menjadi '-' agar 'gpon01 kpo' ≈ 'GPON01-KPO'."""
+    return _SEPARATORS.sub("-", text.strip().upper()).strip("-")
+
+
+def _grams(key: str) -> set:
+    """Trigram dengan padding awal/akhir; prefix 1–2 huruf tetap punya gram sendiri ('$$K', '$KP')."""
+    padded = f"$${key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex(MemoryIndex):
+    """
+    Index pencarian trigram di memori atas nama perangkat/ODC/lemari dari semua tabel witel.
+    - Satu dokumen = satu nilai unik per kolom; lokasinya (witel, table, sto) disimpan di dokumen.
+    - Query ≥3 huruf: irisan posting trigram lalu dicek substring; 1–2 huruf: prefix.
+    - Tidak ada yang cocok → fallback fuzzy (kemiripan trigram) untuk salah ketik.
+    - Diperbarui per STO saat upload (lihat on_upload), tanpa membangun ulang semuanya.
+    """
+
+    def __init__(self, fields: dict):
+        super().__init__("pencarian")
+        self.fields = fields
+        self._docs: dict[int, list] = {}        # id → [field, nama, KEY, {(witel, table, sto)}]
+        self._ids: dict[tuple, int] = {}        # (field, KEY) → id
+        self._postings: dict[str, set] = {}     # trigram → {id}
+        self._locations: dict[tuple, set] = {}  # (table, sto) → {id}
+        self._next_id = 0
+
+    def _add(self, table: str, field: str, row: dict) -> None:
+        name = (row["name"] or "").strip()
+        key = normalize(name)
+        if not key:
+            return
+        sto = (row["sto"] or "").upper()
+        doc_id = self._ids.get((field, key))
+        if doc_id is None:
+            doc_id = self._ids[(field, key)] = self._next_id
+            self._next_id += 1
+            self._docs[doc_id] = [field, name, key, set()]
+            for gram in _grams(key):
+                self._postings.setdefault(gram, set()).add(doc_id)
+        self._docs[doc_id][3].add((row["witel"], table, sto))
+        self._locations.setdefault((table, sto), set()).add(doc_id)
+
+    def _drop(self, table: str, sto: str) -> None:
+        for doc_id in self._locations.pop((table, sto), ()):
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                continue
+            doc[3].difference_update({loc for loc in doc[3] if loc[1] == table and loc[2] == sto})
+            if doc[3]:
+                continue
+            del self._docs[doc_id]
+            del self._ids[(doc[0], doc[2])]
+            for gram in _grams(doc[2]):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(doc_id)
+                    if not posting:
+                        del self._postings[gram]
+
+    async def _load_rows(self, stos_by_table: dict) -> list[tuple]:
+        rows = []
+        for table, stos in stos_by_table.items():
+            for field in self.fields[table]:
+                for row in await self._load(table, field, stos):
+                    rows.append((table, field, row))
+        return rows
+
+    async def build(self) -> None:
+        rows = await self._load_rows({table: None for table in self.fields})
+        self._docs.clear()
+        self._ids.clear()
+        self._postings.clear()
+        self._locations.clear()
+        for table, field, row in rows:
+            self._add(table, field, row)
+        self._built()
+        logging.info(f"Index pencarian: {len(self._docs)} nama, {len(self._postings)} trigram")
+
+    async def refresh(self, table: str, stos: set) -> None:
+        rows = await self._load_rows({table: sorted(stos)})
+        for sto in stos:
+            self._drop(table, sto)
+        for _, field, row in rows:
+            self._add(table, field, row)
+
+    def _candidates(self, grams: set) -> set:
+        postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        return set.intersection(*postings)
+
+    def _selectivity(self, token: str) -> int:
+        """Ukuran posting terkecil dari trigram token (makin kecil makin selektif)."""
+        return min(len(self._postings.get(token[i:i + 3], ())) for i in range(len(token) - 2))
+
+    def _substring(self, token: str) -> set:
+        """Dokumen yang memuat token (≥3 huruf) di mana saja."""
+        grams = {token[i:i + 3] for i in range(len(token) - 2)}
+        return {i for i in self._candidates(grams) if token in self._docs[i][2]}
+
+    def _prefix(self, token: str) -> set:
+        """Dokumen yang diawali token pendek (1–2 huruf), lewat gram berpadding '$$K' / '$KP'."""
+        grams = {g for g in _grams(token) if g.startswith("$") and not g.endswith("$")}
+        return {i for i in self._candidates(grams) if self._docs[i][2].startswith(token)}
+
+    def _fuzzy(self, key: str) -> list[tuple[float, int]]:
+        grams = _grams(key)
+        postings = sorted((p for p in (self._postings.get(g) for g in grams) if p), key=len)
+        if not postings:
+            return []
+        # Trigram umum (mis. 'GPO', 'ODC') dilewati agar kandidat tetap sedikit
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if len(posting) > FUZZY_MAX_POSTING:
+                break
+            candidates |= posting
+        scored = []
+        for doc_id in candidates:
+            doc_grams = _grams(self._docs[doc_id][2])
+            common = len(grams & doc_grams)
+            score = common / (len(grams) + len(doc_grams) - common)
+            if score >= FUZZY_THRESHOLD:
+                scored.append((score, doc_id))
+        return scored
+
+    def search(self, text: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+        """
+        Cari nama yang memuat semua kata di `text`; urutan: sama persis, prefix, lalu substring.
+        Bila kosong, kembalikan hasil fuzzy terbaik. Setiap hasil: field, name, fuzzy, locations.
+        """
+        key = normalize(text)
+        if not key:
+            return []
+        tokens = [t for t in key.split("-") if t]
+        long_tokens = [t for t in tokens if len(t) >= 3]
+        if long_tokens:
+            # Mulai dari kata paling selektif; kata lain cukup dicek substring pada kandidatnya
+            first = min(long_tokens, key=self._selectivity)
+            ids = self._substring(first)
+            tokens.remove(first)
+        else:
+            # Hanya kata pendek: kata pertama sebagai prefix nama
+            ids = self._prefix(tokens.pop(0))
+        if ids and tokens:
+            ids = {i for i in ids if all(t in self._docs[i][2] for t in tokens)}
+
+        if ids:
+            def rank(doc_id):
+                doc_key = self._docs[doc_id][2]
+                return (doc_key != key, not doc_key.startswith(key), key not in doc_key, len(doc_key), doc_key)
+            ranked = [(False, doc_id) for doc_id in heapq.nsmallest(limit, ids, key=rank)]
+        else:
+            scored = heapq.nsmallest(limit, self._fuzzy(key), key=lambda s: (-s[0], self._docs[s[1]][2]))
+            ranked = [(True, doc_id) for _, doc_id in scored]
+
+        return [
+            {
+                "field": self._docs[doc_id][0],
+                "name": self._docs[doc_id][1],
+                "fuzzy": fuzzy,
+                "locations": sorted(self._docs[doc_id][3], key=location_key),
+            }
+            for fuzzy, doc_id in ranked
+        ]
+
+    def stats(self) -> dict:
+        return {"names": len(self._docs), "trigrams": len(self._postings), "ready": self.ready}
+
+
+search_index = SearchIndex(SEARCH_FIELDS)
+
+
+async def build_search_index() -> None:
+    """Dipanggil saat startup (post_init) setelah pool & migrasi siap."""
+    try:
+        await search_index.build()
+    except Exception as e:
+        logging.error(f"Gagal membangun index pencarian: {e}")
+        search_index.mark_failed()
+
+
+async def _refresh(table: str, stos: set) -> None:
+    try:
+        await search_index.refresh(table, stos)
+    except Exception as e:
+        logging.error(f"Gagal memperbarui index pencarian ({table}): {e}")
+        # STO ini bisa tertinggal isi lama/kosong; bangun ulang penuh daripada melayani hasil basi
+        search_index.mark_failed()
+
+
+@on_upload
+async def _refresh_on_upload(table: str, stos: set) -> None:
+    if table in search_index.fields and stos:
+        await _refresh(table, stos)
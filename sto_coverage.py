@@ -0,0 +1,115 @@
+import asyncio
+import logging
+
+from cache import on_upload
+from database import fetch_all
+from migrations import FTM_TABLES, METRO_TABLES
+
+# Jenis data → (tabel per witel, kolom yang dihitung sebagai "GPON")
+COVERAGE_SOURCES = {
+    "FTM": (FTM_TABLES, "nama_gpon"),
+    "Metro": (METRO_TABLES, "gpon_hostname"),
+}
+
+
+class CoverageReport:
+    """
+    Ringkasan cakupan data per (table, STO): jumlah baris, jumlah GPON unik, waktu upload terakhir.
+    - Dibangun saat pertama kali diminta dengan satu query ber-GROUP BY per jenis data
+      (UNION ALL ketiga tabel witel + LEFT JOIN sto_uploads).
+    - Upload hanya menghitung ulang STO yang ditimpa (lihat on_upload).
+    - `version` naik setiap isi berubah, dipakai pemanggil untuk cache teks hasil render.
+    """
+
+    def __init__(self, sources: dict):
+        self.sources = sources
+        self._rows: dict[tuple, dict] = {}   # (table, STO) → {"rows", "gpons", "uploaded_at"}
+        self._lock = asyncio.Lock()
+        self.ready = False
+        self.version = 0
+
+    def _source_for(self, table: str):
+        for tables, column in self.sources.values():
+            if table in tables:
+                return tables, column
+        return None
+
+    async def _query(self, tables: tuple, column: str, stos=None) -> list[dict]:
+        where, params = "", []
+        if stos:
+            where = f"WHERE sto IN ({', '.join(['%s'] * len(stos))})"
+        parts = []
+        for table in tables:
+            parts.append(
+                f"SELECT '{table}' AS table_name, sto, COUNT(*) AS row_count, "
+                f"COUNT(DISTINCT {column}) AS gpon_count FROM {table} {where} GROUP BY sto"
+            )
+            params += list(stos or ())
+        return await fetch_all(
+            f"""
+            SELECT c.table_name, c.sto, c.row_count, c.gpon_count, u.uploaded_at
+            FROM ({' UNION ALL '.join(parts)}) c
+            LEFT JOIN sto_uploads u ON u.table_name = c.table_name AND u.sto = c.sto
+            """,
+            tuple(params) if params else None
+        )
+
+    def _add(self, rows: list[dict]) -> None:
+        for row in rows:
+            if not row.get("sto"):
+                continue
+            self._rows[(row["table_name"], row["sto"].upper())] = {
+                "rows": int(row["row_count"]),
+                "gpons": int(row["gpon_count"]),
+                "uploaded_at": row.get("uploaded_at"),
+            }
+
+    async def build(self) -> None:
+        rows = []
+        for tables, column in self.sources.values():
+            rows += await self._query(tables, column)
+        self._rows.clear()
+        self._add(rows)
+        self.ready = True
+        self.version += 1
+        logging.info(f"Ringkasan cakupan STO: {len(self._rows)} STO dari {len(self.sources)} jenis data")
+
+    async def ensure_ready(self) -> None:
+        if self.ready:
+            return
+        async with self._lock:
+            if not self.ready:
+                await self.build()
+
+    async def refresh(self, table: str, stos: set) -> None:
+        source = self._source_for(table)
+        if source is None:
+            return
+        rows = await self._query((table,), source[1], sorted(stos))
+        for sto in stos:
+            self._rows.pop((table, sto), None)
+        self._add(rows)
+        self.version += 1
+
+    def table(self, table: str) -> dict[str, dict]:
+        """STO → ringkasan untuk satu tabel (hanya STO yang punya data)."""
+        return {sto: info for (t, sto), info in self._rows.items() if t == table}
+
+    def stats(self) -> dict:
+        return {"stos": len(self._rows), "version": self.version, "ready": self.ready}
+
+
+coverage = CoverageReport(COVERAGE_SOURCES)
+
+
+@on_upload
+async def _refresh_on_upload(table: str, stos: set) -> None:
+    # Sebelum siap tidak ada yang perlu diperbarui; build pertama sudah membaca data terbaru
+    if not (coverage.ready and stos):
+        return
+    try:
+        await coverage.refresh(table, stos)
+    except Exception as e:
+        logging.error(f"Gagal memperbarui ringkasan cakupan ({table}): {e}")
+        # Paksa dibangun ulang penuh pada permintaan berikutnya
+        coverage.ready = False
@@ -0,0 +1,131 @@
+import logging
+import time
+
+from database import fetch_all
+
+# Witel yang dilayani: (id kanonik = akhiran nama tabel, nama = nilai kolom witel di DB)
+DEFAULT_WITELS = (
+    ("mlg", "MALANG"),
+    ("mdn", "MADIUN"),
+    ("kdr", "KEDIRI"),
+)
+
+# Daftar STO bawaan per witel (urutan = urutan tampilan). Setelah migrasi 5 daftar ini
+# juga tersimpan di tabel sto_master; STO baru cukup ditambahkan di sana lalu /reloadsto.
+DEFAULT_STOS = {
+    "mlg": ('BTU', 'KPO', 'NTG', 'GKW', 'KEP', 'PGK', 'SBP', 'DPT', 'SBM', 'TUR', 'BNR', 'GDI', 'APG', 'DNO', 'BLB', 'GDG', 'KLJ', 'MLG', 'PKS', 'TMP', 'BRG', 'SWJ', 'LWG', 'SGS'),
+    "mdn": ('BCR', 'BJN', 'CRB', 'GGR', 'JEN', 'JGO', 'JTR', 'KDU', 'KRJ', 'KRK', 'LOG', 'MGT', 'MNZ', 'MRR', 'MSP', 'NWI', 'PAD', 'PLG', 'PNG', 'PNZ', 'PON', 'RGL', 'SAR', 'SAT', 'SLH', 'SMJ', 'SMO', 'TAW', 'TNZ', 'UTR', 'WKU'),
+    "kdr": ('BLR', 'BNU', 'CAT', 'DRN', 'GON', 'GUR', 'KAA', 'KBN', 'KTS', 'KWR', 'LDY', 'MJT', 'NDL', 'NGU', 'NJK', 'PAE', 'PAN', 'PPR', 'PRB', 'PRI', 'SBI', 'SNT', 'TRE', 'TUL', 'WAT', 'WGI', 'WRJ'),
+}
+
+# Jenis data → prefix nama tabel (tabel = <prefix>_<id witel>)
+DATA_TYPES = {
+    "FTM": "ftm_data",
+    "Metro": "metro_data",
+}
+
+
+class Witel:
+    __slots__ = ("id", "name", "label")
+
+    def __init__(self, witel_id: str, name: str):
+        self.id = witel_id          # "mlg"
+        self.name = name            # "MALANG" (nilai kolom witel)
+        self.label = name.title()   # "Malang" (tampilan)
+
+    def table(self, data_type: str) -> str:
+        return f"{DATA_TYPES[data_type]}_{self.id}"
+
+    def __repr__(self) -> str:
+        return f"Witel({self.id!r}, {self.name!r})"
+
+
+class StoRegistry:
+    """
+    Master witel & STO bersama untuk semua handler (cek, input, dashboard).
+    - Witel bisa dicari dengan id ("mlg"), nama ("MALANG") atau label ("Malang"), tanpa peka
+      huruf besar/kecil, sehingga tombol & sesi lama dengan konvensi berbeda tetap dikenali.
+    - Himpunan STO disimpan sebagai frozenset per witel; semua lookup O(1) lewat dict.
+    - Dimuat dari tabel sto_master saat startup dan bisa dimuat ulang tanpa restart (/reloadsto).
+      Isi lama diganti utuh dalam satu langkah; witel tanpa baris di DB memakai daftar bawaan.
+    """
+
+    def __init__(self, witels: tuple = DEFAULT_WITELS, stos: dict = DEFAULT_STOS):
+        self._defaults = {witel_id: tuple(values) for witel_id, values in stos.items()}
+        self._witels = {witel_id: Witel(witel_id, name) for witel_id, name in witels}
+        self._aliases: dict[str, Witel] = {}
+        for witel in self._witels.values():
+            for alias in (witel.id, witel.name, witel.label):
+                self._aliases[alias.lower()] = witel
+            for data_type in DATA_TYPES:
+                self._aliases[witel.table(data_type)] = witel
+        self.source = "bawaan"
+        self.version = 0
+        self.loaded_at = None
+        self._apply(self._defaults)
+
+    def _apply(self, stos: dict) -> None:
+        ordered = {witel_id: tuple(stos.get(witel_id) or self._defaults.get(witel_id, ())) for witel_id in self._witels}
+        sets = {witel_id: frozenset(values) for witel_id, values in ordered.items()}
+        owners = {sto: self._witels[witel_id] for witel_id, values in ordered.items() for sto in values}
+        # Ganti sekaligus agar pembaca tidak pernah melihat campuran isi lama dan baru
+        self._ordered, self._sets, self._owners = ordered, sets, owners
+        self.version += 1
+
+    async def load(self) -> None:
+        rows = await fetch_all("SELECT witel_id, sto FROM sto_master ORDER BY witel_id, urutan, sto")
+        stos: dict[str, list] = {}
+        for row in rows:
+            witel_id = (row["witel_id"] or "").strip().lower()
+            sto = (row["sto"] or "").strip().upper()
+            if witel_id in self._witels and sto:
+                stos.setdefault(witel_id, []).append(sto)
+        self._apply(stos)
+        self.source = "database" if stos else "bawaan"
+        self.loaded_at = time.time()
+        logging.info(f"Master STO dimuat ({self.source}): {len(self._owners)} STO di {len(self._witels)} witel")
+
+    def witels(self) -> tuple:
+        return tuple(self._witels.values())
+
+    def witel(self, key) -> Witel | None:
+        """Witel dari id/nama/label/nama tabel; None bila tidak dikenal."""
+        return self._aliases.get(str(key or "").strip().lower())
+
+    def table(self, data_type: str, key) -> str | None:
+        witel = self.witel(key)
+        return witel.table(data_type) if witel else None
+
+    def stos(self, key) -> tuple:
+        """STO witel dalam urutan tampilan."""
+        witel = self.witel(key)
+        return self._ordered.get(witel.id, ()) if witel else ()
+
+    def valid_stos(self, key) -> frozenset:
+        witel = self.witel(key)
+        return self._sets.get(witel.id, frozenset()) if witel else frozenset()
+
+    def is_valid_sto(self, key, sto: str) -> bool:
+        return (sto or "").upper() in self.valid_stos(key)
+
+    def witel_of_sto(self, sto: str) -> Witel | None:
+        return self._owners.get((sto or "").upper())
+
+    def stats(self) -> dict:
+        return {
+            "witels": len(self._witels),
+            "stos": len(self._owners),
+            "source": self.source,
+            "version": self.version,
+        }
+
+
+sto_registry = StoRegistry()
+
+
+async def load_sto_registry() -> None:
+    """Dipanggil saat startup (post_init) setelah migrasi; gagal → tetap memakai daftar bawaan."""
+    try:
+        await sto_registry.load()
+    except Exception as e:
+        logging.error(f"Gagal memuat master STO, memakai daftar bawaan: {e}")
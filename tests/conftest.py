@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Modul bot ada di root repo (bukan paket), jadi tambahkan ke path saat test dijalankan dari mana saja
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import executor  # noqa: E402
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """WorkerQueue baru per test: semaphore antrean terikat ke event loop asyncio.run milik test itu."""
+    fresh = {name: executor.WorkerQueue(name, w.max_workers, w.max_pending) for name, w in executor.WORKERS.items()}
+    for name, worker in fresh.items():
+        monkeypatch.setitem(executor.WORKERS, name, worker)
+    yield fresh
+    for worker in fresh.values():
+        worker.shutdown()
@@ -0,0 +1,91 @@
+"""
+Stand-in koneksi MySQL di atas SQLite untuk menguji SQL loader upload (ingest.py) tanpa server.
+Hanya konstruksi MySQL yang dipakai ingest yang diterjemahkan: %s, <=>, temporary table LIKE,
+DELETE/UPDATE multi-tabel dengan JOIN, dan INSERT ... ON DUPLICATE KEY UPDATE.
+"""
+import re
+import sqlite3
+
+_DROP_TEMP = re.compile(r"DROP TEMPORARY TABLE IF EXISTS (\w+)")
+_CREATE_LIKE = re.compile(r"CREATE TEMPORARY TABLE (\w+) LIKE (\w+)")
+_DELETE_JOIN = re.compile(r"DELETE t FROM (\w+) t (.*)", re.S)
+_UPDATE_JOIN = re.compile(r"UPDATE (\w+) t JOIN (\w+) s ON (.*?) SET (.*?) WHERE (.*)", re.S)
+_ON_DUPLICATE = re.compile(r"ON DUPLICATE KEY UPDATE (.*)", re.S)
+
+
+def translate(sql: str) -> str:
+    sql = " ".join(sql.split()).replace("%s", "?").replace("<=>", "IS")
+    if m := _DROP_TEMP.fullmatch(sql):
+        return f"DROP TABLE IF EXISTS temp.{m[1]}"
+    if m := _CREATE_LIKE.fullmatch(sql):
+        return f"CREATE TEMP TABLE {m[1]} AS SELECT * FROM {m[2]} WHERE 0"
+    if m := _DELETE_JOIN.fullmatch(sql):
+        return f"DELETE FROM {m[1]} WHERE rowid IN (SELECT t.rowid FROM {m[1]} t {m[2]})"
+    if m := _UPDATE_JOIN.fullmatch(sql):
+        assignments = re.sub(r"\bt\.(\w+) =", r"\1 =", m[4])
+        return f"UPDATE {m[1]} AS t SET {assignments} FROM {m[2]} AS s WHERE ({m[3]}) AND {m[5]}"
+    if m := _ON_DUPLICATE.search(sql):
+        return sql[:m.start()] + f"ON CONFLICT DO UPDATE SET {m[1]}"
+    return sql
+
+
+class Cursor:
+    def __init__(self, conn: "Connection"):
+        self._conn = conn
+        self._cursor = conn.db.cursor()
+        self.rowcount = -1
+
+    def execute(self, sql: str, params=None):
+        translated = translate(sql)
+        self._conn.statements.append(translated)
+        self._cursor.execute(translated, tuple(params or ()))
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, sql: str, seq):
+        translated = translate(sql)
+        self._conn.statements.append(translated)
+        self._cursor.executemany(translated, [tuple(p) for p in seq])
+        self.rowcount = self._cursor.rowcount
+
+    def fetchall(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class Connection:
+    """Pengganti koneksi PyMySQL (cursor sebagai context manager, commit/rollback)."""
+
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.statements: list[str] = []
+
+    def cursor(self) -> Cursor:
+        return Cursor(self)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+    def create_table(self, table: str, columns: tuple) -> None:
+        self.db.execute(f"CREATE TABLE {table} ({', '.join(columns)}, row_hash)")
+
+    def rows(self, table: str, order: str = "rowid") -> list[dict]:
+        return [dict(r) for r in self.db.execute(f"SELECT * FROM {table} ORDER BY {order}")]
+
+    def temp_tables(self) -> list[str]:
+        return [r[0] for r in self.db.execute("SELECT name FROM sqlite_temp_master WHERE type = 'table'")]
@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from handler import access_control
+from handler.access_control import AccessRegistry
+
+
+def _users(n: int) -> list[dict]:
+    return [
+        {"name": f"user{i}", "nik": str(i), "telegram_id": str(1000 + i), "role": "admin" if i == 0 else "user"}
+        for i in range(n)
+    ]
+
+
+def _write(path, users) -> None:
+    path.write_text(json.dumps(users))
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Hitung berapa kali allowed_users.json benar-benar dibaca."""
+    calls = []
+    original = access_control._read_users_file
+
+    def counting(path):
+        calls.append(path)
+        return original(path)
+
+    monkeypatch.setattr(access_control, "_read_users_file", counting)
+    return calls
+
+
+def test_checks_are_served_from_memory(tmp_path, reads):
+    path = tmp_path / "allowed_users.json"
+    _write(path, _users(3000))
+    registry = AccessRegistry(str(path), check_interval=60)
+
+    for i in range(3000):
+        assert registry.is_authorized(str(1000 + i))
+    assert not registry.is_authorized("42")
+    assert registry.is_admin("1000") and not registry.is_admin("1001")
+    assert len(reads) == 1
+
+
+def test_external_edit_is_picked_up(tmp_path, reads):
+    path = tmp_path / "allowed_users.json"
+    _write(path, _users(2))
+    registry = AccessRegistry(str(path), check_interval=0)
+    assert registry.is_authorized("1001")
+
+    registry.is_authorized("1001")
+    assert len(reads) == 1   # file tidak berubah → tidak dibaca ulang
+
+    _write(path, _users(1) + [{"name": "baru", "nik": "9", "telegram_id": "77", "role": "admin"}])
+    os.utime(path, ns=(1, 1))
+    assert registry.is_authorized("77") and registry.is_admin("77")
+    assert not registry.is_authorized("1001")
+    assert len(reads) == 2
+
+
+def test_mutations_update_memory_and_file(tmp_path):
+    path = tmp_path / "allowed_users.json"
+    _write(path, _users(1))
+    registry = AccessRegistry(str(path), check_interval=60)
+
+    assert registry.add("baru", "9", "77")
+    assert not registry.add("baru", "9", "77")
+    assert registry.set_role("77", "admin") and registry.is_admin("77")
+    assert registry.remove("1000") and not registry.is_authorized("1000")
+    assert not registry.remove("1000")
+
+    # Tanpa event loop, flush langsung sinkron
+    on_disk = {u["telegram_id"]: u["role"] for u in json.loads(path.read_text())}
+    assert on_disk == {"77": "admin"}
+
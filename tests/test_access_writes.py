@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import pytest
+
+from handler import access_control
+from handler.access_control import AccessRegistry, UsersFileCorrupt
+
+
+def _users(n: int) -> list[dict]:
+    return [
+        {"name": f"user{i}", "nik": str(i), "telegram_id": str(1000 + i), "role": "admin" if i == 0 else "user"}
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Catat setiap penulisan allowed_users.json; `fail` berisi jumlah penulisan yang harus gagal."""
+    calls = []
+    fail = []
+    original = access_control._atomic_write_json
+
+    def recording(path, data):
+        calls.append(data)
+        if fail:
+            fail.pop()
+            raise OSError("disk penuh")
+        original(path, data)
+
+    monkeypatch.setattr(access_control, "_atomic_write_json", recording)
+    return calls, fail
+
+
+def _on_disk(path) -> dict:
+    return {u["telegram_id"]: u["role"] for u in json.loads(path.read_text())}
+
+
+def test_burst_of_mutations_is_one_write(tmp_path, writes):
+    calls, _ = writes
+    path = tmp_path / "allowed_users.json"
+    path.write_text(json.dumps(_users(1)))
+    registry = AccessRegistry(str(path), check_interval=60, flush_delay=0.01)
+
+    async def burst():
+        for i in range(50):
+            assert registry.add(f"baru{i}", str(i), str(2000 + i))
+        registry.set_role("2000", "admin")
+        registry.remove("1000")
+        await registry._flush_task
+
+    asyncio.run(burst())
+    assert len(calls) == 1
+    on_disk = _on_disk(path)
+    assert len(on_disk) == 50 and on_disk["2000"] == "admin" and "1000" not in on_disk
+
+
+def test_failed_flush_is_retried(tmp_path, writes):
+    calls, fail = writes
+    path = tmp_path / "allowed_users.json"
+    path.write_text(json.dumps(_users(1)))
+    registry = AccessRegistry(str(path), check_interval=60, flush_delay=0.01)
+    fail.append(1)
+
+    async def scenario():
+        assert registry.add("baru", "9", "77")
+        await asyncio.wait_for(registry._flush_task, timeout=5)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert _on_disk(path) == {"1000": "admin", "77": "user"}
+
+
+def test_corrupt_file_keeps_last_valid_users(tmp_path):
+    path = tmp_path / "allowed_users.json"
+    path.write_text(json.dumps(_users(2)))
+    registry = AccessRegistry(str(path), check_interval=0)
+    assert registry.is_authorized("1001")
+
+    path.write_text('[{"telegram_id": ')
+    assert registry.is_authorized("1001")
+    with pytest.raises(UsersFileCorrupt):
+        registry.add("baru", "9", "77")
+    assert not registry.claim_first_admin("baru", "9", "77")
+    assert path.read_text() == '[{"telegram_id": '
@@ -0,0 +1,41 @@
+import openpyxl
+
+import ingest
+from handler import batchgpon_command
+from handler.batchgpon_command import parse_file
+
+
+def test_csv_parsing_stops_past_the_limit(tmp_path, monkeypatch):
+    path = tmp_path / "ports.csv"
+    path.write_text("nama_gpon,card,port\n" + "".join(f"GPON{i},1,{i}\n" for i in range(1000)))
+    seen = []
+    original = batchgpon_command._record_item
+    monkeypatch.setattr(batchgpon_command, "_record_item", lambda record: seen.append(1) or original(record))
+
+    items, errors = parse_file(str(path), is_excel=False, limit=10)
+
+    assert items == [(f"GPON{i}", 1, i) for i in range(11)]
+    assert errors == []
+    assert len(seen) == 11
+
+
+def test_xlsx_parsing_stops_reading_batches_past_the_limit(tmp_path, monkeypatch):
+    path = tmp_path / "ports.xlsx"
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("data")
+    ws.append(["nama_gpon", "card/port"])
+    for i in range(1000):
+        ws.append([f"GPON{i}", f"1/{i}"])
+    wb.save(path)
+    batches = []
+
+    def small_batches(path):
+        for batch in ingest.iter_excel_batches(path, batch_size=20):
+            batches.append(len(batch))
+            yield batch
+
+    monkeypatch.setattr(batchgpon_command, "iter_excel_batches", small_batches)
+    items, _ = parse_file(str(path), is_excel=True, limit=30)
+
+    assert len(items) == 31 and items[-1] == ("GPON30", 1, 30)
+    assert batches == [20, 20]
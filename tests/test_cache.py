@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+import cache
+from cache import TTLCache
+
+
+def test_get_or_load_is_single_flight():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["KPO", "BTU"]
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_load(("ftm_data_mlg", "MALANG", None), loader) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [["KPO", "BTU"]] * 5
+    assert len(calls) == 1
+    assert cache.get(("ftm_data_mlg", "MALANG", None)) == ["KPO", "BTU"]
+
+
+def test_invalidation_during_load_does_not_store_stale_result():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    key = ("ftm_data_mlg", "MALANG", "KPO")
+    data = {"KPO": ["GPON01"]}
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_loader():
+        value = list(data["KPO"])     # dibaca sebelum upload
+        started.set()
+        await release.wait()
+        return value
+
+    async def fast_loader():
+        return list(data["KPO"])
+
+    async def scenario():
+        old = asyncio.create_task(cache.get_or_load(key, slow_loader))
+        await started.wait()
+        # Upload menimpa KPO saat query lama masih berjalan
+        data["KPO"] = ["GPON01", "GPON02"]
+        cache.invalidate(lambda k: k[0] == "ftm_data_mlg" and k[2] == "KPO")
+        # Pemanggil setelah upload tidak ikut menunggu hasil load lama
+        fresh = await cache.get_or_load(key, fast_loader)
+        release.set()
+        return await old, fresh
+
+    old, fresh = asyncio.run(scenario())
+    assert old == ["GPON01"]
+    assert fresh == ["GPON01", "GPON02"]
+    assert cache.get(key) == ["GPON01", "GPON02"]
+
+
+def test_clear_during_load_discards_result_and_set_respects_generation():
+    cache = TTLCache("test", maxsize=10, ttl=60)
+
+    async def loader():
+        cache.clear()
+        return "lama"
+
+    assert asyncio.run(cache.get_or_load("q", loader)) == "lama"
+    assert cache.get("q") is None
+
+    generation = cache.generation
+    cache.clear()
+    cache.set("q", "basi", generation)
+    assert cache.get("q") is None
+    cache.set("q", "baru", cache.generation)
+    assert cache.get("q") == "baru"
+
+
+def test_notify_upload_runs_async_listeners_as_tasks(monkeypatch, caplog):
+    monkeypatch.setattr(cache, "_upload_listeners", [])
+    calls = []
+
+    @cache.on_upload
+    def mark(table, stos):
+        calls.append(("sync", table, stos))
+
+    @cache.on_upload
+    async def refresh(table, stos):
+        await asyncio.sleep(0)
+        calls.append(("async", table, stos))
+
+    @cache.on_upload
+    async def broken(table, stos):
+        raise RuntimeError("koneksi putus")
+
+    async def scenario():
+        cache.notify_upload("metro_data_mlg", ["kpo"])
+        # Listener sinkron selesai sebelum notify_upload kembali; yang async masih berjalan
+        assert calls == [("sync", "metro_data_mlg", {"KPO"})]
+        assert len(cache._upload_tasks) == 2
+        await asyncio.gather(*cache._upload_tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(scenario())
+    assert calls[1] == ("async", "metro_data_mlg", {"KPO"})
+    assert not cache._upload_tasks
+    assert "broken gagal: koneksi putus" in caplog.text
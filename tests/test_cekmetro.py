@@ -0,0 +1,34 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import ConversationHandler
+
+from handler import cekmetro_command
+
+
+class FakeQuery:
+    def __init__(self, data: str):
+        self.data = data
+        self.edits = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+@pytest.mark.parametrize("handler, data", [
+    (cekmetro_command.handle_sto_selection, "sto_KPO"),
+    (cekmetro_command.handle_gpon_selection, "gpon_GPON01-D5-KPO-2"),
+])
+def test_selection_without_session_asks_to_restart(monkeypatch, handler, data):
+    # user_data kosong: mis. bot restart di tengah percakapan
+    monkeypatch.setattr(cekmetro_command, "is_authorized", lambda telegram_id: True)
+    query = FakeQuery(data)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1), callback_query=query, message=None)
+    context = SimpleNamespace(user_data={})
+
+    assert asyncio.run(handler(update, context)) == ConversationHandler.END
+    assert query.edits == [cekmetro_command.SESSION_EXPIRED]
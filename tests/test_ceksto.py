@@ -0,0 +1,31 @@
+import datetime
+import re
+
+from handler import ceksto_command
+from outbox import MAX_MESSAGE_LENGTH, pack_blocks
+from sto_coverage import coverage
+from sto_registry import sto_registry
+
+
+def test_dashboard_escapes_names_and_splits_under_limit(monkeypatch):
+    uploaded = datetime.datetime(2026, 10, 1, 8, 30)
+    rows = {("ftm_data_mlg", sto): {"rows": 120, "gpons": 4, "uploaded_at": uploaded} for sto in sto_registry.stos("mlg")}
+    # STO liar dari upload lama: tidak ada di master, nama memuat karakter HTML
+    rows[("ftm_data_mlg", "<B&")] = {"rows": 1, "gpons": 1, "uploaded_at": None}
+    for i in range(600):
+        rows[("ftm_data_kdr", f"X{i:03d}")] = {"rows": 5, "gpons": 1, "uploaded_at": None}
+    monkeypatch.setattr(coverage, "_rows", rows)
+
+    blocks = ceksto_command.render_dashboard("FTM")
+    messages = pack_blocks(blocks, "\n")
+
+    assert len("\n".join(blocks)) > MAX_MESSAGE_LENGTH
+    assert len(messages) > 1
+    for text in messages:
+        assert len(text) <= MAX_MESSAGE_LENGTH
+        assert text.count("<pre>") == text.count("</pre>")
+    text = "\n".join(messages)
+    assert "<B&" not in text
+    assert "&lt;B&amp; " in text
+    assert "Tidak ada di master (?): &lt;B&amp;" in text
+    assert re.search(r"<b>Malang</b> ✔️ 24/24 STO · 2\.881 baris", text)
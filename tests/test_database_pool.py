@@ -0,0 +1,164 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pymysql
+import pytest
+
+from database import ConnectionPool
+
+
+class FakeMySQL:
+    """Stand-in koneksi: SQLite in-memory + penghitung, dibuat lewat connect() milik pool."""
+
+    def __init__(self):
+        self.opened = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.opened.append(conn)
+        return conn
+
+    @staticmethod
+    def ping(conn):
+        conn.execute("SELECT 1")
+
+    def query(self, conn, delay: float = 0.0):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(delay)
+            return conn.execute("SELECT 1").fetchone()[0]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _pool(fake: FakeMySQL, **kwargs) -> ConnectionPool:
+    kwargs.setdefault("min_size", 1)
+    kwargs.setdefault("max_size", 4)
+    kwargs.setdefault("max_idle", 300)
+    return ConnectionPool(connect=fake.connect, ping=fake.ping, **kwargs)
+
+
+def test_connection_is_reused(workers):
+    fake = FakeMySQL()
+
+    async def scenario():
+        pool = _pool(fake)
+        await pool.start()
+        for _ in range(20):
+            assert await pool.run(fake.query) == 1
+        stats = pool.stats()
+        await pool.close()
+        return stats
+
+    assert asyncio.run(scenario()) == {"size": 1, "idle": 1, "max": 4}
+    assert len(fake.opened) == 1
+
+
+def test_concurrency_is_bounded_by_max_size(workers):
+    fake = FakeMySQL()
+
+    async def scenario():
+        pool = _pool(fake, max_size=3)
+        results = await asyncio.gather(*(pool.run(fake.query, 0.02) for _ in range(30)))
+        size = pool.size
+        await pool.close()
+        return results, size
+
+    results, size = asyncio.run(scenario())
+    assert results == [1] * 30
+    assert fake.peak == 3
+    assert size == 3
+    assert len(fake.opened) == 3
+
+
+def test_event_loop_not_blocked_while_query_runs(workers):
+    fake = FakeMySQL()
+
+    async def scenario():
+        pool = _pool(fake)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await pool.run(fake.query, 0.2)
+        task.cancel()
+        await pool.close()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
+
+
+def test_dead_connection_is_replaced_on_checkout(workers):
+    fake = FakeMySQL()
+
+    async def scenario():
+        pool = _pool(fake)
+        await pool.start()
+        fake.opened[0].close()   # server memutus koneksi yang menganggur
+        result = await pool.run(fake.query)
+        size = pool.size
+        await pool.close()
+        return result, size
+
+    assert asyncio.run(scenario()) == (1, 1)
+    assert len(fake.opened) == 2
+
+
+def test_broken_connection_is_discarded_on_release(workers):
+    fake = FakeMySQL()
+
+    async def scenario():
+        pool = _pool(fake)
+        with pytest.raises(pymysql.err.OperationalError):
+            async with pool.connection():
+                raise pymysql.err.OperationalError(2013, "Lost connection")
+        size_after = pool.size
+        await pool.run(fake.query)
+        await pool.close()
+        return size_after
+
+    assert asyncio.run(scenario()) == 0
+    assert len(fake.opened) == 2
+
+
+def test_idle_connections_are_recycled_down_to_min_size(workers):
+    fake = FakeMySQL()
+
+    async def scenario():
+        pool = _pool(fake, min_size=1, max_size=4, max_idle=0.05)
+        await asyncio.gather(*(pool.run(fake.query, 0.02) for _ in range(4)))
+        opened = pool.size
+        await asyncio.sleep(0.1)
+        await pool.run(fake.query)
+        recycled = pool.size
+        await pool.close()
+        return opened, recycled
+
+    assert asyncio.run(scenario()) == (4, 1)
+
+
+def test_closed_pool_refuses_acquire(workers):
+    fake = FakeMySQL()
+
+    async def scenario():
+        pool = _pool(fake)
+        await pool.start()
+        await pool.close()
+        with pytest.raises(RuntimeError):
+            await pool.acquire()
+        return pool.size
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,166 @@
+import asyncio
+import sqlite3
+import time
+
+import openpyxl
+import pytest
+
+import ingest
+from database import ConnectionPool
+
+
+def _write_xlsx(path, header, rows):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("data")
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+class RecordingLoader:
+    """Loader palsu dengan antarmuka make_loader(); mencatat urutan batch yang ditulis."""
+
+    def __init__(self, events: list, delay: float = 0.0, fail_at: int | None = None):
+        self.events = events
+        self.delay = delay
+        self.fail_at = fail_at
+        self.rows_written = 0
+        self.batches = 0
+        self.aborted = False
+        self.finished = False
+        self.timings = {}
+
+    def begin(self, conn):
+        pass
+
+    def write(self, conn, rows):
+        if self.batches == self.fail_at:
+            raise RuntimeError("insert gagal")
+        time.sleep(self.delay)
+        self.batches += 1
+        self.rows_written += len(rows)
+        self.events.append(("write", self.batches))
+
+    def finish(self, conn):
+        self.finished = True
+        return self.rows_written
+
+    def abort(self, conn):
+        self.aborted = True
+
+
+@pytest.fixture
+def pool(monkeypatch, workers):
+    pool = ConnectionPool(
+        connect=lambda: sqlite3.connect(":memory:", check_same_thread=False),
+        ping=lambda conn: conn.execute("SELECT 1"),
+    )
+    monkeypatch.setattr(ingest, "get_pool", lambda: pool)
+    return pool
+
+
+def test_iter_excel_batches_normalizes_headers_and_cells(tmp_path):
+    path = _write_xlsx(
+        tmp_path / "upload",   # file unduhan Telegram tidak berekstensi
+        ["WITEL", " Nama GPON ", "Card", "NO PORT PANEL", "NO PORT PANEL", None],
+        [
+            ["malang", " GPON01 ", 1.0, 2, 3, "x"],
+            [None, None, None, None, None, None],
+            ["kediri", "GPON02", 2.5, None, "", None],
+            ["madiun", "GPON03", 3, 4, 5, None],
+        ],
+    )
+    batches = list(ingest.iter_excel_batches(path, batch_size=2))
+    assert [len(b) for b in batches] == [2, 1]
+    first, second, third = batches[0] + batches[1]
+    assert first == {
+        "witel": "malang", "nama_gpon": "GPON01", "card": "1",
+        "no_port_panel": "2", "no_port_panel.1": "3", "_row": 2,
+    }
+    assert second["_row"] == 4 and second["card"] == "2.5"
+    assert second["no_port_panel"] is None and second["no_port_panel.1"] is None
+    assert third["_row"] == 5
+
+
+def test_load_excel_streams_batches_into_loader(tmp_path, pool):
+    batch_size, batches = 50, 40
+    path = _write_xlsx(
+        tmp_path / "big.xlsx",
+        ["sto", "nama_gpon"],
+        [[f"STO{i % 7}", f"GPON{i}"] for i in range(batch_size * batches)],
+    )
+    events = []
+    in_flight = []
+
+    def prepare(records):
+        parsed = sum(1 for kind, _ in events if kind == "parse") + 1
+        written = sum(1 for kind, _ in events if kind == "write")
+        in_flight.append(parsed - written)
+        events.append(("parse", parsed))
+        return records
+
+    loader = RecordingLoader(events, delay=0.005)
+    written = asyncio.run(ingest.load_excel(path, prepare, loader, batch_size=batch_size))
+
+    assert written == batch_size * batches
+    assert loader.finished and not loader.aborted
+    kinds = [kind for kind, _ in events]
+    # Batch pertama sudah masuk DB sebelum batch terakhir selesai dibaca
+    assert kinds.index("write") < len(kinds) - 1 - kinds[::-1].index("parse")
+    # Antrean terbatas: producer tidak pernah jauh di depan consumer
+    assert max(in_flight) <= ingest.QUEUE_BATCHES + 2
+    assert "total" in loader.timings
+    assert pool.size == pool.idle == 1
+
+
+def test_load_excel_stops_parsing_when_db_write_fails(tmp_path, pool):
+    batch_size, batches = 20, 50
+    path = _write_xlsx(tmp_path / "big.xlsx", ["sto"], [["KPO"]] * (batch_size * batches))
+    parsed = []
+    loader = RecordingLoader([], fail_at=1)
+
+    with pytest.raises(RuntimeError, match="insert gagal"):
+        asyncio.run(ingest.load_excel(path, lambda records: parsed.append(1) or records, loader, batch_size=batch_size))
+
+    assert loader.aborted and not loader.finished
+    assert len(parsed) < batches
+    assert pool.size == pool.idle == 1
+
+
+def test_load_excel_reports_unreadable_file(tmp_path, pool):
+    path = tmp_path / "rusak.xlsx"
+    path.write_bytes(b"bukan file excel")
+    loader = RecordingLoader([])
+
+    with pytest.raises(ingest.ExcelReadError):
+        asyncio.run(ingest.load_excel(str(path), lambda records: records, loader))
+
+    assert loader.aborted and loader.rows_written == 0
+
+
+def test_load_excel_does_not_wrap_prepare_errors(tmp_path, pool):
+    path = _write_xlsx(tmp_path / "data.xlsx", ["sto"], [["KPO"]] * 10)
+    loader = RecordingLoader([])
+
+    def prepare(records):
+        raise KeyError("kolom_baru")
+
+    with pytest.raises(KeyError, match="kolom_baru") as raised:
+        asyncio.run(ingest.load_excel(path, prepare, loader))
+
+    assert not isinstance(raised.value, ingest.ExcelReadError)
+    assert loader.aborted and loader.rows_written == 0
+
+
+def test_loader_rows_carry_stable_row_hash():
+    loader = ingest.DirectLoader("ftm_data_mlg", ("sto", "nama_gpon", "card"))
+    first, second, changed = loader._values([
+        {"sto": "KPO", "nama_gpon": "GPON01", "card": "1"},
+        {"sto": "KPO", "nama_gpon": "GPON01", "card": "1", "_row": 9},
+        {"sto": "KPO", "nama_gpon": "GPON01", "card": None},
+    ])
+    assert first == second
+    assert first[:3] == ("KPO", "GPON01", "1") and len(first[3]) == 32
+    assert changed[3] != first[3]
@@ -0,0 +1,34 @@
+import asyncio
+
+from handler import inline_query
+
+
+def test_cache_key_keeps_separators_that_lookups_distinguish():
+    assert inline_query._cache_key("  gpon01-d5-kpo-2 \t 1/4 ") == "GPON01-D5-KPO-2 1/4"
+    assert inline_query._cache_key("GPON01 1/4") != inline_query._cache_key("GPON01-1 4")
+    assert inline_query._cache_key("A_B 1/2") != inline_query._cache_key("A-B 1/2")
+
+
+def test_gpon_results_reuse_gpon_blocks(monkeypatch):
+    calls = []
+
+    async def locate(name):
+        return [(None, "ftm_data_mlg", "KPO", "GPON01-D5-KPO-2"), ("KEDIRI", "ftm_data_kdr", "KBN", "GPON01-D5-KPO-2")]
+
+    async def gpon_blocks(table, witel, sto, nama_gpon, card, port):
+        calls.append((table, witel, sto, nama_gpon, card, port))
+        return [f"✅ {table} {card}/{port}"]
+
+    monkeypatch.setattr(inline_query.gpon_index, "locate", locate)
+    monkeypatch.setattr(inline_query, "gpon_blocks", gpon_blocks)
+
+    results = asyncio.run(inline_query._gpon_results("gpon01-d5-kpo-2", 1, 4))
+
+    assert calls == [
+        ("ftm_data_mlg", None, "KPO", "GPON01-D5-KPO-2", 1, 4),
+        ("ftm_data_kdr", "KEDIRI", "KBN", "GPON01-D5-KPO-2", 1, 4),
+    ]
+    assert [r.title for r in results] == ["GPON01-D5-KPO-2 1/4"] * 2
+    assert [r.description for r in results] == ["-/KPO", "KEDIRI/KBN"]
+    assert results[1].input_message_content.message_text == "✅ ftm_data_kdr 1/4"
+    assert len({r.id for r in results}) == 2
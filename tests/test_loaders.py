@@ -0,0 +1,129 @@
+from ingest import DiffLoader, StagedLoader
+
+from mysql_standin import Connection
+
+TABLE = "ftm_data_mlg"
+COLUMNS = ("sto", "nama_gpon", "card", "port", "nama_odc")
+KEY = ("sto", "nama_gpon", "card", "port")
+
+
+def _row(sto, gpon, card, port, odc=None) -> dict:
+    return {"sto": sto, "nama_gpon": gpon, "card": card, "port": port, "nama_odc": odc}
+
+
+def _connection(live: list[dict]) -> Connection:
+    conn = Connection()
+    conn.create_table(TABLE, COLUMNS)
+    conn.db.execute(
+        "CREATE TABLE sto_uploads (table_name, sto, uploaded_at DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (table_name, sto))"
+    )
+    seed = DiffLoader(TABLE, COLUMNS, KEY)
+    with conn.cursor() as cursor:
+        cursor.executemany(seed._insert_sql(TABLE), seed._values(live))
+    conn.commit()
+    conn.statements.clear()
+    return conn
+
+
+def _upload(conn: Connection, loader, *batches) -> None:
+    loader.begin(conn)
+    for batch in batches:
+        loader.write(conn, batch)
+    loader.finish(conn)
+
+
+def _live(conn: Connection) -> list[tuple]:
+    return [tuple(r[c] for c in COLUMNS) for r in conn.rows(TABLE, "sto, nama_gpon, card, port")]
+
+
+def test_diff_counts_and_untouched_stos():
+    conn = _connection([
+        _row("KPO", "G1", 1, 1, "A"),
+        _row("KPO", "G1", 1, 2, "B"),
+        _row("KPO", "G1", 1, 3, "X"),
+        _row("BTU", "G2", 1, 1, "Y"),
+    ])
+    loader = DiffLoader(TABLE, COLUMNS, KEY)
+    _upload(conn, loader, [_row("KPO", "G1", 1, 1, "A"), _row("KPO", "G1", 1, 2, "C")], [_row("KPO", "G1", 1, 4, "D")])
+
+    assert loader.diff == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    assert _live(conn) == [
+        ("BTU", "G2", 1, 1, "Y"),
+        ("KPO", "G1", 1, 1, "A"),
+        ("KPO", "G1", 1, 2, "C"),
+        ("KPO", "G1", 1, 4, "D"),
+    ]
+    # row_hash ikut diperbarui, jadi upload ulang file yang sama tidak mengubah apa pun
+    again = DiffLoader(TABLE, COLUMNS, KEY)
+    _upload(conn, again, [_row("KPO", "G1", 1, 1, "A"), _row("KPO", "G1", 1, 2, "C"), _row("KPO", "G1", 1, 4, "D")])
+    assert again.diff == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 3}
+    assert [r["sto"] for r in conn.rows("sto_uploads")] == ["KPO"]
+    assert any(s.startswith("UPDATE ftm_data_mlg AS t SET") for s in conn.statements)
+
+
+def test_duplicate_keys_fall_back_to_full_swap():
+    conn = _connection([_row("KPO", "G1", 1, 1, "A"), _row("BTU", "G2", 1, 1, "Y")])
+    loader = DiffLoader(TABLE, COLUMNS, KEY)
+    _upload(conn, loader, [
+        _row("KPO", "G1", 1, 1, "A"),
+        _row("BTU", "G2", 1, 1, "Y"),
+        _row("BTU", "G2", 1, 1, "Z"),   # kunci kembar di file
+    ])
+
+    assert loader.diff == {"inserted": 2, "updated": 0, "deleted": 1, "unchanged": 1}
+    assert _live(conn) == [("BTU", "G2", 1, 1, "Y"), ("BTU", "G2", 1, 1, "Z"), ("KPO", "G1", 1, 1, "A")]
+
+
+def test_duplicate_keys_in_live_table_fall_back_to_full_swap():
+    conn = _connection([_row("KPO", "G1", 1, 1, "A"), _row("KPO", "G1", 1, 1, "A")])
+    loader = DiffLoader(TABLE, COLUMNS, KEY)
+    _upload(conn, loader, [_row("KPO", "G1", 1, 1, "A")])
+
+    assert loader.diff == {"inserted": 1, "updated": 0, "deleted": 2, "unchanged": 0}
+    assert _live(conn) == [("KPO", "G1", 1, 1, "A")]
+
+
+def test_null_key_rows_take_the_full_swap_path():
+    conn = _connection([_row("KPO", "G1", 1, None, "A"), _row("KPO", "G1", 1, 2, "B"), _row("BTU", "G2", 1, 1, "Y")])
+    loader = DiffLoader(TABLE, COLUMNS, KEY)
+    _upload(conn, loader, [_row("KPO", "G1", 1, None, "A"), _row("KPO", "G1", 1, 2, "B"), _row("BTU", "G2", 1, 1, "Y")])
+
+    # KPO: swap penuh (2 hapus + 2 tambah); BTU: diff biasa, tidak berubah
+    assert loader.diff == {"inserted": 2, "updated": 0, "deleted": 2, "unchanged": 1}
+    assert _live(conn) == [("BTU", "G2", 1, 1, "Y"), ("KPO", "G1", 1, None, "A"), ("KPO", "G1", 1, 2, "B")]
+
+
+def test_staged_begin_creates_temporary_staging_table():
+    conn = _connection([_row("KPO", "G1", 1, 1, "A")])
+    loader = StagedLoader(TABLE, COLUMNS, KEY)
+    loader.begin(conn)
+    loader.write(conn, [_row("KPO", "G1", 1, 9, "B")])
+
+    assert conn.temp_tables() == ["stg_ftm_data_mlg"]
+    assert [r["port"] for r in conn.rows("stg_ftm_data_mlg")] == [9]
+    # tabel live belum tersentuh sebelum finish
+    assert _live(conn) == [("KPO", "G1", 1, 1, "A")]
+
+
+def test_staged_swap_replaces_only_uploaded_stos():
+    conn = _connection([_row("KPO", "G1", 1, 1, "A"), _row("KPO", "G1", 1, 2, "B"), _row("BTU", "G2", 1, 1, "Y")])
+    loader = StagedLoader(TABLE, COLUMNS, KEY)
+    _upload(conn, loader, [_row("KPO", "G1", 1, 5, "C")], [_row("SGS", "G3", 2, 1, "D")])
+
+    assert loader.stos == {"KPO", "SGS"}
+    assert _live(conn) == [("BTU", "G2", 1, 1, "Y"), ("KPO", "G1", 1, 5, "C"), ("SGS", "G3", 2, 1, "D")]
+    assert sorted(r["sto"] for r in conn.rows("sto_uploads")) == ["KPO", "SGS"]
+    assert conn.temp_tables() == []
+
+
+def test_staged_abort_drops_staging_and_keeps_live():
+    conn = _connection([_row("KPO", "G1", 1, 1, "A")])
+    loader = StagedLoader(TABLE, COLUMNS, KEY)
+    loader.begin(conn)
+    loader.write(conn, [_row("KPO", "G1", 1, 9, "B")])
+    loader.abort(conn)
+
+    assert conn.temp_tables() == []
+    assert "DROP TABLE IF EXISTS temp.stg_ftm_data_mlg" in conn.statements
+    assert _live(conn) == [("KPO", "G1", 1, 1, "A")]
+    assert conn.rows("sto_uploads") == []
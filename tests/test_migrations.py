@@ -0,0 +1,115 @@
+import asyncio
+import re
+import sqlite3
+
+import pytest
+
+import migrations
+from cache import render_cache
+from handler import cekgpon_command_v2
+import metro_summary
+
+FTM_COLUMNS = ("witel", "sto", "ip", "nama_gpon", "card", "port", "nama_odc")
+METRO_COLUMNS = ("witel", "sto", "gpon_hostname", "port_gpon", "metro")
+
+
+class RecordingCursor:
+    """Cursor palsu: information_schema selalu kosong (belum ada index/kolom TEXT), SQL dicatat."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(" ".join(sql.split()))
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+
+def _ddl() -> list[str]:
+    cursor = RecordingCursor()
+    migrations._add_lookup_indexes(cursor)
+    return [s for s in cursor.statements if s.startswith("CREATE INDEX")]
+
+
+def _to_sqlite(sql: str) -> str:
+    return " ".join(sql.replace("%s", "?").replace("<=>", "IS").split())
+
+
+def _explain(table: str, columns: tuple, sql: str, params) -> str:
+    """Buat tabel + index dari DDL migrasi 2 di SQLite, lalu EXPLAIN QUERY PLAN query lookup."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+    for statement in _ddl():
+        if re.search(rf" ON {table} ", statement):
+            conn.execute(statement)
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {_to_sqlite(sql)}", params).fetchall()
+    conn.close()
+    return " ".join(row[-1] for row in plan)
+
+
+async def _captured_query(call) -> tuple[str, tuple]:
+    captured = []
+
+    async def fake_fetch_all(sql, params=None):
+        captured.append((sql, params))
+        return []
+
+    render_cache.clear()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(cekgpon_command_v2, "fetch_all", fake_fetch_all)
+        mp.setattr(metro_summary, "fetch_all", fake_fetch_all)
+        await call()
+    assert len(captured) == 1
+    return captured[0]
+
+
+def test_migration_2_creates_lookup_indexes():
+    ddl = _ddl()
+    for table in migrations.FTM_TABLES:
+        assert f"CREATE INDEX idx_sto_gpon_card_port ON {table} (sto, nama_gpon, card, port)" in ddl
+        assert f"CREATE INDEX idx_witel_sto ON {table} (witel, sto)" in ddl
+    for table in migrations.METRO_TABLES:
+        assert f"CREATE INDEX idx_sto_hostname ON {table} (sto, gpon_hostname)" in ddl
+        assert f"CREATE INDEX idx_witel_sto ON {table} (witel, sto)" in ddl
+    assert len(ddl) == 2 * (len(migrations.FTM_TABLES) + len(migrations.METRO_TABLES))
+
+
+def test_migration_2_is_registered():
+    assert (2, migrations._add_lookup_indexes) in [(v, step) for v, _, step in migrations.MIGRATIONS]
+
+
+def test_text_columns_use_prefix_index():
+    class TextCursor(RecordingCursor):
+        def fetchall(self):
+            return [{"name": "nama_gpon"}]
+
+    cursor = TextCursor()
+    migrations._create_index(cursor, "ftm_data_mlg", "idx_sto_gpon_card_port", ("sto", "nama_gpon", "card", "port"))
+    assert cursor.statements[-1] == (
+        f"CREATE INDEX idx_sto_gpon_card_port ON ftm_data_mlg (sto, nama_gpon({migrations.TEXT_PREFIX}), card, port)"
+    )
+
+
+def test_gpon_lookup_uses_sto_gpon_card_port_index():
+    sql, params = asyncio.run(_captured_query(
+        lambda: cekgpon_command_v2.gpon_blocks("ftm_data_mlg", "malang", "kpo", "GPON01-D5-KPO-2", 1, 4)
+    ))
+    assert "LOWER(" not in sql.upper()
+    assert params == ("KPO", "GPON01-D5-KPO-2", 1, 4, "MALANG")
+    plan = _explain("ftm_data_mlg", FTM_COLUMNS, sql, params)
+    assert "USING INDEX idx_sto_gpon_card_port (sto=? AND nama_gpon=? AND card=? AND port=?)" in plan
+
+
+def test_metro_lookup_uses_sto_hostname_index(monkeypatch):
+    monkeypatch.setattr(metro_summary.metro_summary, "ready", False)
+    sql, params = asyncio.run(_captured_query(
+        lambda: metro_summary.metro_blocks("metro_data_mlg", "kpo", "GPON01-D5-KPO-2")
+    ))
+    assert "LOWER(" not in sql.upper()
+    assert params == ("KPO", "GPON01-D5-KPO-2")
+    plan = _explain("metro_data_mlg", METRO_COLUMNS, sql, params)
+    assert "USING INDEX idx_sto_hostname (sto=? AND gpon_hostname=?)" in plan
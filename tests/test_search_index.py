@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import memory_index
+import search_index as search_module
+from search_index import SearchIndex
+
+FIELDS = {"ftm_data_mlg": ("nama_gpon",), "ftm_data_kdr": ("nama_gpon",)}
+
+
+class FakeDB:
+    def __init__(self, rows: dict):
+        self.rows = rows    # table → [row]
+        self.fail = False
+        self.queries = 0
+
+    async def fetch_all(self, sql, params=None):
+        self.queries += 1
+        if self.fail:
+            raise RuntimeError("koneksi putus")
+        table = sql.split(" FROM ")[1].split()[0]
+        return [r for r in self.rows.get(table, []) if not params or r["sto"] in params]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDB({
+        "ftm_data_mlg": [
+            {"witel": "MALANG", "sto": "KPO", "name": "GPON01-D5-KPO-2"},
+            {"witel": None, "sto": "KPO", "name": "GPON01-D5-KPO-2"},   # data lama tanpa witel
+        ],
+        "ftm_data_kdr": [{"witel": "KEDIRI", "sto": "KBN", "name": "GPON01-D5-KPO-2"}],
+    })
+    monkeypatch.setattr(memory_index, "fetch_all", db.fetch_all)
+    return db
+
+
+def test_search_sorts_locations_with_null_witel(db):
+    index = SearchIndex(FIELDS)
+    asyncio.run(index.build())
+
+    [item] = index.search("kpo 2")
+    assert item["locations"] == [
+        (None, "ftm_data_mlg", "KPO"),
+        ("KEDIRI", "ftm_data_kdr", "KBN"),
+        ("MALANG", "ftm_data_mlg", "KPO"),
+    ]
+
+
+def test_failed_refresh_forces_rebuild(db, monkeypatch):
+    monkeypatch.setattr(search_module, "search_index", SearchIndex(FIELDS))
+    index = search_module.search_index
+
+    async def scenario():
+        assert await index.ensure_ready()
+        db.fail = True
+        db.rows["ftm_data_mlg"] = [{"witel": "MALANG", "sto": "KPO", "name": "GPON09-D5-KPO-1"}]
+        await search_module._refresh("ftm_data_mlg", {"KPO"})
+        assert not index.ready
+        # Masih dalam jeda retry: tidak menghajar DB yang sedang bermasalah
+        queries = db.queries
+        assert not await index.ensure_ready()
+        assert db.queries == queries
+
+        db.fail = False
+        monkeypatch.setattr(memory_index, "INDEX_RETRY_INTERVAL", 0)
+        assert await index.ensure_ready()
+        return [item["name"] for item in index.search("kpo")]
+
+    assert asyncio.run(scenario()) == ["GPON01-D5-KPO-2", "GPON09-D5-KPO-1"]
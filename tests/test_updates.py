@@ -0,0 +1,167 @@
+import asyncio
+import json
+import random
+import time
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+from telegram.request import BaseRequest
+
+from updates import ChatOrderedUpdateProcessor
+
+USERS = 300
+STEPS = 5
+WORKERS = 16
+ASK_STEP = 0
+
+
+class FakeBotAPI(BaseRequest):
+    """Bot API lokal: getMe dan sendMessage dijawab di memori, pesan keluar dicatat per chat."""
+
+    def __init__(self):
+        self.sent: dict[int, list[str]] = {}
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "fake_bot"}
+        elif endpoint == "sendMessage":
+            chat_id = int(params["chat_id"])
+            self.sent.setdefault(chat_id, []).append(params["text"])
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params["text"],
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def _update(bot, update_id: int, chat_id: int, text: str) -> Update:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+def _interleaved(bot, slow_chat: int) -> list[Update]:
+    """Percakapan semua user diacak antar chat, urutan di dalam satu chat tetap."""
+    rng = random.Random(12)
+    pending = {chat_id: ["/mulai"] + [f"langkah {i}" for i in range(1, STEPS)] for chat_id in range(1, USERS + 1)}
+    pending[slow_chat] = ["/mulai", "lambat"] + [f"langkah {i}" for i in range(2, STEPS)]
+    updates = []
+    while pending:
+        chat_id = rng.choice(list(pending))
+        updates.append(_update(bot, len(updates) + 1, chat_id, pending[chat_id].pop(0)))
+        if not pending[chat_id]:
+            del pending[chat_id]
+    return updates
+
+
+def test_interleaved_conversations_keep_per_chat_order():
+    api = FakeBotAPI()
+    processor = ChatOrderedUpdateProcessor(max_workers=WORKERS)
+    app = Application.builder().token("123:TEST").request(api).concurrent_updates(processor).build()
+    seen: dict[int, list[str]] = {}
+    finished_at: dict[int, float] = {}
+    gauge = {"active": 0, "peak": 0}
+    slow_chat = 7
+
+    async def step(update, context):
+        gauge["active"] += 1
+        gauge["peak"] = max(gauge["peak"], gauge["active"])
+        try:
+            text = update.message.text
+            chat_id = update.effective_chat.id
+            # Upload lambat di satu chat tidak boleh menahan chat lain
+            await asyncio.sleep(0.5 if text == "lambat" else random.random() / 200)
+            seen.setdefault(chat_id, []).append(text)
+            count = context.user_data["steps"] = context.user_data.get("steps", 0) + 1
+            await update.message.reply_text(f"ok {count}")
+            if count == STEPS:
+                finished_at[chat_id] = time.monotonic()
+                return ConversationHandler.END
+            return ASK_STEP
+        finally:
+            gauge["active"] -= 1
+
+    app.add_handler(ConversationHandler(
+        entry_points=[CommandHandler("mulai", step)],
+        states={ASK_STEP: [MessageHandler(filters.TEXT & ~filters.COMMAND, step)]},
+        fallbacks=[],
+    ))
+
+    async def scenario():
+        async with app:
+            await app.start()
+            started = time.monotonic()
+            for update in _interleaved(app.bot, slow_chat):
+                await app.update_queue.put(update)
+            while len(finished_at) < USERS and time.monotonic() - started < 30:
+                await asyncio.sleep(0.01)
+            await app.stop()
+            return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+
+    assert len(finished_at) == USERS
+    for chat_id in range(1, USERS + 1):
+        expected = ["/mulai", "lambat" if chat_id == slow_chat else "langkah 1"] + [f"langkah {i}" for i in range(2, STEPS)]
+        assert seen[chat_id] == expected
+        assert api.sent[chat_id] == [f"ok {i}" for i in range(1, STEPS + 1)]
+    assert 1 < gauge["peak"] <= WORKERS
+    # Chat lain selesai jauh sebelum chat yang menunggu upload lambat
+    others = sorted(t for chat_id, t in finished_at.items() if chat_id != slow_chat)
+    assert others[len(others) // 2] < finished_at[slow_chat]
+    stats = processor.stats()
+    assert stats["completed"] == USERS * STEPS and stats["failed"] == 0
+    assert stats["waiting"] == stats["running"] == stats["chats"] == 0
+    print(f"{USERS * STEPS} update dari {USERS} chat: {elapsed:.2f} dtk, paralel maks {gauge['peak']}, "
+          f"tunggu rata-rata {stats['avg_wait_ms']} ms")
+
+
+def test_cancelled_update_releases_chat_slot():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_workers=1)
+        await processor.initialize()
+        bot = Application.builder().token("123:TEST").request(FakeBotAPI()).build().bot
+        blocker = asyncio.Event()
+
+        async def slow():
+            await blocker.wait()
+
+        first = asyncio.create_task(processor.do_process_update(_update(bot, 1, 5, "a"), slow()))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(processor.do_process_update(_update(bot, 2, 5, "b"), slow()))
+        await asyncio.sleep(0)
+        second.cancel()
+        blocker.set()
+        await first
+        await asyncio.gather(second, return_exceptions=True)
+        return processor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["completed"] == 1
+    assert stats["waiting"] == stats["running"] == stats["chats"] == 0
@@ -0,0 +1,73 @@
+import csv
+
+from validation import (
+    REASON_INVALID_STO,
+    REASON_MISSING,
+    RejectReport,
+    new_stats,
+    record_batch,
+    validate_batch,
+)
+
+COLUMNS = ("witel", "sto", "nama_gpon", "card", "port", "nama_odc")
+REQUIRED = ("sto", "nama_gpon", "card", "port")
+VALID_STO = frozenset({"KPO", "BTU"})
+
+
+def test_validate_batch_normalizes_and_rejects_with_one_reason():
+    records = [
+        {"witel": " malang ", "sto": " kpo ", "nama_gpon": " GPON01 ", "card": "1", "port": "2", "_row": 2},
+        {"witel": "nan", "sto": "btu", "nama_gpon": "GPON02", "card": "1", "port": "3", "_row": 3},
+        {"witel": "NONE", "sto": "xxx", "nama_gpon": "GPON03", "card": "1", "port": "4", "_row": 4},
+        {"witel": "malang", "sto": "nan", "nama_gpon": None, "card": "1", "port": "5", "_row": 5},
+        {"sto": "kpo", "nama_gpon": "GPON04", "card": " ", "port": "6", "_row": 6},
+    ]
+    valid, report = validate_batch(records, COLUMNS, REQUIRED, VALID_STO, upper=("sto", "witel"))
+
+    assert valid == [
+        {"witel": "MALANG", "sto": "KPO", "nama_gpon": "GPON01", "card": "1", "port": "2", "nama_odc": None},
+        # Kolom upper yang tidak wajib: sisa 'nan' disimpan sebagai NULL, bukan 'NAN'
+        {"witel": None, "sto": "BTU", "nama_gpon": "GPON02", "card": "1", "port": "3", "nama_odc": None},
+    ]
+    assert report == [
+        (4, REASON_INVALID_STO, "sto", "XXX"),
+        (5, REASON_MISSING, "sto", None),
+        (6, REASON_MISSING, "card", None),
+    ]
+
+
+def test_constants_override_file_values():
+    valid, report = validate_batch(
+        [{"witel": "kediri", "sto": "kpo", "nama_gpon": "G", "card": "1", "port": "1"}],
+        COLUMNS, REQUIRED, VALID_STO, constants={"witel": "MALANG"},
+    )
+    assert report == [] and valid[0]["witel"] == "MALANG"
+
+
+def test_record_batch_and_reject_report(tmp_path):
+    report = [(4, REASON_INVALID_STO, "sto", "XXX"), (5, REASON_MISSING, "sto", None), (7, REASON_INVALID_STO, "sto", "XXX")]
+    stats = new_stats()
+    record_batch(stats, 10, [{}] * 7, report)
+    record_batch(stats, 5, [{}] * 5, [])
+    assert stats == {
+        "total_rows": 15,
+        "valid_rows": 12,
+        "rejected": {REASON_INVALID_STO: 2, REASON_MISSING: 1},
+        "invalid_sto": ["XXX"],
+    }
+
+    rejects = RejectReport()
+    rejects.write(report[:1])
+    rejects.write([])
+    rejects.write(report[1:])
+    rejects.close()
+    with open(rejects.path, encoding="utf-8-sig", newline="") as fh:
+        rows = list(csv.reader(fh))
+    rejects.discard()
+    assert rows == [
+        ["baris", "alasan", "kolom", "nilai"],
+        ["4", REASON_INVALID_STO, "sto", "XXX"],
+        ["5", REASON_MISSING, "sto", ""],
+        ["7", REASON_INVALID_STO, "sto", "XXX"],
+    ]
+    assert rejects.count == 3 and rejects.path is None
@@ -0,0 +1,171 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDED_UPDATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "webhook_update.json")
+SECRET = "rahasia-uji"
+
+
+class FakeBotAPI:
+    """Bot API palsu lewat HTTP lokal (BOT_API_URL); mencatat setiap method yang dipanggil bot."""
+
+    def __init__(self):
+        self.calls: list[tuple[str, dict]] = []
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if "json" in self.headers.get("Content-Type", ""):
+                    params = json.loads(raw or b"{}")
+                else:
+                    params = {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+                method = self.path.rsplit("/", 1)[-1]
+                api.calls.append((method, params))
+                body = json.dumps({"ok": True, "result": api.result(method, params)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/bot"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def result(method: str, params: dict):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+        if method == "sendMessage":
+            return {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "text": params["text"],
+            }
+        return True
+
+    def methods(self) -> list[str]:
+        return [method for method, _ in self.calls]
+
+    def close(self):
+        self.server.shutdown()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(predicate, timeout: float = 20.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _post(url: str, body: bytes, secret: str | None) -> int:
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, body, headers), timeout=5) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _env(tmp_path, api_url: str, port: int, webhook_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "123:TEST",
+        "BOT_MODE": "webhook",
+        "BOT_API_URL": api_url,
+        "WEBHOOK_LISTEN": "127.0.0.1",
+        "WEBHOOK_PORT": str(port),
+        "WEBHOOK_PATH": "telegram",
+        "WEBHOOK_URL": webhook_url,
+        "WEBHOOK_SECRET": SECRET,
+        "PERSIST_PATH": str(tmp_path / "state.sqlite3"),
+        # Tidak ada MySQL di lingkungan uji: startup DB gagal cepat dan hanya dicatat
+        "DB_HOST": "127.0.0.1",
+        "DB_POOL_MIN": "0",
+    })
+    return env
+
+
+@pytest.fixture
+def fake_api():
+    api = FakeBotAPI()
+    yield api
+    api.close()
+
+
+def test_webhook_serves_recorded_update(tmp_path, fake_api):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "bot.py")],
+        cwd=tmp_path,
+        env=_env(tmp_path, fake_api.url, port, "https://bot.example.com/"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    try:
+        assert _wait_for(lambda: "setWebhook" in fake_api.methods() or proc.poll() is not None)
+        assert proc.poll() is None
+        webhook = dict(fake_api.calls)["setWebhook"]
+        assert webhook["url"] == "https://bot.example.com/telegram"
+        assert webhook["secret_token"] == SECRET
+
+        url = f"http://127.0.0.1:{port}/telegram"
+        with open(RECORDED_UPDATE, "rb") as fh:
+            body = fh.read()
+        assert _wait_for(lambda: _post(url, b"{}", "salah") == 403)
+        assert _post(url, body, None) == 403
+        assert "sendMessage" not in fake_api.methods()
+
+        assert _post(url, body, SECRET) == 200
+        assert _wait_for(lambda: "sendMessage" in fake_api.methods())
+        reply = dict(fake_api.calls)["sendMessage"]
+        assert reply["chat_id"] == "555001"
+        assert "tidak mengenali pesan" in reply["text"]
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            output = proc.communicate(timeout=30)[0].decode()
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise
+    assert proc.returncode == 0, output
+
+
+def test_webhook_mode_requires_public_url(tmp_path, fake_api):
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "bot.py")],
+        cwd=tmp_path,
+        env=_env(tmp_path, fake_api.url, _free_port(), ""),
+        capture_output=True,
+        timeout=60,
+    )
+    assert proc.returncode != 0
+    assert "WEBHOOK_URL wajib diisi" in proc.stderr.decode()
+    assert "setWebhook" not in fake_api.methods()
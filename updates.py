@@ -0,0 +1,106 @@
+import asyncio
+import contextlib
+import os
+import time
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Berapa update (dari chat berbeda) yang boleh diproses bersamaan
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '16'))
+# Batas update yang boleh menunggu giliran; di atas ini Application ikut menunggu
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '10000'))
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Proses update secara paralel antar chat, tetapi berurutan di dalam satu chat.
+    - Update dari chat yang sama menunggu giliran di lock per chat (FIFO), sehingga
+      state ConversationHandler (per_chat/per_user) tetap diproses satu per satu.
+    - Maksimal max_workers update berjalan bersamaan; yang menunggu giliran chat
+      tidak memakai slot, jadi satu user yang mengirim banyak pesan tidak menahan user lain.
+    - Semaphore bawaan BaseUpdateProcessor dipakai sebagai batas antrean (max_pending),
+      dibuat longgar agar update langsung masuk ke lock chat sesuai urutan kedatangan.
+    """
+
+    def __init__(self, max_workers: int = UPDATE_WORKERS, max_pending: int = UPDATE_MAX_PENDING):
+        super().__init__(max_concurrent_updates=max(max_pending, max_workers, 2))
+        self.max_workers = max_workers
+        self._slots: asyncio.Semaphore | None = None
+        self._chats: dict = {}   # chat_id -> [asyncio.Lock, jumlah update aktif/antre]
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    def _chat_key(update: object):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                # mis. inline query: tidak ada chat, urutkan per user
+                return ("user", update.effective_user.id)
+        return None
+
+    async def initialize(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        if self._slots is None:
+            await self.initialize()
+        key = self._chat_key(update)
+        entry = None
+        if key is not None:
+            entry = self._chats.get(key)
+            if entry is None:
+                entry = self._chats[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+
+        enqueued_at = time.monotonic()
+        self.waiting += 1
+        started = False
+        try:
+            async with entry[0] if entry else contextlib.nullcontext():
+                async with self._slots:
+                    wait = time.monotonic() - enqueued_at
+                    self.waiting -= 1
+                    self.running += 1
+                    self.total_wait += wait
+                    self.max_wait = max(self.max_wait, wait)
+                    started = True
+                    try:
+                        await coroutine
+                        self.completed += 1
+                    except BaseException:
+                        self.failed += 1
+                        raise
+                    finally:
+                        self.running -= 1
+        finally:
+            if not started:
+                # dibatalkan saat menunggu giliran (mis. bot berhenti)
+                self.waiting -= 1
+                coroutine.close()
+            if entry is not None:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._chats.pop(key, None)
+
+    def stats(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            "workers": self.max_workers,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "chats": len(self._chats),
+            "avg_wait_ms": round(self.total_wait / done * 1000, 1) if done else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
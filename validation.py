@@ -0,0 +1,127 @@
+import csv
+import os
+import tempfile
+from collections import Counter
+
+# Nilai teks yang dianggap kosong setelah di-strip (case-insensitive)
+EMPTY_VALUES = frozenset(["", "none", "nan"])
+
+REASON_MISSING = "kolom wajib kosong"
+REASON_INVALID_STO = "STO tidak valid"
+
+# Kolom laporan penolakan (juga judul kolom di file yang dikirim ke pengunggah)
+REJECT_COLUMNS = ["baris", "alasan", "kolom", "nilai"]
+
+
+def new_stats() -> dict:
+    return {"total_rows": 0, "valid_rows": 0, "rejected": {}, "invalid_sto": []}
+
+
+def _clean(value, upper: bool):
+    """Strip (dan upper) satu nilai; kosong, 'nan' atau 'none' (sisa konversi lama) menjadi None."""
+    if value is None:
+        return None
+    value = (value if isinstance(value, str) else str(value)).strip()
+    if upper:
+        value = value.upper()
+    return None if value.lower() in EMPTY_VALUES else value
+
+
+def validate_batch(
+    records: list[dict],
+    columns: tuple,
+    required: tuple,
+    valid_sto: frozenset | set,
+    upper: tuple = ("sto",),
+    constants: dict | None = None,
+) -> tuple[list[dict], list[tuple]]:
+    """
+    Normalisasi + validasi satu batch baris upload (FTM maupun Metro).
+    - columns: kolom yang disimpan (kolom yang tidak ada di file diisi kosong).
+    - required: kolom wajib; baris dengan nilai kosong ditolak.
+    - valid_sto: STO yang boleh untuk witel ini.
+    - upper: kolom yang dinormalisasi ke huruf besar (ikut di-strip seperti kolom wajib).
+    - constants: nilai tetap per kolom (mis. witel dari pilihan menu).
+    Mengembalikan (baris_valid siap tulis, laporan_penolakan[(baris, alasan, kolom, nilai)]).
+    Setiap baris ditolak dengan satu alasan saja (yang pertama ditemukan).
+
+    Sengaja satu lintasan per baris tanpa DataFrame: batch berukuran ~1000 baris, dan overhead
+    pandas per batch lebih mahal daripada loop ini.
+    """
+    constants = constants or {}
+    # Hanya kolom kunci yang di-strip; sel lain sudah dirapikan ingest.normalize_cell
+    cleaned = [(col, col in upper) for col in columns if col not in constants and (col in required or col in upper)]
+    valid, report = [], []
+    for i, record in enumerate(records):
+        row = {col: record.get(col) for col in columns}
+        for col, up in cleaned:
+            row[col] = _clean(row[col], up)
+        row.update(constants)
+        # Satu alasan per baris: kolom wajib dicek berurutan, lalu STO
+        missing = next((col for col in required if row[col] is None), None)
+        if missing is not None:
+            report.append((record.get("_row", i + 2), REASON_MISSING, missing, None))
+        elif row["sto"] not in valid_sto:
+            report.append((record.get("_row", i + 2), REASON_INVALID_STO, "sto", row["sto"]))
+        else:
+            valid.append(row)
+    return valid, report
+
+
+class RejectReport:
+    """
+    File CSV laporan baris yang ditolak, ditulis bertahap per batch dari worker 'parse'
+    sehingga memori tidak ikut membesar walau penolakan mencapai ratusan ribu baris.
+    File baru dibuat saat penolakan pertama; panggil close() lalu kirim, dan discard() setelahnya.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.count = 0
+        self._fh = None
+        self._writer = None
+
+    def write(self, report: list[tuple]) -> None:
+        if not report:
+            return
+        if self._fh is None:
+            fd, self.path = tempfile.mkstemp(prefix="ditolak_", suffix=".csv")
+            # utf-8-sig agar langsung terbaca benar di Excel
+            self._fh = os.fdopen(fd, "w", encoding="utf-8-sig", newline="")
+            self._writer = csv.writer(self._fh)
+            self._writer.writerow(REJECT_COLUMNS)
+        self._writer.writerows(report)
+        self.count += len(report)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def discard(self) -> None:
+        self.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+def record_batch(stats: dict, total: int, valid: list, report: list[tuple]) -> None:
+    """Akumulasi hitungan per batch ke stats (dipakai untuk pesan status)."""
+    stats["total_rows"] += total
+    stats["valid_rows"] += len(valid)
+    if not report:
+        return
+    for reason, count in Counter(reason for _, reason, _, _ in report).items():
+        stats["rejected"][reason] = stats["rejected"].get(reason, 0) + count
+    if len(stats["invalid_sto"]) < 5:
+        bad = dict.fromkeys(value for _, reason, _, value in report if reason == REASON_INVALID_STO and value)
+        for sto in bad:
+            if len(stats["invalid_sto"]) >= 5:
+                break
+            if sto not in stats["invalid_sto"]:
+                stats["invalid_sto"].append(sto)
+
+
+def format_rejects(stats: dict) -> str:
+    """Ringkasan penolakan, mis. 'STO tidak valid: 3, kolom wajib kosong: 12'."""
+    return ", ".join(f"{reason}: {count}" for reason, count in stats["rejected"].items())